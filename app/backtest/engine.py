@@ -0,0 +1,230 @@
+from app.config.db_config import market_db
+from app.models.options import chain_from_records, price_chain
+from app.backtest.strategy import Strategy
+from plugins.bsm import OptionPosition
+from datetime import timedelta
+from itertools import groupby
+import numpy as np
+
+
+CHUNK_DAYS = 20
+
+
+async def get_trade_days_db(start, end) -> list:
+    '''
+    Gets processed trade dates in range
+
+    :param start: first date (date object)
+    :param end: last date (date object)
+    :return: sorted list of dates
+    '''
+    query = '''
+        SELECT dates_processed.date
+        FROM dates_processed
+        WHERE dates_processed.date >= :start AND dates_processed.date <= :end
+        ORDER BY dates_processed.date;
+    '''
+    records = await market_db.fetch_all(query, values={'start': start, 'end': end})
+    return [record['date'] for record in records]
+
+
+
+async def stream_chains(ticker: str, days: list, max_dte: int, chunk_days: int = CHUNK_DAYS):
+    '''
+    Yields (trade_date, chain arrays) day by day, loading one range query per chunk of days.
+    Only expiries that can be traded within max_dte are loaded.
+
+    :param ticker: ticker to get option data for
+    :param days: sorted trade dates
+    :param max_dte: furthest expiry (in DTE) needed on any day
+    :param chunk_days: trade dates loaded per query
+    '''
+    query = '''
+    SELECT
+        option_price.date,
+        options.option_id,
+        options.expiry_date,
+        options.strike,
+        options.type,
+        option_price.spot_price,
+        option_price.interpolated_value,
+        option_price.irate,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND option_price.date >= option_splits.split_date
+    WHERE options.ticker = :ticker
+        AND option_price.date >= :start AND option_price.date <= :end
+        AND options.expiry_date >= :start AND options.expiry_date <= :max_expiry
+    GROUP BY option_price.date, options.option_id, options.expiry_date, options.strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value
+    ORDER BY option_price.date, options.expiry_date, options.strike;
+    '''
+    for k in range(0, len(days), chunk_days):
+        chunk = days[k:k + chunk_days]
+        values = {'ticker': ticker, 'start': chunk[0], 'end': chunk[-1], 'max_expiry': chunk[-1] + timedelta(days=max_dte)}
+        records = await market_db.fetch_all(query, values=values)
+
+        for day, rows in groupby(records, key=lambda record: record['date']):
+            yield day, chain_from_records(list(rows), day)
+
+
+
+def select_entry(chain: dict, strategy: Strategy):
+    '''
+    Picks the contracts to open: the expiry closest to entry_dte, then the contract nearest each leg's delta.
+    Only the chosen expiry is priced.
+
+    :param chain: chain arrays of the day
+    :param strategy: Strategy being run
+    :return: index array into chain (one per leg) or None if a leg cannot be filled
+    '''
+    candidates = (chain['dte'] > strategy.roll_dte) & (chain['dte'] <= strategy.max_dte)
+    if not candidates.any():
+        return None
+
+    dtes = np.unique(chain['dte'][candidates])
+    entry_dte = dtes[np.argmin(np.abs(dtes - strategy.entry_dte))]
+    idx = np.flatnonzero(candidates & (chain['dte'] == entry_dte))
+    priced = price_chain({key: column[idx] for key, column in chain.items()})
+
+    selected = []
+    for leg in strategy.legs:
+        usable = (priced['type'] == leg.Type) & ~np.isnan(priced['delta'])
+        if not usable.any():
+            return None
+        distance = np.where(usable, np.abs(priced['delta'] - leg.delta), np.inf)
+        selected.append(idx[np.argmin(distance)])
+
+    return np.array(selected, dtype=np.int64)
+
+
+
+def locate(chain: dict, option_ids):
+    '''
+    Finds option ids in a (non empty) chain
+
+    :return: (index array, found mask)
+    '''
+    order = np.argsort(chain['option_id'], kind='stable')
+    sorted_ids = chain['option_id'][order]
+    pos = np.clip(np.searchsorted(sorted_ids, option_ids), 0, len(sorted_ids) - 1)
+    return order[pos], sorted_ids[pos] == option_ids
+
+
+
+async def run_backtest(ticker: str, start, end, strategy: Strategy, chunk_days: int = CHUNK_DAYS) -> dict:
+    '''
+    Replays a rule based strategy over option_price day by day.
+    Positions are marked at interpolated_value and aggregated like OptionPosition
+    (quantity weighted, per share units). Marks, prices & greeks are per 100 deliverable shares,
+    so a contract adjusted by a split keeps its value. A contract missing on a day keeps its last mark.
+
+    :param ticker: ticker to backtest
+    :param start: first trade date (date object)
+    :param end: last trade date (date object)
+    :param strategy: Strategy to run
+    :param chunk_days: trade dates loaded per query
+    :return: dict of daily numpy arrays, trade log and summary
+    '''
+    days = await get_trade_days_db(start, end)
+    quantity = np.array([leg.quantity for leg in strategy.legs], dtype=float)
+
+    daily = {key: [] for key in ['date', 'spot', 'value', 'pnl'] + OptionPosition.GREEKS[1:]}
+    trades = []
+    closed_pnl = []
+    realized = 0.0
+    held = None #Open contracts: option ids, last marks & entry value
+
+    async for day, chain in stream_chains(ticker, days, strategy.max_dte, chunk_days):
+        if len(chain['option_id']) == 0:
+            continue
+
+        spot = float(chain['spot_price'][0])
+        multiplier = chain['num_shares'] / 100 #Deliverable of split adjusted contracts
+        idx = found = None
+
+        if held is not None:
+            idx, found = locate(chain, held['option_id'])
+            held['mark'][found] = chain['value'][idx[found]] * multiplier[idx[found]]
+            held['dte'] = held['dte'] - (day - held['date']).days
+            held['date'] = day
+            value = float(np.sum(quantity * held['mark']))
+            pnl = value - held['entry_value']
+
+            reason = None
+            if held['dte'].min() <= strategy.roll_dte:
+                reason = 'roll'
+            elif strategy.take_profit is not None and pnl >= strategy.take_profit * abs(held['entry_value']):
+                reason = 'take_profit'
+            elif strategy.stop_loss is not None and pnl <= -strategy.stop_loss * abs(held['entry_value']):
+                reason = 'stop_loss'
+
+            if reason is not None:
+                realized += pnl
+                closed_pnl.append(pnl)
+                trades.append({'date': str(day), 'action': 'close', 'reason': reason, 'value': value, 'pnl': pnl})
+                held = None
+
+        if held is None:
+            entry = select_entry(chain, strategy)
+            if entry is not None:
+                marks = chain['value'][entry] * multiplier[entry]
+                held = {
+                    'option_id': chain['option_id'][entry],
+                    'mark': marks,
+                    'dte': chain['dte'][entry].astype(np.int64),
+                    'date': day,
+                    'entry_value': float(np.sum(quantity * marks)),
+                }
+                idx, found = entry, np.ones(len(entry), dtype=bool)
+                trades.append({
+                    'date': str(day),
+                    'action': 'open',
+                    'value': held['entry_value'],
+                    'legs': [{'expiry': str(chain['expiry'][i]), 'strike': float(chain['strike'][i]), 'type': str(chain['type'][i]),
+                              'quantity': float(q), 'price': float(marks[k])} for k, (i, q) in enumerate(zip(entry, quantity))]
+                })
+
+        # Greeks of the legs quoted today, only the held contracts are repriced
+        greeks = {key: 0.0 for key in OptionPosition.GREEKS[1:]}
+        value = 0.0
+        if held is not None:
+            value = float(np.sum(quantity * held['mark']))
+            legs = idx[found]
+            priced = price_chain({key: column[legs] for key, column in chain.items()})
+            ok = ~np.isnan(priced['ivol'])
+            position = OptionPosition()
+            position.addLegArrays(priced['type'][ok], priced['spot_price'][ok], priced['strike'][ok], priced['dte'][ok], priced['irate'][ok], priced['ivol'][ok], (quantity[found] * multiplier[legs])[ok])
+            for key in greeks:
+                greeks[key] = getattr(position, key)() or 0.0
+
+        daily['date'].append(day)
+        daily['spot'].append(spot)
+        daily['value'].append(value)
+        daily['pnl'].append(realized + (value - held['entry_value'] if held is not None else 0.0))
+        for key, greek in greeks.items():
+            daily[key].append(greek)
+
+    daily = {key: np.array(values) for key, values in daily.items()}
+    pnl = daily['pnl']
+    closed_pnl = np.array(closed_pnl)
+
+    summary = {
+        'total_pnl': float(pnl[-1]) if len(pnl) else 0.0,
+        'trades': sum(1 for trade in trades if trade['action'] == 'open'),
+        'closed_trades': len(closed_pnl),
+        'win_rate': float(np.mean(closed_pnl > 0)) if len(closed_pnl) else None,
+        'avg_trade_pnl': float(np.mean(closed_pnl)) if len(closed_pnl) else None,
+        'max_drawdown': float(np.max(np.maximum.accumulate(pnl) - pnl)) if len(pnl) else 0.0,
+    }
+
+    return {'ticker': ticker, 'strategy': strategy.params, 'daily': daily, 'trades': trades, 'summary': summary}
+
+
+
+def backtest_to_json(result: dict) -> dict:
+    '''
+    Converts the daily arrays of a run_backtest result to lists
+    '''
+    daily = {key: [str(d) for d in values] if key == 'date' else np.round(values, 6).tolist() for key, values in result['daily'].items()}
+    return {**result, 'daily': daily}
@@ -0,0 +1,273 @@
+from app.config.db_config import market_db
+from app.utils.database_pools import use_pool
+from app.models.options import get_hist_earnings_db
+from app.backtest.engine import run_backtest
+from app.backtest.strategy import Strategy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing.util import Finalize
+import numpy as np
+import argparse
+import asyncio
+import json
+import os
+
+
+'''
+    Runs one job over many tickers on a process pool.
+    Every worker owns an event loop and connections to the pools its reads use (replicas with their health
+    checks running while a shard runs, then analytics, else the primary), streams its own data
+    and sends back compact per ticker numpy arrays which are merged in the parent.
+
+    python -m app.backtest.runner --job strategy --strategy strangle.json --tickers AAPL,MSFT --start 2020-01-01 --end 2023-12-31
+    python -m app.backtest.runner --job earnings_straddle --tickers-file universe.txt --end 2023-12-31 --out earnings.npz
+'''
+
+SHARDS_PER_PROCESS = 4
+WORKER_POOLS = ('replica', 'analytics') #Full history reads, off the primary
+
+_loop = None #Worker event loop (one per process)
+
+
+
+def _init_worker():
+    '''
+    Process pool initializer, connects this worker to the pools of WORKER_POOLS, closed when the worker exits
+    '''
+    global _loop
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _loop.run_until_complete(market_db.connect(*WORKER_POOLS))
+    Finalize(None, _close_worker, exitpriority=10)
+
+
+
+def _close_worker():
+    _loop.run_until_complete(market_db.disconnect())
+    _loop.close()
+
+
+
+async def _start_health_checks():
+    market_db.start() #Needs the running loop
+
+
+
+async def strategy_job(ticker: str, params: dict) -> dict:
+    '''
+    Backtests params['strategy'] on one ticker
+
+    :return: date ordinals, cumulative pnl and summary
+    '''
+    strategy = Strategy.from_dict(params['strategy'])
+    result = await run_backtest(ticker, params['start'], params['end'], strategy)
+    return {
+        'date': np.array([d.toordinal() for d in result['daily']['date']], dtype=np.int32),
+        'pnl': result['daily']['pnl'].astype(np.float32),
+        'summary': result['summary'],
+    }
+
+
+
+async def earnings_straddle_job(ticker: str, params: dict) -> dict:
+    '''
+    Long straddle over every earnings of one ticker (see get_hist_earnings_db)
+
+    :return: per event date ordinals, straddle returns, realized & implied moves
+    '''
+    data = await get_hist_earnings_db(ticker, params['end'])
+    events = [e for e in data['earnings'] if params['start'] is None or e['earnings_date'] >= params['start']]
+    return {
+        'date': np.array([e['earnings_date'].toordinal() for e in events], dtype=np.int32),
+        'straddle_return': np.array([e['straddle_return'] for e in events], dtype=np.float32),
+        'realized_move': np.array([e['realized_move'] for e in events], dtype=np.float32),
+        'implied_move': np.array([e['abs_implied_move'] for e in events], dtype=np.float32),
+    }
+
+
+
+JOBS = {
+    'strategy': strategy_job,
+    'earnings_straddle': earnings_straddle_job,
+}
+
+
+
+def _run_shard(job: str, tickers: list, params: dict) -> list:
+    '''
+    Runs job for each ticker of a shard inside the worker loop.
+    A failing ticker is reported instead of failing the shard.
+
+    :return: list of (ticker, result or None, error or None)
+    '''
+    results = []
+    _loop.run_until_complete(_start_health_checks()) #A replica marked down mid shard gets checked again
+    try:
+        with use_pool(*WORKER_POOLS):
+            for ticker in tickers:
+                try:
+                    results.append((ticker, _loop.run_until_complete(JOBS[job](ticker, params)), None))
+                except Exception as e:
+                    results.append((ticker, None, repr(e)))
+    finally:
+        _loop.run_until_complete(market_db.stop())
+    return results
+
+
+
+def run_parallel(job: str, tickers: list, params: dict, processes: int = None, progress=None) -> dict:
+    '''
+    Shards tickers across a process pool and merges the per ticker results
+
+    :param job: key of JOBS
+    :param tickers: tickers to run
+    :param params: job parameters ('start', 'end' date objects, 'strategy' dict for the strategy job)
+    :param processes: worker processes (defaults to cpu count)
+    :param progress: optional callable(done, total) called as shards finish
+    :return: merged results (see merge_strategy / merge_earnings_straddle)
+    '''
+    if job not in JOBS:
+        raise ValueError(f'Unknown job {job}')
+
+    processes = processes or os.cpu_count()
+    n_shards = max(1, min(len(tickers), processes * SHARDS_PER_PROCESS))
+    shards = [tickers[k::n_shards] for k in range(n_shards)] #Interleaved so large & small names spread evenly
+
+    results = {}
+    failed = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+        futures = [pool.submit(_run_shard, job, shard, params) for shard in shards]
+        for done, future in enumerate(as_completed(futures), 1):
+            for ticker, result, error in future.result():
+                if error is None:
+                    results[ticker] = result
+                else:
+                    failed[ticker] = error
+            if progress is not None:
+                progress(done, len(futures))
+
+    ordered = [ticker for ticker in tickers if ticker in results]
+    merged = MERGES[job](ordered, [results[ticker] for ticker in ordered])
+    merged['failed'] = failed
+    return merged
+
+
+
+def merge_strategy(tickers: list, results: list) -> dict:
+    '''
+    Aligns every ticker's cumulative pnl on the union of dates (flat before the first and after the last day)
+
+    :return: dates, (T, D) pnl matrix, combined pnl & per ticker summary arrays
+    '''
+    days = np.unique(np.concatenate([r['date'] for r in results])) if results else np.empty(0, dtype=np.int32)
+    pnl = np.zeros((len(results), len(days)))
+
+    for i, r in enumerate(results):
+        if len(r['date']) == 0:
+            continue
+        pos = np.searchsorted(r['date'], days, side='right') - 1
+        pnl[i] = np.where(pos >= 0, r['pnl'][np.clip(pos, 0, None)], 0.0)
+
+    combined = pnl.sum(axis=0)
+    total = pnl[:, -1] if len(days) else np.zeros(len(results))
+    win_rate = np.array([np.nan if r['summary']['win_rate'] is None else r['summary']['win_rate'] for r in results])
+
+    return {
+        'tickers': np.array(tickers),
+        'date': days,
+        'pnl': pnl,
+        'combined_pnl': combined,
+        'total_pnl': total,
+        'win_rate': win_rate,
+        'max_drawdown': np.array([r['summary']['max_drawdown'] for r in results]),
+        'summary': {
+            'tickers': len(results),
+            'total_pnl': float(combined[-1]) if len(days) else 0.0,
+            'avg_ticker_pnl': float(np.mean(total)) if len(results) else None,
+            'median_ticker_pnl': float(np.median(total)) if len(results) else None,
+            'profitable_tickers': float(np.mean(total > 0)) if len(results) else None,
+            'max_drawdown': float(np.max(np.maximum.accumulate(combined) - combined)) if len(days) else 0.0,
+        },
+    }
+
+
+
+def merge_earnings_straddle(tickers: list, results: list) -> dict:
+    '''
+    Concatenates every event with an index into tickers
+
+    :return: event arrays & summary
+    '''
+    counts = np.array([len(r['date']) for r in results], dtype=np.int64)
+    columns = ['date', 'straddle_return', 'realized_move', 'implied_move']
+    events = {key: np.concatenate([r[key] for r in results]) if results else np.empty(0) for key in columns}
+    returns = events['straddle_return']
+
+    return {
+        'tickers': np.array(tickers),
+        'ticker_index': np.repeat(np.arange(len(results)), counts),
+        **events,
+        'summary': {
+            'tickers': len(results),
+            'events': int(len(returns)),
+            'avg_straddle_return': float(np.nanmean(returns)) if len(returns) else None,
+            'median_straddle_return': float(np.nanmedian(returns)) if len(returns) else None,
+            'win_rate': float(np.mean(returns > 0)) if len(returns) else None,
+            'avg_abs_realized_move': float(np.nanmean(np.abs(events['realized_move']))) if len(returns) else None,
+            'avg_abs_implied_move': float(np.nanmean(np.abs(events['implied_move']))) if len(returns) else None,
+        },
+    }
+
+
+
+MERGES = {
+    'strategy': merge_strategy,
+    'earnings_straddle': merge_earnings_straddle,
+}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a backtest job across many tickers')
+    parser.add_argument('--job', choices=list(JOBS), required=True)
+    parser.add_argument('--tickers', help='Comma separated tickers')
+    parser.add_argument('--tickers-file', help='File with one ticker per line')
+    parser.add_argument('--start', help='yyyy-mm-dd')
+    parser.add_argument('--end', required=True, help='yyyy-mm-dd')
+    parser.add_argument('--strategy', help='JSON file with Strategy params (strategy job)')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', help='Writes merged arrays to this .npz file')
+    args = parser.parse_args()
+
+    tickers = []
+    if args.tickers:
+        tickers += args.tickers.split(',')
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip()]
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    if len(tickers) == 0:
+        parser.error('No tickers given')
+
+    params = {
+        'start': datetime.strptime(args.start, '%Y-%m-%d').date() if args.start else None,
+        'end': datetime.strptime(args.end, '%Y-%m-%d').date(),
+    }
+    if args.job == 'strategy':
+        if not args.strategy or not args.start:
+            parser.error('strategy job needs --strategy and --start')
+        with open(args.strategy) as f:
+            params['strategy'] = Strategy.from_dict(json.load(f)).params
+
+    merged = run_parallel(args.job, tickers, params, args.processes,
+                          progress=lambda done, total: print(f'{done}/{total} shards', flush=True))
+
+    if args.out:
+        np.savez(args.out, **{key: value for key, value in merged.items() if isinstance(value, np.ndarray)})
+
+    print(json.dumps({'summary': merged['summary'], 'failed': merged['failed']}, indent=2))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+class StrategyLeg:
+    def __init__(self, Type, delta, quantity):
+        '''
+        Type -> 'P' or 'C'                  [Char]          ['P']           Put leg                         \n
+        delta -> Target delta at entry      [Decimal]       [-0.16]         16 delta put                    \n
+        quantity -> Signed contracts        [Decimal]       [-1]            Short one contract              \n
+        '''
+        self.Type = Type.upper()
+        self.delta = delta
+        self.quantity = quantity
+
+        if (self.Type not in ['P', 'C']):
+            raise ValueError('Must be "P" or "C"')
+
+
+    @property
+    def params(self):
+        return {'type': self.Type, 'delta': self.delta, 'quantity': self.quantity}
+
+
+
+class Strategy:
+    def __init__(self, legs, entry_dte=30, roll_dte=21, take_profit=None, stop_loss=None):
+        '''
+        Rule based option strategy, ie "sell 30 DTE 16 delta strangle, roll at 21 DTE" is \n
+        Strategy([StrategyLeg('P', -0.16, -1), StrategyLeg('C', 0.16, -1)], entry_dte=30, roll_dte=21) \n
+
+        legs -> StrategyLeg LIST opened together on one expiry \n
+        entry_dte -> Opens on the expiry closest to this DTE \n
+        roll_dte -> Closes (and reopens) once the expiry is at or below this DTE \n
+        take_profit -> Closes once P&L >= take_profit * |entry value| (optional) \n
+        stop_loss -> Closes once P&L <= -stop_loss * |entry value| (optional) \n
+        '''
+        self.legs = list(legs)
+        self.entry_dte = entry_dte
+        self.roll_dte = roll_dte
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+
+        if len(self.legs) == 0:
+            raise ValueError('Strategy needs atleast one leg')
+        if self.roll_dte >= self.entry_dte:
+            raise ValueError('roll_dte must be below entry_dte')
+
+
+    @property
+    def max_dte(self):
+        '''
+        Furthest expiry (in DTE) an entry may be opened on
+        '''
+        return 2 * self.entry_dte
+
+
+    @property
+    def params(self):
+        return {'legs': [leg.params for leg in self.legs],
+                'entry_dte': self.entry_dte,
+                'roll_dte': self.roll_dte,
+                'take_profit': self.take_profit,
+                'stop_loss': self.stop_loss}
+
+
+    @classmethod
+    def from_dict(cls, params):
+        '''
+        Builds strategy from the dict produced by params
+        '''
+        legs = [StrategyLeg(leg['type'], leg['delta'], leg['quantity']) for leg in params['legs']]
+        return cls(legs, params.get('entry_dte', 30), params.get('roll_dte', 21), params.get('take_profit'), params.get('stop_loss'))
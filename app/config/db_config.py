@@ -1,5 +1,69 @@
-from databases import Database
+from app.utils.instrumented_database import InstrumentedDatabase
+from app.utils.database_pools import DatabasePools, ReplicaSet
 from app.env import MARKET_DB_URL
+import app.env as env
+import os
 
 
-market_db = Database(MARKET_DB_URL)
\ No newline at end of file
+'''
+    Database pools, each setting can be overridden in app/env.py
+'''
+
+DB_POOL_MIN_SIZE = getattr(env, 'DB_POOL_MIN_SIZE', 2)
+DB_POOL_MAX_SIZE = getattr(env, 'DB_POOL_MAX_SIZE', 10)
+DB_STATEMENT_TIMEOUT_SECONDS = getattr(env, 'DB_STATEMENT_TIMEOUT_SECONDS', 30) #Cancelled server side, None disables
+DB_POOL_WAIT_WARN_SECONDS = getattr(env, 'DB_POOL_WAIT_WARN_SECONDS', 0.25) #Logs pool saturation, None disables
+
+ANALYTICS_POOL_MIN_SIZE = getattr(env, 'ANALYTICS_POOL_MIN_SIZE', 1)
+ANALYTICS_POOL_MAX_SIZE = getattr(env, 'ANALYTICS_POOL_MAX_SIZE', 4) #0 runs analytics routes on the primary pool
+ANALYTICS_STATEMENT_TIMEOUT_SECONDS = getattr(env, 'ANALYTICS_STATEMENT_TIMEOUT_SECONDS', 300)
+ANALYTICS_ROUTES = getattr(env, 'ANALYTICS_ROUTES', (
+    '/options/hist/earnings',
+    '/options/hist/iv-rank',
+    '/options/hist/vol-cone',
+    '/options/hist/skew-series',
+    '/options/hist/position-series',
+    '/options/hist/price/bulk',
+    '/options/backtest',
+))
+
+#Read replicas, the MARKET_REPLICA_DB_URLS env var (comma separated) wins, ie a local multi instance stand-in
+REPLICA_DB_URLS = [url for url in os.environ.get('MARKET_REPLICA_DB_URLS', '').split(',') if url] or getattr(env, 'REPLICA_DB_URLS', [])
+REPLICA_POOL_MIN_SIZE = getattr(env, 'REPLICA_POOL_MIN_SIZE', 1)
+REPLICA_POOL_MAX_SIZE = getattr(env, 'REPLICA_POOL_MAX_SIZE', 8)
+REPLICA_STATEMENT_TIMEOUT_SECONDS = getattr(env, 'REPLICA_STATEMENT_TIMEOUT_SECONDS', 300)
+REPLICA_HEALTH_INTERVAL_SECONDS = getattr(env, 'REPLICA_HEALTH_INTERVAL_SECONDS', 5)
+REPLICA_HEALTH_TIMEOUT_SECONDS = getattr(env, 'REPLICA_HEALTH_TIMEOUT_SECONDS', 2)
+REPLICA_MAX_LAG_SECONDS = getattr(env, 'REPLICA_MAX_LAG_SECONDS', 60) #Replicas further behind are skipped
+REPLICA_ROUTES = getattr(env, 'REPLICA_ROUTES', ( #Read only history, lookups stay on the primary
+    '/options/hist/earnings',
+    '/options/hist/iv-rank',
+    '/options/hist/vol-cone',
+    '/options/hist/skew-series',
+    '/options/hist/contract-series',
+    '/options/hist/position-series',
+    '/options/backtest',
+    '/stocks/hist/price',
+    '/stocks/hist/earnings',
+    '/stocks/hist/realized-vol',
+))
+
+
+
+def _pool(name: str, min_size: int, max_size: int, statement_timeout: float, url: str = None) -> InstrumentedDatabase:
+    options = {'min_size': min(min_size, max_size), 'max_size': max_size}
+    if statement_timeout is not None:
+        options['server_settings'] = {'statement_timeout': str(int(statement_timeout * 1000))}
+    url = url or os.environ.get('MARKET_DB_URL', MARKET_DB_URL) #Env var wins, ie load tests against a synthetic db
+    return InstrumentedDatabase(url, name=name, wait_warn_seconds=DB_POOL_WAIT_WARN_SECONDS, **options)
+
+
+
+market_db = DatabasePools(
+    _pool('primary', DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_STATEMENT_TIMEOUT_SECONDS),
+    replicas=ReplicaSet(
+        [_pool(f'replica-{i}', REPLICA_POOL_MIN_SIZE, REPLICA_POOL_MAX_SIZE, REPLICA_STATEMENT_TIMEOUT_SECONDS, url) for i, url in enumerate(REPLICA_DB_URLS)],
+        REPLICA_HEALTH_INTERVAL_SECONDS, REPLICA_HEALTH_TIMEOUT_SECONDS, REPLICA_MAX_LAG_SECONDS,
+    ),
+    analytics=_pool('analytics', ANALYTICS_POOL_MIN_SIZE, ANALYTICS_POOL_MAX_SIZE, ANALYTICS_STATEMENT_TIMEOUT_SECONDS) if ANALYTICS_POOL_MAX_SIZE else None,
+)
@@ -0,0 +1,12 @@
+import app.env as env
+import os
+import tempfile
+
+
+'''
+    Request profiling settings, each one can be overridden in app/env.py
+'''
+
+PROFILE_DIR = getattr(env, 'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'option-rest-api-profiles'))
+PROFILE_INTERVAL_SECONDS = getattr(env, 'PROFILE_INTERVAL_SECONDS', 0.005)
+PROFILE_KEEP = getattr(env, 'PROFILE_KEEP', 200) #Oldest profiles are deleted past this
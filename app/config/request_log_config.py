@@ -0,0 +1,15 @@
+import app.env as env
+import os
+import tempfile
+
+
+'''
+    Request log settings (captures traffic for benchmarks/replay.py), each one can be overridden in app/env.py
+'''
+
+REQUEST_LOG_ENABLED = getattr(env, 'REQUEST_LOG_ENABLED', False)
+REQUEST_LOG_PATH = getattr(env, 'REQUEST_LOG_PATH', os.path.join(tempfile.gettempdir(), 'option-rest-api-requests.jsonl'))
+REQUEST_LOG_SAMPLE_RATE = getattr(env, 'REQUEST_LOG_SAMPLE_RATE', 1.0) #Fraction of requests logged
+REQUEST_LOG_MAX_BYTES = getattr(env, 'REQUEST_LOG_MAX_BYTES', 512 * 1024 * 1024) #Rotated to <path>.1 past this
+REQUEST_LOG_MAX_BODY_BYTES = getattr(env, 'REQUEST_LOG_MAX_BODY_BYTES', 256 * 1024) #Larger POST bodies are logged without the body
+REQUEST_LOG_EXCLUDE = getattr(env, 'REQUEST_LOG_EXCLUDE', ('/health', '/metrics', '/admin', '/docs', '/redoc', '/openapi.json'))
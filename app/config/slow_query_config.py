@@ -0,0 +1,11 @@
+import app.env as env
+
+
+'''
+    Slow query log settings, each one can be overridden in app/env.py
+'''
+
+SLOW_QUERY_SECONDS = getattr(env, 'SLOW_QUERY_SECONDS', 0.5) #None disables the log
+SLOW_QUERY_EXPLAIN = getattr(env, 'SLOW_QUERY_EXPLAIN', False) #Re-runs slow SELECTs under EXPLAIN (ANALYZE, BUFFERS) in the background
+SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS = getattr(env, 'SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS', 300) #Per query shape
+SLOW_QUERY_KEEP = getattr(env, 'SLOW_QUERY_KEEP', 200)
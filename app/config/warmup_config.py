@@ -0,0 +1,12 @@
+import app.env as env
+
+
+'''
+    Startup warm-up settings, each one can be overridden in app/env.py
+'''
+
+WARMUP_ENABLED = getattr(env, 'WARMUP_ENABLED', True)
+WARMUP_HOT_TICKERS = getattr(env, 'WARMUP_HOT_TICKERS', []) #ie ['SPY', 'QQQ', 'AAPL']
+WARMUP_BUDGET_SECONDS = getattr(env, 'WARMUP_BUDGET_SECONDS', 30)
+WARMUP_CONCURRENCY = getattr(env, 'WARMUP_CONCURRENCY', 4)
+WARMUP_READY_ON_TIMEOUT = getattr(env, 'WARMUP_READY_ON_TIMEOUT', True) #False keeps a worker whose warm-up ran out of budget unready (status 'cold')
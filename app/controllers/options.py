@@ -1,5 +1,7 @@
 from app.models.options import *
 import app.models.stocks as stocks
+from app.backtest.engine import run_backtest, backtest_to_json
+from app.backtest.strategy import Strategy, StrategyLeg
 from app.utils.api_key_check import check_api_key
 from app.utils.date_check import is_valid_date
 from fastapi import HTTPException
@@ -50,7 +52,7 @@ async def get_hist_strikes(apiKey: str, ticker: str, tradeDate: str, expiry: str
     if not is_valid_date(tradeDate):
         raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
     
-    if expiry is not None and not is_valid_date(tradeDate):
+    if expiry is not None and not is_valid_date(expiry):
         raise HTTPException(status_code=400, detail="Incorrect 'expiry' date format must be yyyy-mm-dd.")
     
     ticker = ticker.upper()
@@ -240,4 +242,377 @@ async def get_hist_ivinfo(apiKey: str, ticker: str, tradeDate: str, expiry: str)
         expiry = datetime.strptime(expiry, '%Y-%m-%d').date()
     ticker_data = await get_hist_ivinfo_db(ticker, tradeDate, expiry)
 
-    return ticker_data
\ No newline at end of file
+    return ticker_data
+
+
+async def get_hist_surface(apiKey: str, ticker: str, tradeDate: str, endDate: str, moneynessPoints: int, minDTE: int, maxDTE: int, dtePoints: int, binary: bool):
+    '''
+    Returns implied volatility surface on tradeDate (or every trade date up to endDate)
+
+    :param apiKey: Client api key (string format)
+    :param ticker: ticker to get option data for
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :param endDate: yyyy-mm-dd representaiton of last trade date (optional)
+    :param moneynessPoints: number of moneyness points in grid
+    :param minDTE: first dte of grid
+    :param maxDTE: last dte of grid
+    :param dtePoints: number of dte points in grid
+    :param binary: return npz bytes instead of json data
+    :return: iv surface
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(tradeDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
+    
+    if endDate is not None and not is_valid_date(endDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'endDate' date format must be yyyy-mm-dd.")
+    
+    ticker = ticker.upper()
+    tradeDate = datetime.strptime(tradeDate, '%Y-%m-%d').date()
+    if endDate is not None:
+        endDate = datetime.strptime(endDate, '%Y-%m-%d').date()
+
+        if endDate < tradeDate:
+            raise HTTPException(status_code=400, detail="'endDate' must be on or after 'tradeDate'.")
+        
+        if (endDate - tradeDate).days > 730:
+            raise HTTPException(status_code=400, detail="Two years (730 days) is highest allowed surface range.")
+
+    ticker_data = await get_hist_surface_db(ticker, tradeDate, endDate, moneynessPoints, minDTE, maxDTE, dtePoints, binary)
+
+    return ticker_data
+
+
+
+async def get_hist_skew_series(apiKey: str, ticker: str, startDate: str, endDate: str, dtes: list) -> dict:
+    '''
+    Returns skew & term structure metric series between startDate and endDate
+
+    :param apiKey: Client api key (string format)
+    :param ticker: ticker to get option data for
+    :param startDate: yyyy-mm-dd representaiton of first trade date
+    :param endDate: yyyy-mm-dd representaiton of last trade date
+    :param dtes: list of constant maturities
+    :return: metric series
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(startDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'startDate' date format must be yyyy-mm-dd.")
+    
+    if not is_valid_date(endDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'endDate' date format must be yyyy-mm-dd.")
+    
+    ticker = ticker.upper()
+    startDate = datetime.strptime(startDate, '%Y-%m-%d').date()
+    endDate = datetime.strptime(endDate, '%Y-%m-%d').date()
+
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="'endDate' must be on or after 'startDate'.")
+    
+    if (endDate - startDate).days > 1826:
+        raise HTTPException(status_code=400, detail="Five years (1826 days) is highest allowed range.")
+
+    ticker_data = await get_hist_skew_series_db(ticker, startDate, endDate, dtes)
+
+    return ticker_data
+
+
+
+async def get_hist_by_delta(apiKey: str, ticker: str, tradeDate: str, deltas: list, expiry: str) -> dict:
+    '''
+    Returns contracts nearest to target deltas for each expiry on tradeDate
+
+    :param apiKey: Client api key (string format)
+    :param ticker: ticker to get option data for
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :param deltas: list of target deltas (negative for puts)
+    :param expiry: yyyy-mm-dd representaiton of expiry (optional)
+    :return: matches by expiry
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(tradeDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
+    
+    if expiry is not None and not is_valid_date(expiry):
+        raise HTTPException(status_code=400, detail="Incorrect 'expiry' date format must be yyyy-mm-dd.")
+    
+    ticker = ticker.upper()
+    tradeDate = datetime.strptime(tradeDate, '%Y-%m-%d').date()
+    if expiry is not None:
+        expiry = datetime.strptime(expiry, '%Y-%m-%d').date()
+    ticker_data = await get_hist_by_delta_db(ticker, tradeDate, deltas, expiry)
+
+    return ticker_data
+
+
+
+async def get_portfolio_greeks(apiKey: str, tradeDate: str, positions: list) -> dict:
+    '''
+    Returns marks & greeks per position and for the whole portfolio on tradeDate
+
+    :param apiKey: Client api key (string format)
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :param positions: list of Position schemas
+    :return: portfolio greeks
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(tradeDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
+    
+    tradeDate = datetime.strptime(tradeDate, '%Y-%m-%d').date()
+
+    parsed = []
+    for position in positions:
+        legs = []
+        for leg in position.legs:
+            if not is_valid_date(leg.expiry):
+                raise HTTPException(status_code=400, detail="Incorrect leg 'expiry' date format must be yyyy-mm-dd.")
+            
+            legs.append({
+                'ticker': leg.ticker.upper(),
+                'expiry': datetime.strptime(leg.expiry, '%Y-%m-%d').date(),
+                'strike': leg.strike,
+                'type': leg.type.upper(),
+                'quantity': leg.quantity
+            })
+        parsed.append({'legs': legs, 'shares': position.shares, 'name': position.name})
+
+    ticker_data = await get_portfolio_greeks_db(tradeDate, parsed)
+
+    return ticker_data
+
+
+
+async def get_risk_scenario(apiKey: str, tradeDate: str, scenario, binary: bool):
+    '''
+    Returns P&L & greeks surface of a position over spot, vol & time shocks
+
+    :param apiKey: Client api key (string format)
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :param scenario: ScenarioRequest schema
+    :param binary: return npz bytes instead of json data
+    :return: scenario grids
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(tradeDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
+    
+    tradeDate = datetime.strptime(tradeDate, '%Y-%m-%d').date()
+
+    legs = []
+    for leg in scenario.position.legs:
+        if not is_valid_date(leg.expiry):
+            raise HTTPException(status_code=400, detail="Incorrect leg 'expiry' date format must be yyyy-mm-dd.")
+        
+        legs.append({
+            'ticker': leg.ticker.upper(),
+            'expiry': datetime.strptime(leg.expiry, '%Y-%m-%d').date(),
+            'strike': leg.strike,
+            'type': leg.type.upper(),
+            'quantity': leg.quantity
+        })
+
+    ticker_data = await get_risk_scenario_db(tradeDate, legs, scenario.position.shares, scenario.spotShocks, scenario.volShocks, scenario.daysForward, binary)
+
+    if isinstance(ticker_data, dict) and 'unpriced_legs' in ticker_data:
+        raise HTTPException(status_code=400, detail=f"Legs could not be priced on trade date: {ticker_data['unpriced_legs']}")
+
+    return ticker_data
+
+
+
+async def get_backtest(apiKey: str, ticker: str, startDate: str, endDate: str, strategy) -> dict:
+    '''
+    Returns backtest of a rule based strategy between startDate and endDate
+
+    :param apiKey: Client api key (string format)
+    :param ticker: ticker to backtest
+    :param startDate: yyyy-mm-dd representaiton of first trade date
+    :param endDate: yyyy-mm-dd representaiton of last trade date
+    :param strategy: StrategyRequest schema
+    :return: daily series, trades & summary
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(startDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'startDate' date format must be yyyy-mm-dd.")
+    
+    if not is_valid_date(endDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'endDate' date format must be yyyy-mm-dd.")
+    
+    ticker = ticker.upper()
+    startDate = datetime.strptime(startDate, '%Y-%m-%d').date()
+    endDate = datetime.strptime(endDate, '%Y-%m-%d').date()
+
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="'endDate' must be on or after 'startDate'.")
+    
+    try:
+        legs = [StrategyLeg(leg.type, leg.delta, leg.quantity) for leg in strategy.legs]
+        strategy = Strategy(legs, strategy.entryDTE, strategy.rollDTE, strategy.takeProfit, strategy.stopLoss)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await run_backtest(ticker, startDate, endDate, strategy)
+
+    return backtest_to_json(result)
+
+
+
+async def get_position_series(apiKey: str, startDate: str, endDate: str, position) -> dict:
+    '''
+    Returns daily marks, ivs & greeks of a fixed position between startDate and endDate
+
+    :param apiKey: Client api key (string format)
+    :param startDate: yyyy-mm-dd representaiton of first trade date
+    :param endDate: yyyy-mm-dd representaiton of last trade date
+    :param position: Position schema (strikes as of startDate)
+    :return: contracts & daily series
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(startDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'startDate' date format must be yyyy-mm-dd.")
+    
+    if not is_valid_date(endDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'endDate' date format must be yyyy-mm-dd.")
+    
+    startDate = datetime.strptime(startDate, '%Y-%m-%d').date()
+    endDate = datetime.strptime(endDate, '%Y-%m-%d').date()
+
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="'endDate' must be on or after 'startDate'.")
+
+    legs = []
+    for leg in position.legs:
+        if not is_valid_date(leg.expiry):
+            raise HTTPException(status_code=400, detail="Incorrect leg 'expiry' date format must be yyyy-mm-dd.")
+        
+        legs.append({
+            'ticker': leg.ticker.upper(),
+            'expiry': datetime.strptime(leg.expiry, '%Y-%m-%d').date(),
+            'strike': leg.strike,
+            'type': leg.type.upper(),
+            'quantity': leg.quantity
+        })
+
+    ticker_data = await get_position_series_db(startDate, endDate, legs, position.shares)
+
+    if 'unpriced_legs' in ticker_data:
+        raise HTTPException(status_code=400, detail=f"Legs could not be found: {ticker_data['unpriced_legs']}")
+
+    return ticker_data
+
+
+
+async def get_contract_series(apiKey: str, optionId: str, ticker: str, expiry: str, strike: str, type: str, startDate: str, endDate: str, limit: int, cursor: str) -> dict:
+    '''
+    Returns the daily quote & iv history of one contract between startDate and endDate
+
+    :param apiKey: Client api key (string format)
+    :param optionId: option id of the contract (or ticker, expiry, strike & type)
+    :param ticker: ticker of the contract
+    :param expiry: yyyy-mm-dd representaiton of expiry
+    :param strike: strike as of startDate
+    :param type: 'P' or 'C'
+    :param startDate: yyyy-mm-dd representaiton of first trade date
+    :param endDate: yyyy-mm-dd representaiton of last trade date
+    :param limit: max days per page
+    :param cursor: next_cursor of the previous page (optional)
+    :return: contract info, series & next_cursor
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(startDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'startDate' date format must be yyyy-mm-dd.")
+    
+    if not is_valid_date(endDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'endDate' date format must be yyyy-mm-dd.")
+    
+    if cursor is not None and not is_valid_date(cursor):
+        raise HTTPException(status_code=400, detail="Invalid 'cursor', use next_cursor of the previous page.")
+    
+    startDate = datetime.strptime(startDate, '%Y-%m-%d').date()
+    endDate = datetime.strptime(endDate, '%Y-%m-%d').date()
+    cursor = datetime.strptime(cursor, '%Y-%m-%d').date() if cursor is not None else None
+
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="'endDate' must be on or after 'startDate'.")
+
+    if optionId is None:
+        if not is_valid_date(expiry):
+            raise HTTPException(status_code=400, detail="Incorrect 'expiry' date format must be yyyy-mm-dd.")
+        
+        expiry = datetime.strptime(expiry, '%Y-%m-%d').date()
+        optionId = await find_contract_db(ticker.upper(), expiry, float(strike), type, startDate)
+
+        if optionId is None:
+            raise HTTPException(status_code=400, detail="Contract does not exist.")
+    else:
+        optionId = int(optionId)
+
+    ticker_data = await get_contract_series_db(optionId, startDate, endDate, limit, cursor)
+
+    return ticker_data
+
+
+
+async def get_bulk_chain(apiKey: str, tickers: list, tradeDate: str, expiry: str, type: str):
+    '''
+    Returns option prices of many tickers on tradeDate as a stream of JSON chunks
+
+    :param apiKey: Client api key (string format)
+    :param tickers: list of tickers
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :param expiry: yyyy-mm-dd representaiton of expiry (optional)
+    :param type: 'P' or 'C' (optional)
+    :return: generator of encoded JSON chunks (prices grouped by ticker)
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+    
+    if not is_valid_date(tradeDate):
+        raise HTTPException(status_code=400, detail="Incorrect 'tradeDate' date format must be yyyy-mm-dd.")
+    
+    if expiry is not None and not is_valid_date(expiry):
+        raise HTTPException(status_code=400, detail="Incorrect 'expiry' date format must be yyyy-mm-dd.")
+    
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    tradeDate = datetime.strptime(tradeDate, '%Y-%m-%d').date()
+    if expiry is not None:
+        expiry = datetime.strptime(expiry, '%Y-%m-%d').date()
+
+    chain = await get_bulk_chain_db(tickers, tradeDate, expiry, type)
+
+    return bulk_chain_json(chain, tickers)
@@ -2,6 +2,7 @@ from app.models.stocks import *
 from app.utils.api_key_check import check_api_key
 from app.utils.date_check import is_valid_date
 from fastapi import HTTPException
+from datetime import date, datetime
 
 
 async def get_tickers(apiKey: str) -> list:
@@ -40,14 +41,17 @@ async def get_ticker_info(apiKey: str, ticker: str):
 
 
 
-async def get_hist_price(apiKey: str, ticker: str, start: str, end: str):
+async def get_hist_price(apiKey: str, ticker: str, start: str, end: str, limit: int = None, cursor: str = None, columns: list = None):
     '''
     Returns ticker info from stocks table
 
     :param apiKey: Client api key
-    :param ticker: Ticker in str format (ie AAPL)
+    :param ticker: Ticker in str format (ie AAPL), comma separated for several
     :param start: (Optional) start date in yyyy-mm-dd format
     :param end: (Optional) end date in yyyy-mm-dd fornat
+    :param limit: (Optional) max rows per page
+    :param cursor: (Optional) next_cursor of the previous page (TICKER:yyyy-mm-dd, or yyyy-mm-dd for one ticker)
+    :param columns: (Optional) list of columns to return
     '''
     api_key_check, auth_level = check_api_key(apiKey)
 
@@ -60,8 +64,17 @@ async def get_hist_price(apiKey: str, ticker: str, start: str, end: str):
     if end is not None and not is_valid_date(end):
         raise HTTPException(status_code=400, detail="Incorrect 'end' date format must be yyyy-mm-dd.")
     
-    ticker = ticker.upper()
-    ticker_data = await get_hist_price_db(ticker, start, end)
+    tickers = list(dict.fromkeys(t.strip().upper() for t in ticker.split(',') if t.strip()))
+
+    if cursor is not None:
+        cursor_ticker, _, cursor_date = cursor.rpartition(':')
+
+        if not is_valid_date(cursor_date) or (not cursor_ticker and len(tickers) > 1):
+            raise HTTPException(status_code=400, detail="Invalid 'cursor', use next_cursor of the previous page.")
+        
+        cursor = (cursor_ticker.upper() or tickers[0], datetime.strptime(cursor_date, '%Y-%m-%d').date())
+
+    ticker_data = await get_hist_price_db(tickers, start, end, limit, cursor, columns)
 
     return ticker_data
 
@@ -120,4 +133,34 @@ async def get_hist_earnings(apiKey: str, ticker: str):
     ticker = ticker.upper()
     ticker_data = await get_hist_earnings_db(ticker)
 
-    return ticker_data
\ No newline at end of file
+    return ticker_data
+
+
+async def get_hist_realized_vol(apiKey: str, ticker: str, start: str, end: str, windows: list, estimators: list):
+    '''
+    Returns rolling realized volatility
+
+    :param apiKey: Client api key
+    :param ticker: Ticker in str format (ie AAPL)
+    :param start: (Optional) start date in yyyy-mm-dd format
+    :param end: (Optional) end date in yyyy-mm-dd fornat
+    :param windows: window lengths in trading days
+    :param estimators: realized vol estimators to compute
+    '''
+    api_key_check, auth_level = check_api_key(apiKey)
+
+    if not api_key_check:
+        raise HTTPException(status_code=401, detail="Invalid API Key.")
+
+    if start is not None and not is_valid_date(start):
+        raise HTTPException(status_code=400, detail="Incorrect 'start' date format must be yyyy-mm-dd.")
+    
+    if end is not None and not is_valid_date(end):
+        raise HTTPException(status_code=400, detail="Incorrect 'end' date format must be yyyy-mm-dd.")
+    
+    ticker = ticker.upper()
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start is not None else date.min
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end is not None else date.today()
+    ticker_data = await get_hist_realized_vol_db(ticker, start, end, windows, estimators)
+
+    return ticker_data
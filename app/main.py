@@ -1,6 +1,14 @@
 from fastapi import FastAPI
-from app.routers import stocks, options
-from app.config.db_config import market_db
+from app.routers import stocks, options, health, metrics, admin
+from app.config.db_config import market_db, ANALYTICS_ROUTES, REPLICA_ROUTES
+from app.models.ticker_catalog import ticker_catalog
+from app.warmup import warm_up
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.request_log import RequestLogMiddleware
+from app.utils.database_pools import PoolSelectionMiddleware
+from app.config.request_log_config import REQUEST_LOG_ENABLED
+import asyncio
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.gzip import GZipMiddleware
@@ -8,6 +16,11 @@ from starlette.middleware.gzip import GZipMiddleware
 
 app = FastAPI()
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(PoolSelectionMiddleware, routes={'replica': REPLICA_ROUTES, 'analytics': ANALYTICS_ROUTES}) #Historical reads go to replicas, heavy routes get their own db pool
+app.add_middleware(ProfilingMiddleware) #Only ?profile=1 / X-Profile: 1 requests from admin keys are sampled
+app.add_middleware(MetricsMiddleware) #Times compression too
+if REQUEST_LOG_ENABLED:
+    app.add_middleware(RequestLogMiddleware) #Captures traffic for benchmarks/replay.py
 
 #EXCEPTIONS / ERROR CODES
 @app.exception_handler(StarletteHTTPException)
@@ -24,9 +37,15 @@ async def http_exception_handler(request, exc):
 @app.on_event("startup")
 async def startup():
     await market_db.connect()
+    market_db.start()
+    ticker_catalog.start()
+    app.state.warmup = asyncio.create_task(warm_up()) #Serves /health/live meanwhile, /health/ready waits for it
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.state.warmup.cancel()
+    await ticker_catalog.stop()
+    await market_db.stop()
     await market_db.disconnect()
 
 
@@ -34,4 +53,7 @@ async def shutdown():
 #ROUTES
     
 app.include_router(stocks.router, prefix="/stocks")
-app.include_router(options.router, prefix="/options")
\ No newline at end of file
+app.include_router(options.router, prefix="/options")
+app.include_router(health.router, prefix="/health")
+app.include_router(metrics.router)
+app.include_router(admin.router, prefix="/admin")
@@ -1,17 +1,33 @@
-from time import time
-from tokenize import group
-from xmlrpc.client import Boolean
 from app.config.db_config import market_db
 from datetime import datetime, timedelta
 from plugins.bsm import BsmOption, OptionPosition
+from plugins import bsm_vector
 from app.env import DATA_START_DATE
 from collections import defaultdict
+from itertools import groupby
 import numpy as np
 import io
+import json
 from contextlib import redirect_stdout
-from scipy.interpolate import UnivariateSpline
 from decimal import Decimal
 from app.utils.volatility import forward_vol, implied_jump_volatility, implied_ex_earn, implied_jump_move
+from app.utils.surface import SmileSet
+from app.utils.lru_cache import LRUCache
+from app.utils.chain_index import ChainIndex
+from app.utils.realized_volatility import realized_volatility
+from app.models.stocks import get_ohlc_arrays_db
+from app.models.trading_calendar import trading_calendar
+from app.utils.metrics import timed_phase
+
+
+SMILE_CACHE_SIZE = 4096 #(ticker, trade date) entries, each holds the smiles of one day
+_smile_cache = LRUCache(SMILE_CACHE_SIZE)
+
+CHAIN_INDEX_CACHE_SIZE = 1024
+_chain_index_cache = LRUCache(CHAIN_INDEX_CACHE_SIZE)
+
+CHAIN_CACHE_SIZE = 64
+_chain_cache = LRUCache(CHAIN_CACHE_SIZE)
 
 
 class TextTrap(io.StringIO):
@@ -20,22 +36,54 @@ class TextTrap(io.StringIO):
         pass
 
 
-async def get_hist_expiries_db(ticker: str, tradeDate: str) -> list:
+async def get_chain_index_db(ticker: str, tradeDate) -> ChainIndex:
     '''
-    Gets historical expiries on date
+    Gets the expiry & strike catalog of ticker on date. Listings of a past trade date do not change, so
+    the catalog is built from one query per (ticker, tradeDate) and kept in a bounded cache (empty ones are not kept).
 
     :param ticker: ticker to get option data for
-    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
-    :return: list of expiries
+    :param tradeDate: date object of tradeDate
+    :return: ChainIndex
     '''
+    key = (ticker, str(tradeDate))
+    index = _chain_index_cache.get(key)
+    if index is not None:
+        return index
+
     query = '''
-    SELECT options.expiry_date
+    SELECT
+        options.expiry_date,
+        options.strike,
+        options.type,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
     FROM options
     JOIN option_price ON options.option_id = option_price.option_id
-    WHERE options.ticker = :ticker AND option_price.date = :tradeDate;
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
+    WHERE options.ticker = :ticker AND option_price.date = :tradeDate
+    GROUP BY options.option_id, options.expiry_date, options.strike, options.type;
     '''
     records = await market_db.fetch_all(query, values={'ticker': ticker, 'tradeDate': tradeDate})
-    return list(set([record['expiry_date'] for record in records]))
+
+    factor = np.array([float(r['total_adjustment_factor']) for r in records])
+    strike = np.round(np.array([float(r['strike']) for r in records]) / factor, 2)
+    index = ChainIndex([r['expiry_date'] for r in records], strike, [r['type'] for r in records])
+
+    if records: #An empty day may not be ingested yet, it is looked up again next time
+        _chain_index_cache.put(key, index)
+    return index
+
+
+
+async def get_hist_expiries_db(ticker: str, tradeDate: str) -> list:
+    '''
+    Gets historical expiries on date
+
+    :param ticker: ticker to get option data for
+    :param tradeDate: yyyy-mm-dd representaiton of tradeDate
+    :return: sorted list of expiries
+    '''
+    index = await get_chain_index_db(ticker, tradeDate)
+    return index.expiry_list()
 
 
 
@@ -46,60 +94,24 @@ async def get_hist_strikes_db(ticker: str, tradeDate: str, expiry: str = None) -
     :param ticker: ticker to get option data for
     :param tradeDate: yyyy-mm-dd representation of tradeDate
     :param expiry: yyyy-mm-dd representation of expiry (optional)
-    :return: dict with trade dates as keys and list of strikes as values
+    :return: dict with expiry dates as keys and sorted list of strikes as values
     '''
-    if expiry:
-        query = '''
-        SELECT 
-            options.expiry_date, 
-            options.strike,
-            COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
-        FROM options
-        JOIN option_price ON options.option_id = option_price.option_id
-        LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
-        WHERE options.ticker = :ticker AND option_price.date = :tradeDate AND options.expiry_date = :expiry AND options.type = 'C'
-        GROUP BY options.expiry_date, options.strike
-        ORDER BY options.expiry_date;
-        '''
-        records = await market_db.fetch_all(query, values={'ticker': ticker, 'tradeDate': tradeDate, 'expiry': expiry})
-    else:
-        query = '''
-        SELECT 
-            options.expiry_date, 
-            options.strike,
-            options.adj_strike
-            COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
-        FROM options
-        JOIN option_price ON options.option_id = option_price.option_id
-        LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
-        WHERE options.ticker = :ticker AND option_price.date = :tradeDate AND options.type = 'C'
-        GROUP BY options.expiry_date, options.strike, options.adj_strike
-        ORDER BY options.expiry_date, options.adj_strike;
-        '''
-        records = await market_db.fetch_all(query, values={'ticker': ticker, 'tradeDate': tradeDate})
-
-    # Aggregate strikes by expiry date
-    strikes_by_date = {}
-    for record in records:
-        date = record['expiry_date']
-        strike = round(float(record['strike'] / record['total_adjustment_factor']), 2)
-        if date in strikes_by_date:
-            strikes_by_date[date].append(strike)
-        else:
-            strikes_by_date[date] = [strike]
+    index = await get_chain_index_db(ticker, tradeDate)
 
-    # Ensure the strikes are unique and sorted for each date
-    for date in strikes_by_date:
-        strikes_by_date[date] = sorted(set(strikes_by_date[date]))
+    if expiry:
+        strikes = index.strikes_for(expiry)
+        return {expiry: strikes} if strikes else {}
 
-    return strikes_by_date
+    return index.strikes_by_expiry()
 
 
 
 
-async def get_hist_price_db(ticker: str, tradeDate: str, expiry: str = None, strike: float = None, type: str = None, trim: Boolean = True) -> dict:
+async def get_hist_price_db(ticker: str, tradeDate: str, expiry: str = None, strike: float = None, type: str = None, trim: bool = True) -> dict:
     '''
     Gets historical prices on date.
+    Served from the cached priced chain (a filtered cache miss solves only the filtered contracts),
+    contracts without a solvable iv are skipped.
 
     :param ticker: ticker to get option data for
     :param tradeDate: yyyy-mm-dd representation of tradeDate
@@ -108,73 +120,19 @@ async def get_hist_price_db(ticker: str, tradeDate: str, expiry: str = None, str
     :param type: 'P' or 'C' (optional)
     :return: dict with expiry dates as keys and list of bid-ask price pairs as values
     '''
-    query = '''
-    SELECT 
-        options.expiry_date, 
-        options.strike, 
-        options.adj_strike,
-        options.type, 
-        option_price.spot_price,
-        option_price.interpolated_value,
-        option_price.irate, 
-        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
-    FROM options
-    JOIN option_price ON options.option_id = option_price.option_id
-    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
-    WHERE options.ticker = :ticker AND option_price.date = :tradeDate
-    '''
-
-    values = {'ticker': ticker, 'tradeDate': tradeDate}
+    chain = await get_priced_chain_db(ticker, tradeDate, expiry, type)
 
+    mask = ~np.isnan(chain['ivol'])
     if expiry:
-        query += ' AND options.expiry_date = :expiry'
-        values['expiry'] = expiry
-
+        mask &= chain['expiry'] == np.datetime64(expiry, 'D')
     if type is not None:
-        query += ' AND options.type = :type'
-        values['type'] = type
-
-    query += ' GROUP BY options.expiry_date, options.strike, options.adj_strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value'
-    query += ' ORDER BY options.expiry_date ASC, options.adj_strike ASC;'
-    records = await market_db.fetch_all(query, values=values)
+        mask &= chain['type'] == type
+    if strike is not None:
+        mask &= np.abs(chain['strike'] - float(strike)) <= 0.015
 
     prices_by_date = defaultdict(lambda: {'C': [], 'P': []})
-
-    for record in records:
-        record = dict(record)
-        date = record.get('expiry_date')
-
-        if strike is not None and abs(float(record['strike'] / record['total_adjustment_factor']) - float(strike)) > 0.015:
-            continue
-
-        if date:
-            dte = abs((tradeDate - date).days)
-            date = str(date)
-
-            with redirect_stdout(TextTrap()):
-                option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['interpolated_value']), 2))
-                
-                if option.sigma() == 0:
-                    continue
-
-                option_data = {
-                    'strike': round(float(record['strike'] / record['total_adjustment_factor']), 2), 
-                    'type': record['type'], 
-                    'num_shares': int(round(100 * float(record['total_adjustment_factor']), 0)),
-                    'spot_price': float(record['spot_price']),
-                    'contract_price': round(float(record['interpolated_value']), 2),
-                    'ivol': option.sigma(),
-                    'delta': option.delta(),
-                    'gamma': option.gamma(),
-                    'vega': option.vega(),
-                    'theta': option.theta(),
-                    'rho': option.rho()
-                }
-
-                if record['type'] == 'C':
-                    prices_by_date[date]['C'].append(option_data)
-                elif record['type'] == 'P':
-                    prices_by_date[date]['P'].append(option_data)
+    for i in np.flatnonzero(mask):
+        prices_by_date[str(chain['expiry'][i])][str(chain['type'][i])].append(chain_row(chain, i))
 
     return dict(prices_by_date)
 
@@ -232,67 +190,68 @@ async def get_hist_quotes_db(ticker: str, tradeDate: str, expiry: str = None, st
 
     prices_by_date = defaultdict(lambda: {'C': [], 'P': []})
 
-    for record in records:
-        record = dict(record)
-        date = record.get('expiry_date')
-
-        if strike is not None and abs(float(record['strike'] / record['total_adjustment_factor']) - float(strike)) > 0.015:
-            continue
-
-        if date:
-            mid_price = (record['bid_price'] + record['ask_price']) / 2
-            if record['bid_price'] == 0:
-                mid_price = record['ask_price']
-            elif record['ask_price'] == 0:
-                mid_price = record['bid_price']
-
-            dte = abs((tradeDate - date).days)
-            date = str(date)
-
-            with redirect_stdout(TextTrap()):
-                bid_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['bid_price']), 2))
-                mid_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(mid_price), 2))
-                interpolated_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['interpolated_value']), 2))
-                ask_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['ask_price']), 2))
-
-                option_data = {
-                    'strike': round(float(record['strike'] / record['total_adjustment_factor']), 2), 
-                    'type': record['type'], 
-                    'num_shares': int(round(100 * float(record['total_adjustment_factor']), 0)),
-                    'bid_price': round(float(record['bid_price']), 2),
-                    'bid_ivol': bid_option.sigma(),
-                    'bid_delta': bid_option.delta(),
-                    'bid_gamma': bid_option.gamma(),
-                    'bid_vega': bid_option.vega(),
-                    'bid_theta': bid_option.theta(),
-                    'bid_rho': bid_option.rho(),
-                    'mid_price': round(float(mid_price), 2),
-                    'mid_ivol': mid_option.sigma(),
-                    'mid_delta': mid_option.delta(),
-                    'mid_gamma': mid_option.gamma(),
-                    'mid_vega': mid_option.vega(),
-                    'mid_theta': mid_option.theta(),
-                    'mid_rho': mid_option.rho(),
-                    'interpolated_price': round(float(record['interpolated_value']), 2),
-                    'interpolated_ivol': interpolated_option.sigma(),
-                    'interpolated_delta': interpolated_option.delta(),
-                    'interpolated_gamma': interpolated_option.gamma(),
-                    'interpolated_vega': interpolated_option.vega(),
-                    'interpolated_theta': interpolated_option.theta(),
-                    'interpolated_rho': interpolated_option.rho(),
-                    'ask_price': round(float(record['ask_price']), 2),
-                    'ask_ivol': ask_option.sigma(),
-                    'ask_delta': ask_option.delta(),
-                    'ask_gamma': ask_option.gamma(),
-                    'ask_vega': ask_option.vega(),
-                    'ask_theta': ask_option.theta(),
-                    'ask_rho': ask_option.rho()
-                }
-
-                if record['type'] == 'C':
-                    prices_by_date[date]['C'].append(option_data)
-                elif record['type'] == 'P':
-                    prices_by_date[date]['P'].append(option_data)
+    with timed_phase('compute'):
+        for record in records:
+            record = dict(record)
+            date = record.get('expiry_date')
+
+            if strike is not None and abs(float(record['strike'] / record['total_adjustment_factor']) - float(strike)) > 0.015:
+                continue
+
+            if date:
+                mid_price = (record['bid_price'] + record['ask_price']) / 2
+                if record['bid_price'] == 0:
+                    mid_price = record['ask_price']
+                elif record['ask_price'] == 0:
+                    mid_price = record['bid_price']
+
+                dte = abs((tradeDate - date).days)
+                date = str(date)
+
+                with redirect_stdout(TextTrap()):
+                    bid_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['bid_price']), 2))
+                    mid_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(mid_price), 2))
+                    interpolated_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['interpolated_value']), 2))
+                    ask_option = BsmOption(True, record['type'], float(record['spot_price']), round(float(record['strike'] / record['total_adjustment_factor']), 2), dte, float(record['irate']) if record['irate'] else 0, value=round(float(record['ask_price']), 2))
+
+                    option_data = {
+                        'strike': round(float(record['strike'] / record['total_adjustment_factor']), 2), 
+                        'type': record['type'], 
+                        'num_shares': int(round(100 * float(record['total_adjustment_factor']), 0)),
+                        'bid_price': round(float(record['bid_price']), 2),
+                        'bid_ivol': bid_option.sigma(),
+                        'bid_delta': bid_option.delta(),
+                        'bid_gamma': bid_option.gamma(),
+                        'bid_vega': bid_option.vega(),
+                        'bid_theta': bid_option.theta(),
+                        'bid_rho': bid_option.rho(),
+                        'mid_price': round(float(mid_price), 2),
+                        'mid_ivol': mid_option.sigma(),
+                        'mid_delta': mid_option.delta(),
+                        'mid_gamma': mid_option.gamma(),
+                        'mid_vega': mid_option.vega(),
+                        'mid_theta': mid_option.theta(),
+                        'mid_rho': mid_option.rho(),
+                        'interpolated_price': round(float(record['interpolated_value']), 2),
+                        'interpolated_ivol': interpolated_option.sigma(),
+                        'interpolated_delta': interpolated_option.delta(),
+                        'interpolated_gamma': interpolated_option.gamma(),
+                        'interpolated_vega': interpolated_option.vega(),
+                        'interpolated_theta': interpolated_option.theta(),
+                        'interpolated_rho': interpolated_option.rho(),
+                        'ask_price': round(float(record['ask_price']), 2),
+                        'ask_ivol': ask_option.sigma(),
+                        'ask_delta': ask_option.delta(),
+                        'ask_gamma': ask_option.gamma(),
+                        'ask_vega': ask_option.vega(),
+                        'ask_theta': ask_option.theta(),
+                        'ask_rho': ask_option.rho()
+                    }
+
+                    if record['type'] == 'C':
+                        prices_by_date[date]['C'].append(option_data)
+                    elif record['type'] == 'P':
+                        prices_by_date[date]['P'].append(option_data)
 
     return dict(prices_by_date)
 
@@ -301,11 +260,15 @@ async def get_hist_quotes_db(ticker: str, tradeDate: str, expiry: str = None, st
 
 async def is_date_valid(date: str):
     '''
-    Checks if date is valid
+    Checks if date is valid, answered from the trading calendar unless date is newer than it
     '''
     if str(date) < DATA_START_DATE:
         return False
 
+    known = trading_calendar.contains(str(date))
+    if known is not None:
+        return known
+
     q = f"""
         SELECT *
         FROM dates_processed
@@ -315,6 +278,9 @@ async def is_date_valid(date: str):
     date = datetime.strptime(date, '%Y-%m-%d').date()
     days = await market_db.fetch_all(q, values={'date': date})
 
+    if len(days) > 0 and trading_calendar.loaded:
+        trading_calendar.add(date)
+
     return len(days) > 0
 
 
@@ -372,7 +338,7 @@ async def get_hist_ivrank_db(ticker: str, tradeDate: str, lookback_period: int,
 
     iv_rank = ((current_iv - min_iv) / (max_iv - min_iv)) * 100 if max_iv != min_iv else 0
 
-    num_days_with_lower_iv = np.sum(iv < current_iv for iv in ivs)
+    num_days_with_lower_iv = int(np.sum(ivs < current_iv))
     iv_percentile = ((num_days_with_lower_iv+1) / len(ivs)) * 100
     
 
@@ -462,10 +428,64 @@ async def get_hist_volcone_db(ticker: str, tradeDate: str, lookback_period: int,
     for key, value in returnable.items():
         returnable[key] = round(value, 4)
 
+    returnable['realized'] = await get_realized_cone(ticker, end_date, tradeDate, dte, current_iv)
+
     return returnable
 
 
 
+async def get_realized_cone(ticker: str, start_date, tradeDate, dte: int, current_iv: float) -> dict:
+    '''
+    Gets close to close realized vol cone over the same horizon as an implied vol cone
+
+    :param ticker: ticker to get price data for
+    :param start_date: first date of the lookback period
+    :param tradeDate: last date of the lookback period
+    :param dte: implied vol horizon in calendar days
+    :param current_iv: implied vol on tradeDate for the comparison
+    :return: realized vol cone & implied vs realized metrics
+    '''
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+
+    window = max(2, int(round(dte * 252 / 365)))
+    buffer = timedelta(days=int(window * 1.5) + 10)
+    ohlc = await get_ohlc_arrays_db(ticker, start_date - buffer, tradeDate)
+
+    if len(ohlc['date']) <= window:
+        return {}
+
+    rv = realized_volatility(ohlc['open'], ohlc['high'], ohlc['low'], ohlc['close'], [window], ['close_to_close'])['close_to_close'][window]
+    first = next((i for i, d in enumerate(ohlc['date']) if d >= start_date), len(rv))
+    rvs = rv[first:]
+    rvs = rvs[~np.isnan(rvs)]
+
+    if len(rvs) == 0:
+        return {}
+    
+    current_rv = rvs[-1]
+    quants_rv = np.quantile(rvs, [0, .10, .20, .30, .40, .50, .60, .70, .80, .90, 1])
+
+    realized = {
+        'current_rv': current_rv,
+        'stdev': np.std(rvs),
+        'mean': np.mean(rvs),
+    }
+    for q, value in zip(range(0, 101, 10), quants_rv):
+        realized[f'{q}%'] = value
+
+    realized['iv_rv_spread'] = current_iv - current_rv
+    realized['iv_rv_ratio'] = current_iv / current_rv if current_rv > 0 else None
+
+    for key, value in realized.items():
+        realized[key] = round(float(value), 4) if value is not None else None
+
+    realized['window'] = window
+
+    return realized
+
+
+
 async def get_hist_earnings_db(ticker: str, tradeDate: str) -> list:
     '''
     Gets historical earnings data on and before date
@@ -744,6 +764,773 @@ async def get_hist_ivinfo_db(ticker: str, tradeDate: str, expiry: str) -> list:
 
 
 
+async def get_smiles_db(ticker: str, startDate, endDate) -> SmileSet:
+    '''
+    Gets array backed smiles for every trade date in range.
+    Smiles are cached per (ticker, trade date), so overlapping ranges share entries and the cache holds a
+    bounded number of days. Only the span of uncached trade dates is queried, a range the trading calendar
+    does not cover yet is queried in full.
+
+    :param ticker: ticker to get iv data for
+    :param startDate: first trade date (inclusive)
+    :param endDate: last trade date (inclusive)
+    :return: SmileSet of all (trade_date, dte) smiles
+    '''
+    smiles_by_day = {}
+    if trading_calendar.contains(str(endDate)) is not None:
+        days = [str(day) for day in trading_calendar.between(startDate, endDate)]
+        for day in days:
+            smiles = _smile_cache.get((ticker, day))
+            if smiles is not None:
+                smiles_by_day[day] = smiles
+        missing = [day for day in days if day not in smiles_by_day]
+        if not missing:
+            return SmileSet.concat([smiles_by_day[day] for day in days])
+        startDate, endDate = datetime.strptime(missing[0], '%Y-%m-%d').date(), datetime.strptime(missing[-1], '%Y-%m-%d').date()
+    else:
+        missing = []
+
+    query = """
+        SELECT trade_date, dte, moneyness, actual_moneyness, iv
+        FROM stock_iv
+        WHERE ticker = :ticker
+            AND trade_date >= :startDate
+            AND trade_date <= :endDate
+            AND dte > 0
+        ORDER BY trade_date, dte, moneyness;
+    """
+    records = await market_db.fetch_all(query, values={'ticker': ticker, 'startDate': startDate, 'endDate': endDate})
+
+    for day, rows in groupby(records, key=lambda r: str(r['trade_date'])):
+        smiles_by_day[day] = SmileSet(list(rows))
+        _smile_cache.put((ticker, day), smiles_by_day[day])
+
+    #Processed days without iv rows are remembered too, except the latest one (it may still be ingesting)
+    for day in missing:
+        if day not in smiles_by_day and day < str(trading_calendar.latest):
+            smiles_by_day[day] = SmileSet([])
+            _smile_cache.put((ticker, day), smiles_by_day[day])
+
+    return SmileSet.concat([smiles_by_day[day] for day in sorted(smiles_by_day)])
+
+
+
+async def get_hist_surface_db(ticker: str, tradeDate, endDate, moneyness_points: int, min_dte: int, max_dte: int, dte_points: int, binary: bool = False):
+    '''
+    Gets implied volatility surface (moneyness x dte) for trade date or range of trade dates
+
+    :param ticker: ticker to get iv data for
+    :param tradeDate: first trade date
+    :param endDate: last trade date (None for tradeDate only)
+    :param moneyness_points: number of evenly spaced moneyness points in [0, 1]
+    :param min_dte: first dte of grid
+    :param max_dte: last dte of grid
+    :param dte_points: number of evenly spaced dte points
+    :param binary: return npz encoded bytes instead of dict
+    :return: surface dict with iv indexed [trade_date][dte][moneyness] (or npz bytes)
+    '''
+    if endDate is None:
+        endDate = tradeDate
+
+    smiles = await get_smiles_db(ticker, tradeDate, endDate)
+
+    moneyness = np.linspace(0, 1, moneyness_points)
+    dtes = np.linspace(min_dte, max_dte, dte_points)
+    with timed_phase('compute'):
+        trade_dates, grid = smiles.term_structure(moneyness, dtes)
+
+    if binary:
+        buffer = io.BytesIO()
+        np.savez(buffer, trade_dates=np.array(trade_dates, dtype='datetime64[D]'), moneyness=moneyness, dte=dtes, iv=grid)
+        return buffer.getvalue()
+
+    if len(trade_dates) == 0:
+        return {}
+
+    return {
+        'trade_dates': [str(d) for d in trade_dates],
+        'moneyness': moneyness.round(6).tolist(),
+        'dte': dtes.round(6).tolist(),
+        'iv': grid.tolist()
+    }
+
+
+
+async def get_hist_skew_series_db(ticker: str, startDate, endDate, dtes: list) -> dict:
+    '''
+    Gets skew & term structure metrics for every trade date in range at constant maturities
+
+    :param ticker: ticker to get iv data for
+    :param startDate: first trade date
+    :param endDate: last trade date
+    :param dtes: list of constant maturities (days) to evaluate skews at
+    :return: dict of metric series aligned to trade_dates (null where a ratio is not finite)
+    '''
+    smiles = await get_smiles_db(ticker, startDate, endDate)
+
+    moneyness = np.array([0, .25, .5, .75, 1])
+    with timed_phase('compute'):
+        trade_dates, grid = smiles.term_structure(moneyness, dtes)
+    _, slope = smiles.term_slope(0.5)
+
+    if len(trade_dates) == 0:
+        return {}
+
+    clean = lambda values: [finite_or_none(v) for v in values] #A zero / missing iv gives inf / nan ratios, not valid JSON
+
+    series = {}
+    for i, dte in enumerate(dtes):
+        iv0, iv25, iv50, iv75, iv100 = (grid[:, i, j] for j in range(len(moneyness)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            series[str(dte)] = {
+                'iv50': clean(iv50),
+                '0_100_skew': clean(iv0 / iv100), #put / call
+                '25_75_skew': clean(iv25 / iv75), #put / call
+                '25_50_skew': clean(iv25 / iv50), #put / atm
+                '0_50_skew': clean(iv0 / iv50), #put / atm
+                '50_75_skew': clean(iv50 / iv75), #atm / call
+                '50_100_skew': clean(iv50 / iv100), #atm / call
+                'implied_daily_move': clean(iv50 / np.sqrt(252))
+            }
+
+    return {
+        'trade_dates': [str(d) for d in trade_dates],
+        'dte': series,
+        'term_structure_slope': clean(slope)
+    }
+
+
+
+async def get_chain_arrays_db(ticker: str, tradeDate, expiry=None, type: str = None) -> dict:
+    '''
+    Gets option chain on date as split adjusted column arrays (see chain_from_records)
+
+    :param ticker: ticker to get option data for
+    :param tradeDate: date object of tradeDate
+    :param expiry: date object of expiry (optional)
+    :param type: 'P' or 'C' (optional)
+    :return: dict of column arrays
+    '''
+    query = '''
+    SELECT 
+        options.option_id,
+        options.expiry_date, 
+        options.strike, 
+        options.type, 
+        option_price.spot_price,
+        option_price.interpolated_value,
+        option_price.irate, 
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
+    WHERE options.ticker = :ticker AND option_price.date = :tradeDate
+    '''
+
+    values = {'ticker': ticker, 'tradeDate': tradeDate}
+
+    if expiry:
+        query += ' AND options.expiry_date = :expiry'
+        values['expiry'] = expiry
+
+    if type is not None:
+        query += ' AND options.type = :type'
+        values['type'] = type
+
+    query += ' GROUP BY options.option_id, options.expiry_date, options.strike, options.adj_strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value'
+    query += ' ORDER BY options.expiry_date ASC, options.adj_strike ASC;'
+    records = await market_db.fetch_all(query, values=values)
+
+    return chain_from_records(records, tradeDate)
+
+
+
+async def get_priced_chain_db(ticker: str, tradeDate, expiry=None, type: str = None) -> dict:
+    '''
+    Gets the whole option chain of ticker on date with ivs & greeks (see price_chain),
+    cached per (ticker, tradeDate). Callers filter the arrays and must not modify them.
+    On a cache miss with expiry / type filters only the matching contracts are queried and solved
+    (not cached), so a filtered request never pays for the full chain.
+
+    :param ticker: ticker to get option data for
+    :param tradeDate: date object of tradeDate
+    :param expiry: date object of expiry (optional)
+    :param type: 'P' or 'C' (optional)
+    :return: dict of priced column arrays (possibly more than the filters, callers still filter)
+    '''
+    key = (ticker, str(tradeDate))
+    chain = _chain_cache.get(key)
+    if chain is not None:
+        return chain
+
+    if expiry or type is not None:
+        return price_chain(await get_chain_arrays_db(ticker, tradeDate, expiry, type))
+
+    chain = price_chain(await get_chain_arrays_db(ticker, tradeDate))
+    _chain_cache.put(key, chain)
+
+    return chain
+
+
+
+async def get_hist_by_delta_db(ticker: str, tradeDate, deltas: list, expiry=None) -> dict:
+    '''
+    Gets nearest listed contract & interpolated strike for each target delta per expiry.
+    Positive target deltas are matched against calls, negative against puts.
+
+    :param ticker: ticker to get option data for
+    :param tradeDate: date object of tradeDate
+    :param deltas: list of target deltas (ie [-0.25, 0.10])
+    :param expiry: date object of expiry (optional)
+    :return: dict with expiry dates as keys and matches per type as values
+    '''
+    chain = await get_priced_chain_db(ticker, tradeDate, expiry)
+    valid = ~np.isnan(chain['ivol'])
+    if expiry:
+        valid &= chain['expiry'] == np.datetime64(expiry, 'D')
+
+    targets = {
+        'C': np.array(sorted(d for d in deltas if d > 0)),
+        'P': np.array(sorted(d for d in deltas if d < 0)),
+    }
+
+    by_expiry = {}
+    for exp in np.unique(chain['expiry'][valid]):
+        exp_mask = valid & (chain['expiry'] == exp)
+        matches = {'dte': int(chain['dte'][exp_mask][0]), 'C': [], 'P': []}
+
+        for type, target in targets.items():
+            idx = np.flatnonzero(exp_mask & (chain['type'] == type))
+            if len(idx) == 0 or len(target) == 0:
+                continue
+
+            # Delta falls as strike rises, force it monotone so it can be searched
+            idx = idx[np.argsort(chain['strike'][idx], kind='stable')]
+            strikes = chain['strike'][idx]
+            neg_delta = -np.minimum.accumulate(chain['delta'][idx])
+
+            pos = np.searchsorted(neg_delta, -target)
+            left = np.clip(pos - 1, 0, len(idx) - 1)
+            right = np.clip(pos, 0, len(idx) - 1)
+            actual = chain['delta'][idx]
+            nearest = np.where(np.abs(actual[left] - target) <= np.abs(actual[right] - target), left, right)
+
+            in_range = (-target >= neg_delta[0]) & (-target <= neg_delta[-1])
+            interpolated = np.interp(-target, neg_delta, strikes)
+
+            for j, t in enumerate(target):
+                matches[type].append({
+                    'target_delta': float(t),
+                    'interpolated_strike': round(float(interpolated[j]), 2) if in_range[j] else None,
+                    'contract': chain_row(chain, idx[nearest[j]])
+                })
+
+        by_expiry[str(np.datetime64(exp, 'D'))] = matches
+
+    return by_expiry
+
+
+
+async def get_marks_db(tickers: list, expiries: list, tradeDate) -> dict:
+    '''
+    Gets every contract of the given tickers & expiries on date in one query
+
+    :param tickers: list of tickers
+    :param expiries: list of expiry date objects
+    :param tradeDate: date object of tradeDate
+    :return: column arrays (see chain_from_records) with an added 'ticker' column
+    '''
+    query = '''
+    SELECT 
+        options.ticker,
+        options.option_id,
+        options.expiry_date, 
+        options.strike, 
+        options.type, 
+        option_price.spot_price,
+        option_price.interpolated_value,
+        option_price.irate, 
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
+    WHERE options.ticker = ANY(:tickers) AND options.expiry_date = ANY(:expiries) AND option_price.date = :tradeDate
+    GROUP BY options.ticker, options.option_id, options.expiry_date, options.strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value;
+    '''
+    records = await market_db.fetch_all(query, values={'tickers': tickers, 'expiries': expiries, 'tradeDate': tradeDate})
+
+    marks = chain_from_records(records, tradeDate)
+    marks['ticker'] = np.array([r['ticker'] for r in records], dtype=object)
+
+    return marks
+
+
+
+async def get_portfolio_greeks_db(tradeDate, positions: list) -> dict:
+    '''
+    Gets marks & greeks for many positions, aggregated per position and in total.
+    Greeks follow OptionPosition: legs are summed by quantity and shares add shares / 100 delta.
+    Leg quantities are scaled by deliverable shares / 100, a split adjusted contract counts its actual shares.
+
+    :param tradeDate: date object of tradeDate
+    :param positions: list of {'legs': [{'ticker', 'expiry' (date), 'strike', 'type', 'quantity'}], 'shares', 'name'}
+    :return: per position & total greeks
+    '''
+    legs = [(i, j, leg) for i, position in enumerate(positions) for j, leg in enumerate(position['legs'])]
+    tickers = sorted(set(leg['ticker'] for _, _, leg in legs))
+    expiries = sorted(set(leg['expiry'] for _, _, leg in legs))
+
+    marks = await get_marks_db(tickers, expiries, tradeDate)
+    lookup = {
+        (ticker, str(expiry), type, float(strike)): k
+        for k, (ticker, expiry, type, strike) in enumerate(zip(marks['ticker'], marks['expiry'], marks['type'], marks['strike']))
+    }
+
+    mark_idx = np.array([lookup.get((leg['ticker'], str(leg['expiry']), leg['type'], round(float(leg['strike']), 2)), -1) for _, _, leg in legs], dtype=np.int64)
+    position_idx = np.array([i for i, _, _ in legs], dtype=np.int64)
+    quantity = np.array([float(leg['quantity']) for _, _, leg in legs])
+
+    # Only solve the contracts that are actually held
+    held, leg_to_held = np.unique(mark_idx[mark_idx >= 0], return_inverse=True)
+    priced = price_chain({key: column[held] for key, column in marks.items()})
+
+    found = mark_idx >= 0
+    solved = np.zeros(len(legs), dtype=bool)
+    solved[found] = ~np.isnan(priced['ivol'][leg_to_held])
+    usable = found & solved
+
+    contract = np.full(len(legs), -1, dtype=np.int64)
+    contract[found] = leg_to_held
+    c = contract[usable]
+
+    held_quantity = quantity[usable] * priced['num_shares'][c] / 100 #Split adjusted contracts deliver num_shares
+    book = OptionPosition()
+    book.addLegArrays(priced['type'][c], priced['spot_price'][c], priced['strike'][c], priced['dte'][c], priced['irate'][c], priced['ivol'][c], held_quantity)
+    leg_values = book.legGreeks()
+    leg_values['price'] = priced['value'][c] * held_quantity #Market mark rather than theoretical
+
+    n_positions = len(positions)
+    shares = np.array([float(position['shares']) for position in positions])
+    totals = {}
+    for key, values in leg_values.items():
+        totals[key] = np.bincount(position_idx[usable], weights=values, minlength=n_positions)
+    totals['delta'] = totals['delta'] + shares / 100
+
+    legs_priced = np.bincount(position_idx[usable], minlength=n_positions)
+    result = {'positions': [], 'total': {}, 'unpriced_legs': []}
+    for i, position in enumerate(positions):
+        summary = {'name': position.get('name'), 'legs': len(position['legs']), 'legs_priced': int(legs_priced[i]), 'shares': position['shares']}
+        for key in totals:
+            summary[key] = float(totals[key][i])
+        result['positions'].append(summary)
+
+    for key in totals:
+        result['total'][key] = float(totals[key].sum())
+
+    for k in np.flatnonzero(~usable):
+        i, j, leg = legs[k]
+        result['unpriced_legs'].append({'position': i, 'leg': j, 'reason': 'not found' if not found[k] else 'iv not solvable'})
+
+    return result
+
+
+
+async def get_risk_scenario_db(tradeDate, legs: list, shares: float, spot_shocks: list, vol_shocks: list, days_forward: list, binary: bool = False):
+    '''
+    Gets P&L & greeks of a position over a spot x vol x days forward grid.
+    Starting ivs are solved from the trade date's marks of each leg, quantities are scaled by deliverable shares / 100.
+    Non finite grid cells are returned as null.
+
+    :param tradeDate: date object of tradeDate
+    :param legs: list of {'ticker', 'expiry' (date), 'strike', 'type', 'quantity'} on one underlying
+    :param shares: shares of the underlying held
+    :param spot_shocks: fractional spot moves (ie -0.1 for -10%)
+    :param vol_shocks: vol points added to every leg's iv (ie 0.05)
+    :param days_forward: calendar days elapsed
+    :param binary: return grids as npz encoded bytes instead of dict
+    :return: grids indexed [spot][vol][day] (or unpriced legs if any leg has no usable mark)
+    '''
+    marks = await get_marks_db(sorted(set(leg['ticker'] for leg in legs)), sorted(set(leg['expiry'] for leg in legs)), tradeDate)
+    lookup = {
+        (ticker, str(expiry), type, float(strike)): k
+        for k, (ticker, expiry, type, strike) in enumerate(zip(marks['ticker'], marks['expiry'], marks['type'], marks['strike']))
+    }
+    mark_idx = np.array([lookup.get((leg['ticker'], str(leg['expiry']), leg['type'], round(float(leg['strike']), 2)), -1) for leg in legs], dtype=np.int64)
+
+    unpriced = [{'leg': int(j), 'reason': 'not found'} for j in np.flatnonzero(mark_idx < 0)]
+    if unpriced:
+        return {'unpriced_legs': unpriced}
+    
+    priced = price_chain({key: column[mark_idx] for key, column in marks.items()})
+    unpriced = [{'leg': int(j), 'reason': 'iv not solvable'} for j in np.flatnonzero(np.isnan(priced['ivol']))]
+    if unpriced:
+        return {'unpriced_legs': unpriced}
+    
+    spot = float(priced['spot_price'][0])
+    position = OptionPosition()
+    quantity = np.array([float(leg['quantity']) for leg in legs]) * priced['num_shares'] / 100 #Split adjusted contracts deliver num_shares
+    position.addLegArrays(priced['type'], spot, priced['strike'], priced['dte'], priced['irate'], priced['ivol'], quantity)
+    position.addShares(shares)
+
+    spots = spot * (1 + np.asarray(spot_shocks, dtype=float))
+    grid = position.scenario_grid(spots, vol_shocks, days_forward, relative=True)
+
+    if binary:
+        buffer = io.BytesIO()
+        np.savez(buffer, spots=spots, vol_shocks=np.asarray(vol_shocks, dtype=float), days_forward=np.asarray(days_forward), **grid)
+        return buffer.getvalue()
+
+    result = {
+        'spot': spot,
+        'spots': spots.tolist(),
+        'spot_shocks': list(spot_shocks),
+        'vol_shocks': list(vol_shocks),
+        'days_forward': list(days_forward),
+        'legs': [chain_row(priced, j) for j in range(len(legs))],
+        'current': {key: finite_or_none(getattr(position, key)()) for key in OptionPosition.GREEKS},
+    }
+    for key in ['pnl'] + OptionPosition.GREEKS:
+        values = grid[key].round(6)
+        #Expired legs or inf greeks leave non finite cells, not valid JSON
+        result[key] = values.tolist() if np.isfinite(values).all() else np.vectorize(finite_or_none, otypes=[object])(values).tolist()
+
+    return result
+
+
+
+async def get_position_series_db(startDate, endDate, legs: list, shares: float = 0) -> dict:
+    '''
+    Gets daily marks, ivs & greeks of a fixed position between two dates.
+    Contracts are matched on their split adjusted strike on the first trade date in range, then
+    followed by option_id through one range query so splits inside the range keep the same contract.
+    Legs are scaled by deliverable shares / 100 so a split shows no P&L jump.
+    A contract missing on a day keeps its last mark and is left out of that day's greeks.
+
+    :param startDate: date object of first trade date
+    :param endDate: date object of last trade date
+    :param legs: list of {'ticker', 'expiry' (date), 'strike', 'type', 'quantity'}
+    :param shares: shares of the underlying held (adds shares / 100 delta)
+    :return: contracts & daily series (or unpriced legs if a leg is not found)
+    '''
+    first_q = '''
+        SELECT MIN(dates_processed.date) AS date
+        FROM dates_processed
+        WHERE dates_processed.date >= :start AND dates_processed.date <= :end;
+    '''
+    first = await market_db.fetch_one(first_q, values={'start': startDate, 'end': endDate})
+    if first is None or first['date'] is None:
+        return {'unpriced_legs': [{'leg': j, 'reason': 'no trade dates in range'} for j in range(len(legs))]}
+    start = first['date']
+
+    marks = await get_marks_db(sorted(set(leg['ticker'] for leg in legs)), sorted(set(leg['expiry'] for leg in legs)), start)
+    lookup = {
+        (ticker, str(expiry), type, float(strike)): k
+        for k, (ticker, expiry, type, strike) in enumerate(zip(marks['ticker'], marks['expiry'], marks['type'], marks['strike']))
+    }
+    mark_idx = np.array([lookup.get((leg['ticker'], str(leg['expiry']), leg['type'], round(float(leg['strike']), 2)), -1) for leg in legs], dtype=np.int64)
+
+    unpriced = [{'leg': int(j), 'reason': f'not found on {start}'} for j in np.flatnonzero(mark_idx < 0)]
+    if unpriced:
+        return {'unpriced_legs': unpriced}
+
+    leg_ids = marks['option_id'][mark_idx]
+    held_ids = np.unique(leg_ids)
+
+    query = '''
+    SELECT
+        option_price.date,
+        options.option_id,
+        options.expiry_date,
+        options.strike,
+        options.type,
+        option_price.spot_price,
+        option_price.interpolated_value,
+        option_price.irate,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND option_price.date >= option_splits.split_date
+    WHERE options.option_id = ANY(:option_ids) AND option_price.date >= :start AND option_price.date <= :end
+    GROUP BY option_price.date, options.option_id, options.expiry_date, options.strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value
+    ORDER BY option_price.date;
+    '''
+    records = await market_db.fetch_all(query, values={'option_ids': [int(i) for i in held_ids], 'start': start, 'end': endDate})
+
+    chain = price_chain(chain_from_records(records, None))
+    days, day_idx = np.unique(np.array([r['date'] for r in records], dtype='datetime64[D]'), return_inverse=True)
+    contract_idx = np.searchsorted(held_ids, chain['option_id'])
+
+    # (day, contract) -> row of chain, -1 when the contract is not quoted that day
+    rows = np.full((len(days), len(held_ids)), -1, dtype=np.int64)
+    rows[day_idx, contract_idx] = np.arange(len(day_idx))
+
+    # Contract marks (per 100 deliverable shares) carried forward over missing days
+    multiplier = chain['num_shares'] / 100
+    last = np.maximum.accumulate(np.where(rows >= 0, np.arange(len(days))[:, None], 0), axis=0)
+    marks_ff = (chain['value'] * multiplier)[rows[last, np.arange(len(held_ids))]]
+
+    leg_contract = np.searchsorted(held_ids, leg_ids)
+    quantity = np.array([float(leg['quantity']) for leg in legs])
+    value = marks_ff[:, leg_contract] @ quantity
+
+    # Legs quoted with a solvable iv, aggregated per day like OptionPosition
+    leg_rows = rows[:, leg_contract]
+    leg_day = np.repeat(np.arange(len(days)), len(legs))
+    leg_qty = np.tile(quantity, len(days))
+    flat_rows = leg_rows.ravel()
+    usable = flat_rows >= 0
+    usable[usable] = ~np.isnan(chain['ivol'][flat_rows[usable]])
+    r = flat_rows[usable]
+
+    book = OptionPosition()
+    book.addLegArrays(chain['type'][r], chain['spot_price'][r], chain['strike'][r], chain['dte'][r], chain['irate'][r], chain['ivol'][r], leg_qty[usable] * multiplier[r])
+    greeks = {key: np.bincount(leg_day[usable], weights=values, minlength=len(days)) for key, values in book.legGreeks().items() if key != 'price'}
+    greeks['delta'] = greeks['delta'] + shares / 100
+    legs_priced = np.bincount(leg_day[usable], minlength=len(days))
+
+    series = []
+    for d in range(len(days)):
+        point = {'date': str(days[d]), 'value': float(value[d]), 'pnl': float(value[d] - value[0]), 'legs_priced': int(legs_priced[d])}
+        for key in greeks:
+            point[key] = float(greeks[key][d])
+        point['legs'] = [chain_row(chain, i) if i >= 0 else None for i in leg_rows[d]]
+        series.append(point)
+
+    contracts = [{
+        'ticker': leg['ticker'],
+        'expiry': str(leg['expiry']),
+        'strike': float(marks['strike'][k]),
+        'type': leg['type'],
+        'quantity': leg['quantity'],
+        'option_id': int(marks['option_id'][k]),
+    } for leg, k in zip(legs, mark_idx)]
+
+    return {'start_date': str(start), 'shares': shares, 'legs': contracts, 'series': series}
+
+
+
+async def find_contract_db(ticker: str, expiry, strike: float, type: str, asOf):
+    '''
+    Gets option_id of the contract whose split adjusted strike on asOf matches strike
+
+    :param ticker: ticker of the contract
+    :param expiry: date object of expiry
+    :param strike: strike adjusted as of asOf
+    :param type: 'P' or 'C'
+    :param asOf: date object the strike is quoted on
+    :return: option_id or None
+    '''
+    query = '''
+    SELECT
+        options.option_id,
+        options.strike,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :asOf >= option_splits.split_date
+    WHERE options.ticker = :ticker AND options.expiry_date = :expiry AND options.type = :type
+    GROUP BY options.option_id, options.strike;
+    '''
+    records = await market_db.fetch_all(query, values={'ticker': ticker, 'expiry': expiry, 'type': type, 'asOf': asOf})
+
+    for record in records:
+        if abs(float(record['strike'] / record['total_adjustment_factor']) - float(strike)) <= 0.015:
+            return record['option_id']
+
+    return None
+
+
+
+async def get_contract_series_db(optionId: int, startDate, endDate, limit: int, cursor=None) -> dict:
+    '''
+    Gets the daily quote & iv history of one contract, one page at a time.
+    Pages are keyset paginated on date: the next page starts after next_cursor, so deep pages cost the same as the first.
+
+    :param optionId: option_id of the contract
+    :param startDate: date object of first trade date
+    :param endDate: date object of last trade date
+    :param limit: max days returned
+    :param cursor: date object of the last day of the previous page (optional)
+    :return: contract info, series & next_cursor (None on the last page)
+    '''
+    query = '''
+    SELECT
+        option_price.date,
+        options.option_id,
+        options.ticker,
+        options.expiry_date,
+        options.strike,
+        options.type,
+        option_price.spot_price,
+        option_price.bid_price,
+        option_price.ask_price,
+        option_price.interpolated_value,
+        option_price.volume,
+        option_price.open_interest,
+        option_price.irate,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND option_price.date >= option_splits.split_date
+    WHERE options.option_id = :optionId AND option_price.date >= :start AND option_price.date <= :end
+    '''
+    values = {'optionId': optionId, 'start': startDate, 'end': endDate, 'limit': limit + 1}
+
+    if cursor is not None:
+        query += ' AND option_price.date > :cursor'
+        values['cursor'] = cursor
+
+    query += ' GROUP BY option_price.date, options.option_id, options.ticker, options.expiry_date, options.strike, options.type, option_price.spot_price, option_price.bid_price, option_price.ask_price, option_price.interpolated_value, option_price.volume, option_price.open_interest, option_price.irate'
+    query += ' ORDER BY option_price.date ASC LIMIT :limit;'
+    records = await market_db.fetch_all(query, values=values)
+
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = str(records[-1]['date'])
+
+    if len(records) == 0:
+        return {'contract': None, 'series': [], 'next_cursor': None}
+
+    chain = chain_from_records(records, None)
+    bid = np.round(np.array([float(r['bid_price']) for r in records]), 2)
+    ask = np.round(np.array([float(r['ask_price']) for r in records]), 2)
+    mid = np.round(np.where(bid == 0, ask, np.where(ask == 0, bid, (bid + ask) / 2)), 2) #Same one sided rule as get_hist_quotes_db
+
+    # One iv solve for every price of every day
+    n = len(records)
+    prices = np.concatenate([bid, mid, ask, chain['value']])
+    is_call = np.tile(chain['type'] == 'C', 4)
+    T = np.tile(chain['dte'] / 365, 4)
+    with timed_phase('compute'):
+        ivols = bsm_vector.implied_volatility(prices, is_call, np.tile(chain['spot_price'], 4), np.tile(chain['strike'], 4), T, np.tile(chain['irate'], 4)).reshape(4, n)
+
+    def clean(value):
+        value = float(value)
+        return None if np.isnan(value) else value
+
+    series = []
+    for i, record in enumerate(records):
+        series.append({
+            'date': str(record['date']),
+            'dte': int(chain['dte'][i]),
+            'strike': float(chain['strike'][i]),
+            'num_shares': int(chain['num_shares'][i]),
+            'spot_price': float(chain['spot_price'][i]),
+            'bid_price': float(bid[i]),
+            'bid_ivol': clean(ivols[0, i]),
+            'mid_price': float(mid[i]),
+            'mid_ivol': clean(ivols[1, i]),
+            'ask_price': float(ask[i]),
+            'ask_ivol': clean(ivols[2, i]),
+            'interpolated_price': float(chain['value'][i]),
+            'interpolated_ivol': clean(ivols[3, i]),
+            'volume': record['volume'],
+            'open_interest': record['open_interest'],
+        })
+
+    contract = {
+        'option_id': records[0]['option_id'],
+        'ticker': records[0]['ticker'],
+        'expiry': str(records[0]['expiry_date']),
+        'type': records[0]['type'],
+    }
+
+    return {'contract': contract, 'series': series, 'next_cursor': next_cursor}
+
+
+
+async def get_bulk_chain_db(tickers: list, tradeDate, expiry=None, type: str = None) -> dict:
+    '''
+    Gets & prices the option chains of many tickers on date with one query and one iv solve
+
+    :param tickers: list of tickers
+    :param tradeDate: date object of tradeDate
+    :param expiry: date object of expiry (optional)
+    :param type: 'P' or 'C' (optional)
+    :return: priced column arrays (see price_chain) with a 'ticker' column
+    '''
+    query = '''
+    SELECT
+        options.ticker,
+        options.option_id,
+        options.expiry_date,
+        options.strike,
+        options.type,
+        option_price.spot_price,
+        option_price.interpolated_value,
+        option_price.irate,
+        COALESCE(EXP(SUM(LN(option_splits.adjustment_factor))), 1) AS total_adjustment_factor
+    FROM options
+    JOIN option_price ON options.option_id = option_price.option_id
+    LEFT JOIN option_splits ON options.option_id = option_splits.option_id AND :tradeDate >= option_splits.split_date
+    WHERE options.ticker = ANY(:tickers) AND option_price.date = :tradeDate
+    '''
+
+    values = {'tickers': tickers, 'tradeDate': tradeDate}
+
+    if expiry:
+        query += ' AND options.expiry_date = :expiry'
+        values['expiry'] = expiry
+
+    if type is not None:
+        query += ' AND options.type = :type'
+        values['type'] = type
+
+    query += ' GROUP BY options.ticker, options.option_id, options.expiry_date, options.strike, options.adj_strike, options.type, option_price.spot_price, option_price.irate, option_price.interpolated_value'
+    query += ' ORDER BY options.expiry_date ASC, options.adj_strike ASC;'
+    records = await market_db.fetch_all(query, values=values)
+
+    chain = chain_from_records(records, tradeDate)
+    chain['ticker'] = np.array([r['ticker'] for r in records], dtype=object)
+
+    return price_chain(chain)
+
+
+
+def bulk_chain_json(chain: dict, tickers: list):
+    '''
+    Streams a priced bulk chain as a success_return JSON document, one ticker at a time.
+    Each ticker holds the get_hist_price_db shape, contracts without a solvable iv are skipped as there.
+
+    :param chain: output of get_bulk_chain_db
+    :param tickers: requested tickers (tickers without data are returned empty)
+    :return: generator of encoded JSON chunks
+    '''
+    valid = ~np.isnan(chain['ivol'])
+    chain = {key: column[valid] for key, column in chain.items()}
+
+    # Python lists once for the whole batch, rows are then zipped per ticker
+    columns = {
+        'strike': chain['strike'].tolist(),
+        'type': chain['type'].tolist(),
+        'num_shares': chain['num_shares'].tolist(),
+        'spot_price': chain['spot_price'].tolist(),
+        'contract_price': chain['value'].tolist(),
+    }
+    for key in ['ivol', 'delta', 'gamma', 'vega', 'theta', 'rho']:
+        columns[key] = [finite_or_none(value) for value in chain[key].tolist()] #Like chain_row, greeks can be inf on a solvable iv
+    keys = list(columns)
+    rows = list(zip(*columns.values()))
+    expiries = chain['expiry'].astype(str).tolist()
+
+    # Stable sort keeps the expiry & strike order of the query within each ticker
+    order = np.argsort(chain['ticker'].astype(str), kind='stable')
+    sorted_tickers = chain['ticker'].astype(str)[order]
+    starts = np.searchsorted(sorted_tickers, tickers, side='left')
+    ends = np.searchsorted(sorted_tickers, tickers, side='right')
+
+    yield b'{"message": "ok", "data": {'
+    for n, (ticker, start, end) in enumerate(zip(tickers, starts, ends)):
+        prices_by_date = {}
+        for i in order[start:end]:
+            prices_by_date.setdefault(expiries[i], {'C': [], 'P': []})[columns['type'][i]].append(dict(zip(keys, rows[i])))
+
+        yield (', ' if n else '').encode() + json.dumps(ticker).encode() + b': ' + json.dumps(prices_by_date, allow_nan=False).encode()
+    yield b'}}'
+
+
+
+
 ###HELPERS
 def convert_decimal_to_float(item):
     """
@@ -761,6 +1548,88 @@ def convert_decimal_to_float(item):
     return item
 
 
+def chain_from_records(records, tradeDate) -> dict:
+    """
+    Converts option chain rows into split adjusted column arrays.
+    Strikes & contract prices are rounded exactly as the per row BsmOption path did (python round,
+    np.round can land a tie 0.01 away).
+
+    :param records: rows with option_id, expiry_date, strike, type, spot_price, interpolated_value, irate & total_adjustment_factor
+    :param tradeDate: date object rows were priced on (None to use each row's 'date')
+    :return: dict of numpy arrays keyed by column
+    """
+    factor = np.array([float(r['total_adjustment_factor']) for r in records])
+    expiry = np.array([r['expiry_date'] for r in records], dtype='datetime64[D]')
+    trade = np.datetime64(tradeDate, 'D') if tradeDate is not None else np.array([r['date'] for r in records], dtype='datetime64[D]')
+
+    return {
+        'option_id': np.array([r['option_id'] for r in records]),
+        'expiry': expiry,
+        'dte': np.abs((expiry - trade).astype(np.int64)),
+        'strike': np.array([round(float(r['strike'] / r['total_adjustment_factor']), 2) for r in records]),
+        'type': np.array([r['type'] for r in records], dtype='<U1'),
+        'num_shares': np.round(100 * factor).astype(np.int64),
+        'spot_price': np.array([float(r['spot_price']) for r in records]),
+        'value': np.array([round(float(r['interpolated_value']), 2) for r in records]),
+        'irate': np.array([float(r['irate']) if r['irate'] else 0.0 for r in records]),
+    }
+
+
+@timed_phase('compute')
+def price_chain(chain: dict, value_key: str = 'value') -> dict:
+    """
+    Solves implied vol and greeks for every contract of a chain in one vectorized pass.
+    Contracts whose price cannot be solved get NaN ivol (get_hist_price_db skips these).
+
+    :param chain: column arrays from chain_from_records
+    :param value_key: column holding the option prices to solve
+    :return: chain with 'ivol', 'delta', 'gamma', 'vega', 'theta' & 'rho' arrays added
+    """
+    is_call = chain['type'] == 'C'
+    T = chain['dte'] / 365
+    ivol = bsm_vector.implied_volatility(chain[value_key], is_call, chain['spot_price'], chain['strike'], T, chain['irate'])
+    greeks = bsm_vector.greeks(is_call, chain['spot_price'], chain['strike'], T, chain['irate'], ivol)
+
+    chain['ivol'] = ivol
+    for key in ['delta', 'gamma', 'vega', 'theta', 'rho']:
+        chain[key] = greeks[key]
+
+    return chain
+
+
+def finite_or_none(value):
+    """
+    Float of value, None for nan / inf (not valid JSON)
+    """
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+
+
+def chain_row(chain: dict, i: int) -> dict:
+    """
+    Formats one contract of a priced chain like a get_hist_price_db row.
+
+    :param chain: priced column arrays
+    :param i: index of contract
+    :return: option data dict
+    """
+    return {
+        'strike': float(chain['strike'][i]),
+        'type': str(chain['type'][i]),
+        'num_shares': int(chain['num_shares'][i]),
+        'spot_price': float(chain['spot_price'][i]),
+        'contract_price': float(chain['value'][i]),
+        'ivol': finite_or_none(chain['ivol'][i]),
+        'delta': finite_or_none(chain['delta'][i]),
+        'gamma': finite_or_none(chain['gamma'][i]),
+        'vega': finite_or_none(chain['vega'][i]),
+        'theta': finite_or_none(chain['theta'][i]),
+        'rho': finite_or_none(chain['rho'][i])
+    }
+
+
+
 def fit_spline_skew(data):
     """
     Fits a spline for each unique 'dte' value in the data, 
@@ -769,6 +1638,8 @@ def fit_spline_skew(data):
     :param data: List of dictionaries with keys 'dte', 'actual_moneyness', and 'iv'.
     :return: Dictionary of splines for each unique 'dte'.
     """
+    from scipy.interpolate import UnivariateSpline #Loaded on first fit, keeps scipy out of worker boot
+
     # Group data by 'dte', keeping only unique actual_moneyness values and ignoring nulls
     grouped_data = {}
     for item in data:
@@ -830,6 +1701,8 @@ def fit_spline_term_structure(splines, moneyness=0.5):
     :param splines: Dictionary of splines for each unique 'dte' organized by 'trade_date'.
     :return: Dictionary with a term structure spline for each trade date.
     """
+    from scipy.interpolate import UnivariateSpline
+
     term_structure_splines = {}
     for date, splines_by_dte in splines.items():
         dte_values = []
@@ -858,66 +1731,5 @@ def fit_spline_term_structure(splines, moneyness=0.5):
 
 
 
-import matplotlib.pyplot as plt
-def plot_spline_and_data(data):
-    """
-    Plot a spline and its underlying fitted data points for one 'dte' value from the data.
-    This version converts Decimal types to float.
-
-    :param data: List of dictionaries with keys 'dte', 'actual_moneyness', and 'iv'.
-    """
-
-    # Use the modified function to fit spline
-    splines = fit_spline_skew(data)
-
-    # Choose one spline to plot (if available)
-    for date in splines.keys():
-        for dte, spline in splines[date].items():
-
-            # Extract original data points for the chosen dte
-            x_points = [item['actual_moneyness'] for item in data if item['dte'] == dte and str(item['trade_date']) == date]
-            y_points = [item['iv'] for item in data if item['dte'] == dte and str(item['trade_date']) == date]
-
-            # Generate a range of x values for plotting the spline
-            x_range = np.linspace(0, 1, 100)
-
-
-            # Plot the spline and the original data points
-            plt.figure(figsize=(10, 6))
-            plt.plot(x_range, spline(x_range), label=f"Spline for DTE {dte}")
-            plt.scatter(x_points, y_points, color='red', label="Original Data Points")
-            plt.xlabel("Actual Moneyness")
-            plt.ylabel("IV")
-            plt.title(f"DTE {dte} -- TradeDate {date}")
-            plt.legend()
-            plt.show()
-
-
-def plot_term_structure(term_structure_splines):
-    """
-    Plot the term structure of IV for a given trade date.
-
-    :param term_structure_splines: Dictionary with a term structure spline for each trade date.
-    :param trade_date: The trade date to plot the term structure for.
-    :param dte_range: Optional range of DTE values for plotting. If None, it will be calculated from the data.
-    """
-    for trade_date in term_structure_splines:
-        term_structure_spline = term_structure_splines[trade_date]
-
-        # Generate a range of x values for plotting the spline
-        x_range = np.linspace(0, 700, 100)
-
-        # Plot the term structure
-        plt.figure(figsize=(10, 6))
-        plt.plot(x_range, term_structure_spline(x_range), label=f"Term Structure for TradeDate {trade_date}")
-        plt.xlabel("Days to Expiration (DTE)")
-        plt.ylabel("Implied Volatility (IV)")
-        plt.title(f"Term Structure of IV - TradeDate {trade_date}")
-        plt.legend()
-        plt.grid(True)
-        plt.show()
-
-
-
 #TODO Fundamental data
 #TODO Live data
\ No newline at end of file
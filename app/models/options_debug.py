@@ -0,0 +1,68 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from app.models.options import fit_spline_skew
+
+
+'''
+    Debug only plotting of the spline fits in app.models.options.
+    Kept out of the app import graph so workers never load matplotlib.
+'''
+
+
+def plot_spline_and_data(data):
+    """
+    Plot a spline and its underlying fitted data points for one 'dte' value from the data.
+    This version converts Decimal types to float.
+
+    :param data: List of dictionaries with keys 'dte', 'actual_moneyness', and 'iv'.
+    """
+
+    # Use the modified function to fit spline
+    splines = fit_spline_skew(data)
+
+    # Choose one spline to plot (if available)
+    for date in splines.keys():
+        for dte, spline in splines[date].items():
+
+            # Extract original data points for the chosen dte
+            x_points = [item['actual_moneyness'] for item in data if item['dte'] == dte and str(item['trade_date']) == date]
+            y_points = [item['iv'] for item in data if item['dte'] == dte and str(item['trade_date']) == date]
+
+            # Generate a range of x values for plotting the spline
+            x_range = np.linspace(0, 1, 100)
+
+
+            # Plot the spline and the original data points
+            plt.figure(figsize=(10, 6))
+            plt.plot(x_range, spline(x_range), label=f"Spline for DTE {dte}")
+            plt.scatter(x_points, y_points, color='red', label="Original Data Points")
+            plt.xlabel("Actual Moneyness")
+            plt.ylabel("IV")
+            plt.title(f"DTE {dte} -- TradeDate {date}")
+            plt.legend()
+            plt.show()
+
+
+def plot_term_structure(term_structure_splines):
+    """
+    Plot the term structure of IV for a given trade date.
+
+    :param term_structure_splines: Dictionary with a term structure spline for each trade date.
+    :param trade_date: The trade date to plot the term structure for.
+    :param dte_range: Optional range of DTE values for plotting. If None, it will be calculated from the data.
+    """
+    for trade_date in term_structure_splines:
+        term_structure_spline = term_structure_splines[trade_date]
+
+        # Generate a range of x values for plotting the spline
+        x_range = np.linspace(0, 700, 100)
+
+        # Plot the term structure
+        plt.figure(figsize=(10, 6))
+        plt.plot(x_range, term_structure_spline(x_range), label=f"Term Structure for TradeDate {trade_date}")
+        plt.xlabel("Days to Expiration (DTE)")
+        plt.ylabel("Implied Volatility (IV)")
+        plt.title(f"Term Structure of IV - TradeDate {trade_date}")
+        plt.legend()
+        plt.grid(True)
+        plt.show()
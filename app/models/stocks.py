@@ -1,17 +1,23 @@
 from app.config.db_config import market_db
 from fastapi import HTTPException
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from app.utils.update_start_date import update_start_date
 from app.env import DATA_START_DATE
+from app.utils.realized_volatility import realized_volatility
+from app.models.ticker_catalog import ticker_catalog
+import numpy as np
 
 
 async def get_tickers_db() -> list:
     '''
-    Gets all tickers from db
+    Gets all tickers (from the ticker catalog once loaded)
 
     :return: tickers list
     '''
+    if ticker_catalog.loaded:
+        return ticker_catalog.tickers
+
     query = 'SELECT ticker FROM stocks ORDER BY ticker;'
     records = await market_db.fetch_all(query)
     tickers = [record['ticker'] for record in records]
@@ -23,10 +29,13 @@ async def get_tickers_db() -> list:
 async def get_ticker_info_db(ticker: str) -> dict:
     '''
     Gets ticker info from db, excluding img_link, and calculates the most recent date
-    the ticker appears in the stock_price table.
+    the ticker appears in the stock_price table. Served from the ticker catalog once loaded.
 
     :return: ticker info dict
     '''
+    if ticker_catalog.loaded:
+        return ticker_catalog.get_info(ticker)
+
     query = '''
     SELECT s.ticker, s.type, s.company_name, s.sector, s.industry, s.exchange, 
            s.region, s.start_date, MAX(sp.date) as end_date
@@ -47,42 +56,74 @@ async def get_ticker_info_db(ticker: str) -> dict:
 
 
 
-async def get_hist_price_db(ticker: str, start: str = None, end: str = None) -> dict:
-    '''
-    Gets historical price info for ticker within range
+PRICE_COLUMNS = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
 
-    :param ticker: Ticker to search for
-    :param start: start date to search from
-    :param end: end date to search from
+
+async def get_hist_price_db(tickers: list, start: str = None, end: str = None, limit: int = None, cursor: tuple = None, columns: list = None):
     '''
-    query = """
-    SELECT *
-    FROM stock_price sp
-    WHERE sp.ticker = :ticker AND sp.date >= :DATA_START_DATE
-    AND (
-        (CAST(:from_date AS DATE) IS NULL AND CAST(:to_date AS DATE) IS NULL)
-        OR
-        (sp.date >= CAST(:from_date AS DATE) AND CAST(:to_date AS DATE) IS NULL)
-        OR
-        (CAST(:from_date AS DATE) IS NULL AND sp.date <= CAST(:to_date AS DATE))
-        OR
-        (sp.date BETWEEN CAST(:from_date AS DATE) AND CAST(:to_date AS DATE))
-    )
-    ORDER BY sp.date;
-    """
-    # Convert string to date object
+    Gets historical price info for tickers within range.
+    Only the supplied bounds become predicates, so every query is a plain range scan on (ticker, date).
+    With limit the result is keyset paginated on (ticker, date).
+
+    :param tickers: list of tickers to search for
+    :param start: start date to search from (optional)
+    :param end: end date to search to (optional)
+    :param limit: max rows returned (optional)
+    :param cursor: (ticker, date) of the last row of the previous page (optional)
+    :param columns: subset of PRICE_COLUMNS (optional, default all)
+    :return: list of rows, or {'prices', 'next_cursor'} when limit is given
+    '''
+    start_date = datetime.strptime(DATA_START_DATE, "%Y-%m-%d").date()
     if start:
-        start_date_obj = datetime.strptime(start, "%Y-%m-%d").date()
+        start_date = max(start_date, datetime.strptime(start, "%Y-%m-%d").date())
+
+    values = {'start': start_date}
+
+    if len(tickers) == 1:
+        where = ['sp.ticker = :ticker']
+        values['ticker'] = tickers[0]
     else:
-        start_date_obj = None
+        where = ['sp.ticker = ANY(:tickers)']
+        values['tickers'] = tickers
+
+    where.append('sp.date >= :start')
 
     if end:
-        end_date_obj = datetime.strptime(end, "%Y-%m-%d").date()
-    else:
-        end_date_obj = None
+        where.append('sp.date <= :end')
+        values['end'] = datetime.strptime(end, "%Y-%m-%d").date()
 
-    records = await market_db.fetch_all(query, values={'ticker': ticker, 'from_date': start_date_obj, 'to_date': end_date_obj, 'DATA_START_DATE': datetime.strptime(DATA_START_DATE, "%Y-%m-%d").date()})
-    return [dict(record) for record in records]
+    if cursor is not None:
+        where.append('(sp.ticker, sp.date) > (:cursor_ticker, :cursor_date)')
+        values['cursor_ticker'], values['cursor_date'] = cursor
+
+    select = '*'
+    if columns:
+        keys = ['ticker', 'date'] + [column for column in columns if column not in ['ticker', 'date']]
+        select = ', '.join(f'sp.{column}' for column in keys)
+
+    query = f"""
+    SELECT {select}
+    FROM stock_price sp
+    WHERE {' AND '.join(where)}
+    ORDER BY sp.ticker, sp.date
+    """
+
+    if limit is not None:
+        query += ' LIMIT :limit'
+        values['limit'] = limit + 1
+
+    records = await market_db.fetch_all(query, values=values)
+    prices = [dict(record) for record in records]
+
+    if limit is None:
+        return prices
+
+    next_cursor = None
+    if len(prices) > limit:
+        prices = prices[:limit]
+        next_cursor = f"{prices[-1]['ticker']}:{prices[-1]['date']}"
+
+    return {'prices': prices, 'next_cursor': next_cursor}
 
 
 
@@ -123,4 +164,67 @@ async def get_hist_earnings_db(ticker: str) -> list:
     query = 'SELECT * FROM earnings where ticker = :ticker AND date >= :DATA_START_DATE ORDER BY date;'
     records = await market_db.fetch_all(query, values={'ticker': ticker, 'DATA_START_DATE': datetime.strptime(DATA_START_DATE, "%Y-%m-%d").date()})
 
-    return [dict(record) for record in records]
\ No newline at end of file
+    return [dict(record) for record in records]
+
+
+
+async def get_ohlc_arrays_db(ticker: str, start, end) -> dict:
+    '''
+    Gets OHLC columns of stock_price as float arrays (oldest first)
+
+    :param ticker: Ticker to search for
+    :param start: first date (date object)
+    :param end: last date (date object)
+    :return: dict of 'date' list and 'open', 'high', 'low', 'close' arrays
+    '''
+    query = """
+    SELECT sp.date, sp.open, sp.high, sp.low, sp.close
+    FROM stock_price sp
+    WHERE sp.ticker = :ticker AND sp.date >= :start AND sp.date <= :end
+    ORDER BY sp.date;
+    """
+    records = await market_db.fetch_all(query, values={'ticker': ticker, 'start': start, 'end': end})
+
+    return {
+        'date': [record['date'] for record in records],
+        'open': np.array([float(record['open']) for record in records]),
+        'high': np.array([float(record['high']) for record in records]),
+        'low': np.array([float(record['low']) for record in records]),
+        'close': np.array([float(record['close']) for record in records]),
+    }
+
+
+
+async def get_hist_realized_vol_db(ticker: str, start, end, windows: list, estimators: list) -> dict:
+    '''
+    Gets rolling realized volatility for each window within range
+
+    :param ticker: Ticker to search for
+    :param start: first date of output (date object)
+    :param end: last date of output (date object)
+    :param windows: window lengths in trading days
+    :param estimators: realized vol estimators to compute
+    :return: dict with dates and estimator -> window -> vol series
+    '''
+    data_start = datetime.strptime(DATA_START_DATE, "%Y-%m-%d").date()
+    start = max(start, data_start)
+
+    # Pull enough history before start to fill the longest window
+    buffer = timedelta(days=int(max(windows) * 1.5) + 10)
+    ohlc = await get_ohlc_arrays_db(ticker, max(start - buffer, data_start), end)
+
+    if len(ohlc['date']) == 0:
+        return {}
+
+    vols = realized_volatility(ohlc['open'], ohlc['high'], ohlc['low'], ohlc['close'], windows, estimators)
+    first = next((i for i, d in enumerate(ohlc['date']) if d >= start), len(ohlc['date']))
+
+    result = {'dates': [str(d) for d in ohlc['date'][first:]]}
+    for estimator, by_window in vols.items():
+        result[estimator] = {
+            str(w): [None if np.isnan(v) else round(float(v), 6) for v in series[first:]]
+            for w, series in by_window.items()
+        }
+
+    return result
+
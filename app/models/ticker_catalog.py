@@ -0,0 +1,128 @@
+from app.config.db_config import market_db
+from app.utils.update_start_date import update_start_date
+import asyncio
+import logging
+
+
+REFRESH_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class TickerCatalog:
+    def __init__(self, refresh_seconds: int = REFRESH_SECONDS):
+        '''
+        In memory copy of the stocks table plus each ticker's last stock_price date.
+        Loaded once at startup and reloaded only when the ingest marker changes. \n
+
+        refresh_seconds -> How often the ingest marker is polled \n
+        '''
+        self.refresh_seconds = refresh_seconds
+        self.tickers = []
+        self.info = {}
+        self.version = None
+        self._task = None
+
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+
+    async def get_version(self):
+        '''
+        Cheap marker that changes whenever a trade date is processed or a ticker is added \n
+        '''
+        query = '''
+        SELECT
+            (SELECT MAX(dates_processed.date) FROM dates_processed) AS last_date,
+            (SELECT COUNT(*) FROM stocks) AS n_tickers;
+        '''
+        record = await market_db.fetch_one(query)
+        return (record['last_date'], record['n_tickers'])
+
+
+    async def load(self):
+        '''
+        (Re)loads every ticker. The last price date is one index lookup per ticker
+        instead of a MAX over its whole history. \n
+        '''
+        version = await self.get_version()
+
+        query = '''
+        SELECT s.ticker, s.type, s.company_name, s.sector, s.industry, s.exchange,
+               s.region, s.start_date, last_price.date AS end_date
+        FROM stocks s
+        LEFT JOIN LATERAL (
+            SELECT sp.date
+            FROM stock_price sp
+            WHERE sp.ticker = s.ticker
+            ORDER BY sp.date DESC
+            LIMIT 1
+        ) last_price ON TRUE
+        ORDER BY s.ticker;
+        '''
+        records = await market_db.fetch_all(query)
+
+        info = {}
+        for record in records:
+            data = dict(record)
+            update_start_date(data, 'start_date')
+            info[data['ticker']] = data
+
+        # Swap in whole objects so readers never see a half loaded catalog
+        self.info = info
+        self.tickers = list(info)
+        self.version = version
+
+
+    async def refresh(self):
+        '''
+        Reloads if the ingest marker moved, returns whether it reloaded \n
+        '''
+        if await self.get_version() == self.version:
+            return False
+        await self.load()
+        return True
+
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Ticker catalog refresh failed')
+
+
+    def start(self):
+        '''
+        Starts the background refresh task \n
+        '''
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+
+    async def stop(self):
+        '''
+        Cancels the background refresh task \n
+        '''
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+    def get_info(self, ticker: str) -> dict:
+        '''
+        Returns a copy of ticker's info ({} if unknown) \n
+        '''
+        data = self.info.get(ticker)
+        return dict(data) if data is not None else {}
+
+
+
+ticker_catalog = TickerCatalog()
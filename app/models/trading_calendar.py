@@ -0,0 +1,71 @@
+from app.config.db_config import market_db
+from datetime import date
+import numpy as np
+
+
+class TradingCalendar:
+    def __init__(self):
+        '''
+        In memory copy of dates_processed.
+        Processed dates are never removed, so only dates after the latest loaded one need the db. \n
+        '''
+        self.dates = np.empty(0, dtype='datetime64[D]')
+        self._lookup = set()
+
+
+    @property
+    def loaded(self):
+        return len(self.dates) > 0
+
+
+    @property
+    def latest(self):
+        '''
+        Most recent processed trade date (date object or None) \n
+        '''
+        return self.dates[-1].astype(date) if self.loaded else None
+
+
+    async def load(self):
+        '''
+        (Re)loads every processed trade date \n
+        '''
+        query = 'SELECT dates_processed.date FROM dates_processed ORDER BY dates_processed.date;'
+        records = await market_db.fetch_all(query)
+
+        dates = np.array([record['date'] for record in records], dtype='datetime64[D]')
+        self._lookup = set(dates.astype(str).tolist())
+        self.dates = dates
+
+
+    def add(self, day):
+        '''
+        Records a processed date found after the calendar was loaded \n
+        '''
+        day = np.datetime64(day, 'D')
+        if str(day) in self._lookup:
+            return
+        self._lookup.add(str(day))
+        self.dates = np.sort(np.append(self.dates, day))
+
+
+    def contains(self, day: str):
+        '''
+        Whether day (yyyy-mm-dd) is a processed trade date. None if it is newer than the calendar. \n
+        '''
+        if not self.loaded or day > str(self.dates[-1]):
+            return None
+        return day in self._lookup
+
+
+    def between(self, start, end) -> list:
+        '''
+        Processed trade dates in [start, end] as date objects \n
+        '''
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return self.dates[lo:hi].astype(date).tolist()
+
+
+
+trading_calendar = TradingCalendar()
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.utils.success_return_format import success_return
+from app.utils.api_key_check import is_admin_key
+from app.utils.profiling import list_profiles, load_profile
+from app.utils.valid_number_check import is_valid_int
+from app.config.db_config import market_db
+
+router = APIRouter()
+
+
+def _admin_error(apiKey: str):
+    if not apiKey:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    if not is_admin_key(apiKey):
+        return JSONResponse(status_code=403, content={"message": "Admin API key is required.", "data": {}})
+    return None
+
+
+
+@router.get("/profiles")
+async def get_profiles(
+    apiKey: str = Query(None, title="Admin API Key")
+    ):
+    error = _admin_error(apiKey)
+    if error is not None:
+        return error
+
+    return success_return(list_profiles())
+
+
+
+@router.get("/profiles/{profileId}")
+async def get_profile(
+    profileId: str,
+    apiKey: str = Query(None, title="Admin API Key")
+    ):
+    error = _admin_error(apiKey)
+    if error is not None:
+        return error
+
+    collapsed = load_profile(profileId)
+    if collapsed is None:
+        return JSONResponse(status_code=404, content={"message": "Profile does not exist.", "data": {}})
+
+    # Collapsed stacks, feed to flamegraph.pl / speedscope / inferno
+    return PlainTextResponse(collapsed, headers={'Content-Disposition': f'attachment; filename="{profileId}.collapsed"'})
+
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    apiKey: str = Query(None, title="Admin API Key"),
+    limit: str = Query(None, title="Max number of queries returned, newest first *optional*")
+    ):
+    error = _admin_error(apiKey)
+    if error is not None:
+        return error
+
+    if limit is not None and not is_valid_int(limit):
+        return JSONResponse(status_code=400, content={"message": "Invalid limit must be an integer.", "data": {}})
+
+    limit = int(limit) if limit is not None else None
+
+    if limit is not None and limit < 1:
+        return JSONResponse(status_code=400, content={"message": "limit must be at least 1.", "data": {}})
+
+    return success_return(market_db.get_slow_queries(limit))
+
+
+
+@router.get("/db-pools")
+async def get_db_pools(
+    apiKey: str = Query(None, title="Admin API Key")
+    ):
+    error = _admin_error(apiKey)
+    if error is not None:
+        return error
+
+    return success_return(market_db.pool_stats())
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.utils.success_return_format import success_return
+from app.warmup import warmup_state
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def get_live():
+    return success_return({'status': 'alive'})
+
+
+@router.get("/ready")
+async def get_ready():
+    if not warmup_state.ready:
+        message = "Warm-up ran out of budget." if warmup_state.status == 'cold' else "Warming up."
+        return JSONResponse(status_code=503, content={"message": message, "data": warmup_state.report()})
+
+    return success_return(warmup_state.report())
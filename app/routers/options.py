@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Body
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from app.controllers import options
 from app.utils.success_return_format import success_return
 from app.utils.valid_number_check import is_valid_float, is_valid_int
 import json
 import gzip
 from app.models.options import is_date_valid
+from app.schemas.options import Position, PortfolioRequest, ScenarioRequest, StrategyRequest, BulkChainRequest
 import numpy as np
 
 router = APIRouter()
@@ -283,4 +284,356 @@ async def get_hist_ivinfo(
         return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
     
     ticker_data = await options.get_hist_ivinfo(apiKey, ticker, tradeDate, expiry)
-    return success_return(ticker_data)
\ No newline at end of file
+    return success_return(ticker_data)
+
+
+@router.get("/hist/surface")
+async def get_hist_surface(
+    apiKey: str = Query(None, title="Client API Key"),
+    ticker: str = Query(None, title="Stock ticker to search"),
+    tradeDate: str = Query(None, title="Trade date on which you want the surface (yyyy-mm-dd)"),
+    endDate: str = Query(None, title="Last trade date for a range of surfaces *optional* (yyyy-mm-dd)"),
+    moneynessPoints: str = Query(None, title="Number of moneyness points in grid *optional*"),
+    minDTE: str = Query(None, title="First DTE of grid *optional*"),
+    maxDTE: str = Query(None, title="Last DTE of grid *optional*"),
+    dtePoints: str = Query(None, title="Number of DTE points in grid *optional*"),
+    format: str = Query(None, title="'json' or 'npz' (binary 3-D array) *optional*")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if ticker is None:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if tradeDate is None:
+        return JSONResponse(status_code=400, content={"message": "Trade Date is required.", "data": {}})
+
+    if not await is_date_valid(tradeDate):
+        return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
+    
+    #check grid sizes
+    for name, value in [('moneynessPoints', moneynessPoints), ('minDTE', minDTE), ('maxDTE', maxDTE), ('dtePoints', dtePoints)]:
+        if value is not None and not is_valid_int(value):
+            return JSONResponse(status_code=400, content={"message": f"Invalid {name} must be integer format.", 'data': {}})
+
+    moneynessPoints = int(moneynessPoints) if moneynessPoints is not None else 21
+    minDTE = int(minDTE) if minDTE is not None else 7
+    maxDTE = int(maxDTE) if maxDTE is not None else 365
+    dtePoints = int(dtePoints) if dtePoints is not None else 60
+
+    if moneynessPoints < 2 or moneynessPoints > 201:
+        return JSONResponse(status_code=400, content={"message": "moneynessPoints must be between 2 and 201.", 'data': {}})
+    
+    if dtePoints < 2 or dtePoints > 365:
+        return JSONResponse(status_code=400, content={"message": "dtePoints must be between 2 and 365.", 'data': {}})
+    
+    if minDTE < 1 or maxDTE > 1095 or minDTE >= maxDTE:
+        return JSONResponse(status_code=400, content={"message": "DTE range must satisfy 1 <= minDTE < maxDTE <= 1095.", 'data': {}})
+    
+    if format is not None:
+        format = format.lower()
+
+    if format is not None and format not in ['json', 'npz']:
+        return JSONResponse(status_code=400, content={"message": "Invalid format. Must be 'json' or 'npz'.", 'data': {}})
+    
+    binary = format == 'npz'
+    ticker_data = await options.get_hist_surface(apiKey, ticker, tradeDate, endDate, moneynessPoints, minDTE, maxDTE, dtePoints, binary)
+
+    if binary:
+        return Response(content=ticker_data, media_type="application/octet-stream", headers={"Content-Disposition": "attachment; filename=surface.npz"})
+    
+    return success_return(ticker_data)
+
+
+
+@router.get("/hist/skew-series")
+async def get_hist_skew_series(
+    apiKey: str = Query(None, title="Client API Key"),
+    ticker: str = Query(None, title="Stock ticker to search"),
+    startDate: str = Query(None, title="First trade date of series (yyyy-mm-dd)"),
+    endDate: str = Query(None, title="Last trade date of series (yyyy-mm-dd)"),
+    dtes: str = Query(None, title="Comma separated constant maturities *optional* (ie 30,60,90)")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if ticker is None:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if startDate is None or endDate is None:
+        return JSONResponse(status_code=400, content={"message": "Start date and end date are required.", "data": {}})
+    
+    if dtes is not None:
+        dtes = [d.strip() for d in dtes.split(',') if d.strip()]
+    else:
+        dtes = ['30']
+
+    if len(dtes) == 0 or not all(is_valid_int(d) for d in dtes):
+        return JSONResponse(status_code=400, content={"message": "Invalid dtes must be comma separated integers.", 'data': {}})
+    
+    dtes = sorted(set(int(d) for d in dtes))
+
+    if len(dtes) > 20:
+        return JSONResponse(status_code=400, content={"message": "20 is the highest allowed number of dtes.", 'data': {}})
+    
+    if dtes[0] < 1 or dtes[-1] > 1095:
+        return JSONResponse(status_code=400, content={"message": "dtes must be between 1 and 1095.", 'data': {}})
+    
+    ticker_data = await options.get_hist_skew_series(apiKey, ticker, startDate, endDate, dtes)
+    return success_return(ticker_data)
+
+
+
+@router.get("/hist/by-delta")
+async def get_hist_by_delta(
+    apiKey: str = Query(None, title="Client API Key"),
+    ticker: str = Query(None, title="Stock ticker to search"),
+    tradeDate: str = Query(None, title="Trade date on which you want contracts (yyyy-mm-dd)"),
+    deltas: str = Query(None, title="Comma separated target deltas, negative for puts *optional* (ie -0.25,0.10)"),
+    expiry: str = Query(None, title="Expiry on which you want contracts *optional* (yyyy-mm-dd)")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if ticker is None:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if tradeDate is None:
+        return JSONResponse(status_code=400, content={"message": "Trade Date is required.", "data": {}})
+
+    if not await is_date_valid(tradeDate):
+        return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
+    
+    deltas = [d.strip() for d in deltas.split(',') if d.strip()] if deltas is not None else ['-0.25', '0.25']
+
+    if len(deltas) == 0 or not all(is_valid_float(d) for d in deltas):
+        return JSONResponse(status_code=400, content={"message": "Invalid deltas must be comma separated numbers.", 'data': {}})
+    
+    deltas = sorted(set(float(d) for d in deltas))
+
+    if len(deltas) > 20:
+        return JSONResponse(status_code=400, content={"message": "20 is the highest allowed number of deltas.", 'data': {}})
+    
+    if not all(0 < abs(d) < 1 for d in deltas):
+        return JSONResponse(status_code=400, content={"message": "Deltas must be between -1 and 1 and not 0.", 'data': {}})
+    
+    ticker_data = await options.get_hist_by_delta(apiKey, ticker, tradeDate, deltas, expiry)
+    return success_return(ticker_data)
+
+
+
+
+@router.post("/portfolio/greeks")
+async def get_portfolio_greeks(
+    apiKey: str = Query(None, title="Client API Key"),
+    tradeDate: str = Query(None, title="Trade date on which you want greeks (yyyy-mm-dd)"),
+    portfolio: PortfolioRequest = Body(..., title="Positions made of option legs and shares")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if tradeDate is None:
+        return JSONResponse(status_code=400, content={"message": "Trade Date is required.", "data": {}})
+
+    if not await is_date_valid(tradeDate):
+        return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
+    
+    n_legs = sum(len(position.legs) for position in portfolio.positions)
+    if n_legs > 100000:
+        return JSONResponse(status_code=400, content={"message": "100000 is the highest allowed number of legs.", 'data': {}})
+    
+    for position in portfolio.positions:
+        for leg in position.legs:
+            if leg.type.upper() not in ['P', 'C']:
+                return JSONResponse(status_code=400, content={"message": "Invalid type. Must be 'P' or 'C'.", 'data': {}})
+    
+    ticker_data = await options.get_portfolio_greeks(apiKey, tradeDate, portfolio.positions)
+    return success_return(ticker_data)
+
+
+
+
+@router.post("/risk/scenario")
+async def get_risk_scenario(
+    apiKey: str = Query(None, title="Client API Key"),
+    tradeDate: str = Query(None, title="Trade date the position is marked on (yyyy-mm-dd)"),
+    format: str = Query(None, title="'json' or 'npz' (binary arrays, fastest for large grids) *optional*"),
+    scenario: ScenarioRequest = Body(..., title="Position and spot / vol / time shocks")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if tradeDate is None:
+        return JSONResponse(status_code=400, content={"message": "Trade Date is required.", "data": {}})
+
+    if not await is_date_valid(tradeDate):
+        return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
+    
+    legs = scenario.position.legs
+    if len(legs) == 0 or len(legs) > 100:
+        return JSONResponse(status_code=400, content={"message": "Position must have between 1 and 100 legs.", 'data': {}})
+    
+    if len(set(leg.ticker.upper() for leg in legs)) > 1:
+        return JSONResponse(status_code=400, content={"message": "All legs must be on the same ticker.", 'data': {}})
+    
+    if any(leg.type.upper() not in ['P', 'C'] for leg in legs):
+        return JSONResponse(status_code=400, content={"message": "Invalid type. Must be 'P' or 'C'.", 'data': {}})
+    
+    if not scenario.spotShocks or not scenario.volShocks or not scenario.daysForward:
+        return JSONResponse(status_code=400, content={"message": "spotShocks, volShocks and daysForward must not be empty.", 'data': {}})
+    
+    if len(scenario.spotShocks) * len(scenario.volShocks) * len(scenario.daysForward) > 500000:
+        return JSONResponse(status_code=400, content={"message": "500000 is the highest allowed number of grid points.", 'data': {}})
+    
+    if any(shock <= -1 for shock in scenario.spotShocks) or any(day < 0 for day in scenario.daysForward):
+        return JSONResponse(status_code=400, content={"message": "spotShocks must be above -1 and daysForward must not be negative.", 'data': {}})
+    
+    if format is not None:
+        format = format.lower()
+
+    if format is not None and format not in ['json', 'npz']:
+        return JSONResponse(status_code=400, content={"message": "Invalid format. Must be 'json' or 'npz'.", 'data': {}})
+    
+    binary = format == 'npz'
+    ticker_data = await options.get_risk_scenario(apiKey, tradeDate, scenario, binary)
+
+    if binary:
+        return Response(content=ticker_data, media_type="application/octet-stream", headers={"Content-Disposition": "attachment; filename=scenario.npz"})
+    
+    return success_return(ticker_data)
+
+
+
+
+@router.post("/backtest")
+async def get_backtest(
+    apiKey: str = Query(None, title="Client API Key"),
+    ticker: str = Query(None, title="Stock ticker to backtest"),
+    startDate: str = Query(None, title="First trade date of backtest (yyyy-mm-dd)"),
+    endDate: str = Query(None, title="Last trade date of backtest (yyyy-mm-dd)"),
+    strategy: StrategyRequest = Body(..., title="Rule based strategy")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if ticker is None:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if startDate is None or endDate is None:
+        return JSONResponse(status_code=400, content={"message": "Start date and end date are required.", "data": {}})
+    
+    if len(strategy.legs) == 0 or len(strategy.legs) > 8:
+        return JSONResponse(status_code=400, content={"message": "Strategy must have between 1 and 8 legs.", 'data': {}})
+    
+    if any(abs(leg.delta) >= 1 or leg.delta == 0 for leg in strategy.legs):
+        return JSONResponse(status_code=400, content={"message": "Leg deltas must be between -1 and 1 and not 0.", 'data': {}})
+    
+    if strategy.rollDTE < 0 or strategy.entryDTE > 365:
+        return JSONResponse(status_code=400, content={"message": "DTEs must satisfy 0 <= rollDTE < entryDTE <= 365.", 'data': {}})
+    
+    ticker_data = await options.get_backtest(apiKey, ticker, startDate, endDate, strategy)
+    return success_return(ticker_data)
+
+
+
+
+@router.post("/hist/position-series")
+async def get_position_series(
+    apiKey: str = Query(None, title="Client API Key"),
+    startDate: str = Query(None, title="First trade date of the series, leg strikes are as of this date (yyyy-mm-dd)"),
+    endDate: str = Query(None, title="Last trade date of the series (yyyy-mm-dd)"),
+    position: Position = Body(..., title="Option legs plus shares of the underlying")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if startDate is None or endDate is None:
+        return JSONResponse(status_code=400, content={"message": "Start date and end date are required.", "data": {}})
+    
+    if len(position.legs) == 0 or len(position.legs) > 50:
+        return JSONResponse(status_code=400, content={"message": "Position must have between 1 and 50 legs.", 'data': {}})
+    
+    for leg in position.legs:
+        if leg.type.upper() not in ['P', 'C']:
+            return JSONResponse(status_code=400, content={"message": "Invalid type. Must be 'P' or 'C'.", 'data': {}})
+    
+    ticker_data = await options.get_position_series(apiKey, startDate, endDate, position)
+    return success_return(ticker_data)
+
+
+
+@router.get("/hist/contract-series")
+async def get_contract_series(
+    apiKey: str = Query(None, title="Client API Key"),
+    optionId: str = Query(None, title="Option id of the contract *optional* (or ticker, expiry, strike & type)"),
+    ticker: str = Query(None, title="Stock ticker of the contract *optional*"),
+    expiry: str = Query(None, title="Expiry of the contract *optional* (yyyy-mm-dd)"),
+    strike: str = Query(None, title="Strike of the contract as of startDate *optional*"),
+    type: str = Query(None, title="Type of the contract *optional*"),
+    startDate: str = Query(None, title="First trade date of series (yyyy-mm-dd)"),
+    endDate: str = Query(None, title="Last trade date of series (yyyy-mm-dd)"),
+    limit: str = Query(None, title="Max days per page *optional* (default 252)"),
+    cursor: str = Query(None, title="next_cursor of the previous page *optional*")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if startDate is None or endDate is None:
+        return JSONResponse(status_code=400, content={"message": "Start date and end date are required.", "data": {}})
+    
+    if optionId is not None and not is_valid_int(optionId):
+        return JSONResponse(status_code=400, content={"message": "Invalid optionId must be an integer.", 'data': {}})
+    
+    if optionId is None and (ticker is None or expiry is None or strike is None or type is None):
+        return JSONResponse(status_code=400, content={"message": "optionId or ticker, expiry, strike and type are required.", "data": {}})
+
+    if type is not None:
+        type = type.upper() 
+
+    if type is not None and type not in ['P', 'C']:
+        return JSONResponse(status_code=400, content={"message": "Invalid type. Must be 'P' or 'C'.", 'data': {}})
+    
+    if strike is not None and not is_valid_float(strike):
+        return JSONResponse(status_code=400, content={"message": "Invalid strike must be proper number format.", 'data': {}})
+    
+    if limit is not None and not is_valid_int(limit):
+        return JSONResponse(status_code=400, content={"message": "Invalid limit must be an integer.", 'data': {}})
+    
+    limit = int(limit) if limit is not None else 252
+
+    if limit < 1 or limit > 2000:
+        return JSONResponse(status_code=400, content={"message": "limit must be between 1 and 2000.", 'data': {}})
+    
+    ticker_data = await options.get_contract_series(apiKey, optionId, ticker, expiry, strike, type, startDate, endDate, limit, cursor)
+    return success_return(ticker_data)
+
+
+
+@router.post("/hist/price/bulk")
+async def get_bulk_chain(
+    apiKey: str = Query(None, title="Client API Key"),
+    tradeDate: str = Query(None, title="Trade date on which you want prices (yyyy-mm-dd)"),
+    expiry: str = Query(None, title="Expiry on which you want prices *optional* (yyyy-mm-dd)"),
+    type: str = Query(None, title="Type on which you want prices *optional*"),
+    request: BulkChainRequest = Body(..., title="Tickers to get chains for")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    
+    if tradeDate is None:
+        return JSONResponse(status_code=400, content={"message": "Trade Date is required.", "data": {}})
+
+    if not await is_date_valid(tradeDate):
+        return JSONResponse(status_code=400, content={"message": "Trade date does not exist", "data": {}})
+    
+    if len(request.tickers) == 0 or len(request.tickers) > 500:
+        return JSONResponse(status_code=400, content={"message": "Between 1 and 500 tickers are allowed.", 'data': {}})
+
+    if type is not None:
+        type = type.upper() 
+
+    if type is not None and type not in ['P', 'C']:
+        return JSONResponse(status_code=400, content={"message": "Invalid type. Must be 'P' or 'C'.", 'data': {}})
+    
+    chunks = await options.get_bulk_chain(apiKey, request.tickers, tradeDate, expiry, type)
+    return StreamingResponse(chunks, media_type="application/json")
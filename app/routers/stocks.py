@@ -2,6 +2,9 @@ from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
 from app.controllers import stocks
 from app.utils.success_return_format import success_return
+from app.utils.valid_number_check import is_valid_int
+from app.utils.realized_volatility import ESTIMATORS
+from app.models.stocks import PRICE_COLUMNS
 
 router = APIRouter()
 
@@ -33,16 +36,43 @@ async def get_ticker_info(
 @router.get("/hist/price")
 async def get_ticker_info(
     apiKey: str = Query(None, title="Client API Key"),
-    ticker: str = Query(None, title="Ticker to get info for"),
+    ticker: str = Query(None, title="Ticker to get info for, comma separated for several"),
     start: str = Query(None, title="Start date for price data"),
-    end: str = Query(None, title="End date for price data")
+    end: str = Query(None, title="End date for price data"),
+    limit: str = Query(None, title="Max rows per page, enables pagination *optional*"),
+    cursor: str = Query(None, title="next_cursor of the previous page *optional*"),
+    columns: str = Query(None, title="Comma separated columns to return *optional* (ie close,volume)")
 ):
     if apiKey is None:
         return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
     if ticker is None:
         return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if len([t for t in ticker.split(',') if t.strip()]) == 0:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+    
+    if len([t for t in ticker.split(',') if t.strip()]) > 100:
+        return JSONResponse(status_code=400, content={"message": "100 is the highest allowed number of tickers.", "data": {}})
+    
+    if limit is not None and not is_valid_int(limit):
+        return JSONResponse(status_code=400, content={"message": "Invalid limit must be an integer.", "data": {}})
+    
+    if limit is not None:
+        limit = int(limit)
+
+    if limit is not None and (limit < 1 or limit > 50000):
+        return JSONResponse(status_code=400, content={"message": "limit must be between 1 and 50000.", "data": {}})
+    
+    if cursor is not None and limit is None:
+        return JSONResponse(status_code=400, content={"message": "cursor requires limit.", "data": {}})
+    
+    if columns is not None:
+        columns = [c.strip().lower() for c in columns.split(',') if c.strip()]
 
-    ticker_data = await stocks.get_hist_price(apiKey, ticker, start, end)
+        if len(columns) == 0 or not all(c in PRICE_COLUMNS for c in columns):
+            return JSONResponse(status_code=400, content={"message": f"Invalid columns must be among {', '.join(PRICE_COLUMNS)}.", "data": {}})
+
+    ticker_data = await stocks.get_hist_price(apiKey, ticker, start, end, limit, cursor, columns)
     return success_return(ticker_data)
 
 
@@ -87,4 +117,36 @@ async def get_hist_earnings(
         return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
 
     ticker_data = await stocks.get_hist_earnings(apiKey, ticker)
-    return success_return(ticker_data)
\ No newline at end of file
+    return success_return(ticker_data)
+
+
+
+@router.get("/hist/realized-vol")
+async def get_hist_realized_vol(
+    apiKey: str = Query(None, title="Client API Key"),
+    ticker: str = Query(None, title="Ticker to get info for"),
+    start: str = Query(None, title="Start date for realized vol data"),
+    end: str = Query(None, title="End date for realized vol data"),
+    windows: str = Query(None, title="Comma separated window lengths in trading days *optional* (ie 10,20,60)"),
+    estimators: str = Query(None, title="Comma separated estimators *optional* (close_to_close, parkinson, garman_klass, yang_zhang)")
+):
+    if apiKey is None:
+        return JSONResponse(status_code=400, content={"message": "API key is required.", "data": {}})
+    if ticker is None:
+        return JSONResponse(status_code=400, content={"message": "Ticker is required.", "data": {}})
+
+    windows = [w.strip() for w in windows.split(',') if w.strip()] if windows is not None else ['10', '20', '30', '60']
+    if len(windows) == 0 or not all(is_valid_int(w) for w in windows):
+        return JSONResponse(status_code=400, content={"message": "Invalid windows must be comma separated integers.", "data": {}})
+    
+    windows = sorted(set(int(w) for w in windows))
+    if windows[0] < 2 or windows[-1] > 504:
+        return JSONResponse(status_code=400, content={"message": "Windows must be between 2 and 504 trading days.", "data": {}})
+    
+    estimators = [e.strip().lower() for e in estimators.split(',') if e.strip()] if estimators is not None else ESTIMATORS
+    if len(estimators) == 0 or not all(e in ESTIMATORS for e in estimators):
+        return JSONResponse(status_code=400, content={"message": f"Invalid estimators must be from {', '.join(ESTIMATORS)}.", "data": {}})
+
+    ticker_data = await stocks.get_hist_realized_vol(apiKey, ticker, start, end, windows, estimators)
+    return success_return(ticker_data)
+
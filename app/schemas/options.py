@@ -0,0 +1,57 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class OptionLeg(BaseModel):
+    '''
+    Single option contract held in a position (quantity < 0 for short)
+    '''
+    ticker: str
+    expiry: str
+    strike: float
+    type: str
+    quantity: float = 1
+
+
+class Position(BaseModel):
+    '''
+    Option legs plus shares of the underlying
+    '''
+    legs: List[OptionLeg] = []
+    shares: float = 0
+    name: Optional[str] = None
+
+
+class PortfolioRequest(BaseModel):
+    positions: List[Position]
+
+
+class ScenarioRequest(BaseModel):
+    '''
+    Position plus the shocks of a spot x vol x time risk grid
+    '''
+    position: Position
+    spotShocks: List[float] = [-0.1, -0.05, 0, 0.05, 0.1] #Fractional spot moves
+    volShocks: List[float] = [0] #Absolute vol points added to each leg's iv
+    daysForward: List[int] = [0]
+
+
+class StrategyLegRequest(BaseModel):
+    type: str
+    delta: float #Target delta at entry, negative for puts
+    quantity: float = -1
+
+
+class StrategyRequest(BaseModel):
+    '''
+    Rule based strategy, see app.backtest.strategy.Strategy
+    '''
+    legs: List[StrategyLegRequest]
+    entryDTE: int = 30
+    rollDTE: int = 21
+    takeProfit: Optional[float] = None
+    stopLoss: Optional[float] = None
+
+
+class BulkChainRequest(BaseModel):
+    tickers: List[str]
@@ -1,5 +1,9 @@
+import app.env as env
 
 
+ADMIN_AUTH_LEVEL = 2
+ADMIN_API_KEYS = getattr(env, 'ADMIN_API_KEYS', [])
+
 
 def check_api_key(apiKey: str) -> (bool, int):
     '''
@@ -8,4 +12,17 @@ def check_api_key(apiKey: str) -> (bool, int):
     :param apiKey: api key
     :return: tuple (bool, int) where bool represents whether key is valid and int represnets user auth level
     '''
-    return True, 1
\ No newline at end of file
+    if apiKey is not None and apiKey in ADMIN_API_KEYS:
+        return True, ADMIN_AUTH_LEVEL
+    return True, 1
+
+
+def is_admin_key(apiKey: str) -> bool:
+    '''
+    Whether api key is valid with admin auth level
+
+    :param apiKey: api key
+    :return: bool
+    '''
+    valid, auth_level = check_api_key(apiKey)
+    return valid and auth_level >= ADMIN_AUTH_LEVEL
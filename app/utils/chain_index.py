@@ -0,0 +1,59 @@
+import numpy as np
+from datetime import date
+
+
+class ChainIndex:
+    def __init__(self, expiry, strike, type):
+        '''
+        Sorted expiries and, per expiry, sorted unique split adjusted call strikes of one (ticker, trade_date).
+        Strikes of every expiry are stored back to back in one array and sliced through offsets. \n
+
+        expiry -> datetime64[D] array, one entry per contract \n
+        strike -> float array of split adjusted strikes \n
+        type -> 'P' / 'C' array \n
+        '''
+        expiry = np.asarray(expiry, dtype='datetime64[D]')
+        strike = np.asarray(strike, dtype=float)
+        is_call = np.asarray(type) == 'C'
+
+        self.expiries = np.unique(expiry)
+
+        # Unique (expiry, strike) pairs of calls, lexsort keeps strikes ascending within an expiry
+        call_expiry, call_strike = expiry[is_call], strike[is_call]
+        order = np.lexsort((call_strike, call_expiry))
+        call_expiry, call_strike = call_expiry[order], call_strike[order]
+        first = np.ones(len(call_strike), dtype=bool)
+        first[1:] = (call_expiry[1:] != call_expiry[:-1]) | (call_strike[1:] != call_strike[:-1])
+
+        self.strike_expiries = np.unique(call_expiry)
+        self.strikes = call_strike[first]
+        self.offsets = np.searchsorted(call_expiry[first], self.strike_expiries, side='left')
+        self.offsets = np.append(self.offsets, len(self.strikes))
+
+
+    def expiry_list(self) -> list:
+        '''
+        Sorted expiries as date objects \n
+        '''
+        return [date.fromisoformat(str(e)) for e in self.expiries]
+
+
+    def strikes_for(self, expiry) -> list:
+        '''
+        Sorted strikes of one expiry ([] if not listed) \n
+        '''
+        expiry = np.datetime64(expiry, 'D')
+        i = np.searchsorted(self.strike_expiries, expiry)
+        if i == len(self.strike_expiries) or self.strike_expiries[i] != expiry:
+            return []
+        return self.strikes[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+
+    def strikes_by_expiry(self) -> dict:
+        '''
+        Sorted strikes keyed by expiry date, ordered by expiry \n
+        '''
+        return {
+            date.fromisoformat(str(e)): self.strikes[self.offsets[i]:self.offsets[i + 1]].tolist()
+            for i, e in enumerate(self.strike_expiries)
+        }
@@ -0,0 +1,342 @@
+from app.utils.metrics import REPLICA_HEALTHY, REPLICA_LAG_SECONDS
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qsl, urlencode, urlunsplit
+import asyncio
+import asyncpg
+import logging
+
+
+'''
+    Connection pool selection.
+
+    market_db is a DatabasePools: the query methods run on the pool selected for the current request,
+    so heavy analytics routes get their own (small) pool and cannot take every connection from the cheap
+    lookup routes, and read only historical routes can be spread over read replicas. PoolSelectionMiddleware
+    picks the pools from the request path, use_pool() does it for any other block. Code outside a request
+    (warm up, catalog refresh) uses the primary pool.
+
+    'replica' is the round robin over the healthy replicas of a ReplicaSet, each use_pool block (a request)
+    sticks to the replica it got so its reads see one replication lag. A replica that is down or lags
+    is skipped until its health check passes again, a read that fails on a broken replica connection is
+    retried once on the next choice, so replica outages fall back to the other pools instead of failing.
+    Health checks run on their own connection, a replica busy with reads is not mistaken for a dead one.
+'''
+
+REPLICA = 'replica'
+REPLICA_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.exceptions.AdminShutdownError,
+                  asyncpg.exceptions.CannotConnectNowError, asyncpg.exceptions.TooManyConnectionsError)
+
+#Lag is 0 when everything received is replayed (an idle primary would otherwise look like lag), NULL on a non replica
+HEALTH_QUERY = '''
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag;
+'''
+
+#databases reads these from the url itself, asyncpg would take them for server settings
+DATABASES_URL_OPTIONS = ('min_size', 'max_size', 'ssl')
+POOL_ONLY_OPTIONS = ('min_size', 'max_size', 'max_queries', 'max_inactive_connection_lifetime', 'setup', 'init', 'reset')
+
+logger = logging.getLogger(__name__)
+
+_pool = ContextVar('database_pool', default=())
+_pinned_replica = ContextVar('database_replica', default=None) #[replica] of the current use_pool block
+
+
+
+@contextmanager
+def use_pool(*names: str):
+    '''
+    Runs the queries of the block on the first available of names, primary if none is.
+    Reads of the block stay on one replica until it is marked down.
+
+    :param names: pool names in order of preference, ie 'replica', 'analytics'
+    '''
+    token = _pool.set(names)
+    pinned = _pinned_replica.set([None])
+    try:
+        yield
+    finally:
+        _pinned_replica.reset(pinned)
+        _pool.reset(token)
+
+
+
+class ReplicaSet:
+    def __init__(self, replicas: list, health_interval: float, health_timeout: float, max_lag: float):
+        '''
+        Read replicas with background health checks, handed out round robin \n
+
+        replicas -> InstrumentedDatabase per replica \n
+        health_interval -> Seconds between health checks \n
+        health_timeout -> Seconds a (re)connect or health query may take \n
+        max_lag -> Replicas further behind (seconds) are skipped \n
+        '''
+        self.replicas = replicas
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_lag = max_lag
+        self.healthy = {db.name: None for db in replicas} #None until the first check
+        self.lag = {db.name: None for db in replicas}
+        self._next = 0
+        self._task = None
+        self._probes = {} #name -> dedicated health check connection
+        for db in replicas:
+            REPLICA_HEALTHY.set(0, db.name)
+
+
+    def pick(self):
+        '''
+        Next healthy replica (None if there is none) \n
+        '''
+        healthy = [db for db in self.replicas if self.healthy[db.name]]
+        if not healthy:
+            return None
+        self._next += 1
+        return healthy[self._next % len(healthy)]
+
+
+    def mark_down(self, db, reason: str):
+        self._set_health(db, False, self.lag[db.name], reason)
+
+
+    def _set_health(self, db, healthy: bool, lag, reason: str = None):
+        if healthy != self.healthy[db.name]:
+            if healthy:
+                logger.warning('Replica %s is healthy%s', db.name, ' again' if self.healthy[db.name] is not None else '')
+            else:
+                logger.warning('Replica %s is unhealthy, reads fall back: %s', db.name, reason)
+        self.healthy[db.name] = healthy
+        self.lag[db.name] = lag
+        REPLICA_HEALTHY.set(int(healthy), db.name)
+        REPLICA_LAG_SECONDS.set(lag if lag is not None else 0, db.name)
+
+
+    async def _probe(self, db):
+        '''
+        Replication lag of db, queried on a dedicated connection so it never waits for a pool slot.
+        The connection is opened from the replica url (tls options included) and the pool's connect options.
+        '''
+        conn = self._probes.get(db.name)
+        if conn is None or conn.is_closed():
+            url = db.url.components
+            query = urlencode([(k, v) for k, v in parse_qsl(url.query) if k not in DATABASES_URL_OPTIONS])
+            dsn = urlunsplit(('postgresql', url.netloc, url.path, query, ''))
+            options = {k: v for k, v in db._backend._get_connection_kwargs().items() if k not in POOL_ONLY_OPTIONS}
+            options['timeout'] = self.health_timeout
+            conn = self._probes[db.name] = await asyncpg.connect(dsn, **options)
+        return await conn.fetchval(HEALTH_QUERY, timeout=self.health_timeout)
+
+
+    def _close_probe(self, db):
+        conn = self._probes.pop(db.name, None)
+        if conn is not None and not conn.is_closed():
+            conn.terminate()
+
+
+    async def check(self, db):
+        '''
+        (Re)connects db if needed and updates its health from its replication lag \n
+        '''
+        try:
+            lag = await self._probe(db)
+            if not db.is_connected:
+                await asyncio.wait_for(db.connect(), self.health_timeout)
+        except Exception as e:
+            self._close_probe(db)
+            self._set_health(db, False, None, repr(e))
+            return
+        lag = float(lag) if lag is not None else None
+        if lag is not None and lag > self.max_lag:
+            self._set_health(db, False, lag, f'{lag:.1f}s behind')
+        else:
+            self._set_health(db, True, lag)
+
+
+    async def connect(self):
+        '''
+        Connects every replica it can, the others stay unhealthy until a health check reaches them \n
+        '''
+        await asyncio.gather(*[self.check(db) for db in self.replicas])
+
+
+    async def disconnect(self):
+        for db in self.replicas:
+            self._close_probe(db)
+            if db.is_connected:
+                await db.disconnect()
+
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*[self.check(db) for db in self.replicas])
+
+
+    def start(self):
+        '''
+        Starts the background health checks \n
+        '''
+        if self._task is None:
+            self._task = asyncio.create_task(self._health_loop())
+
+
+    async def stop(self):
+        '''
+        Cancels the background health checks \n
+        '''
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+    def pool_stats(self) -> list:
+        return [{**db.pool_stats(), 'healthy': bool(self.healthy[db.name]), 'lag_seconds': self.lag[db.name]} for db in self.replicas]
+
+
+
+class DatabasePools:
+    def __init__(self, primary, replicas: ReplicaSet = None, **pools):
+        '''
+        Same query interface as databases.Database, dispatching to one of several InstrumentedDatabase pools \n
+
+        primary -> Default pool \n
+        replicas -> Read replicas, the 'replica' pool (None if there are none) \n
+        pools -> Other pools by name, None values are skipped (their queries go to the next choice) \n
+        '''
+        self.primary = primary
+        self.replicas = replicas if replicas is not None and replicas.replicas else None
+        self.pools = {'primary': primary, **{name: db for name, db in pools.items() if db is not None}}
+
+
+    def current(self, read_only: bool = True):
+        '''
+        Pool of the current context, writes never go to a replica \n
+        '''
+        for name in _pool.get():
+            if name == REPLICA:
+                db = self._replica() if read_only and self.replicas is not None else None
+            else:
+                db = self.pools.get(name)
+            if db is not None:
+                return db
+        return self.primary
+
+
+    def _replica(self):
+        '''
+        Replica of the current use_pool block, a new pick if it has none or it was marked down \n
+        '''
+        pinned = _pinned_replica.get()
+        if pinned is not None and pinned[0] is not None and self.replicas.healthy[pinned[0].name]:
+            return pinned[0]
+        db = self.replicas.pick()
+        if pinned is not None:
+            pinned[0] = db
+        return db
+
+
+    async def connect(self, *names: str):
+        '''
+        Connects every pool, or only the ones use_pool(*names) can select (the primary only as their last fallback) \n
+        '''
+        dbs = list(self.pools.values()) if not names else [self.pools[name] for name in names if name in self.pools] or [self.primary]
+        for db in dbs:
+            await db.connect()
+        if self.replicas is not None and (not names or REPLICA in names):
+            await self.replicas.connect()
+
+
+    async def disconnect(self):
+        for db in self.pools.values():
+            if db.is_connected:
+                await db.disconnect()
+        if self.replicas is not None:
+            await self.replicas.disconnect()
+
+
+    def start(self):
+        '''
+        Starts the replica health checks (if there are replicas) \n
+        '''
+        if self.replicas is not None:
+            self.replicas.start()
+
+
+    async def stop(self):
+        if self.replicas is not None:
+            await self.replicas.stop()
+
+
+    async def _read(self, method: str, *args):
+        db = self.current()
+        try:
+            return await getattr(db, method)(*args)
+        except REPLICA_ERRORS as e:
+            if self.replicas is None or db not in self.replicas.replicas:
+                raise
+            self.replicas.mark_down(db, repr(e))
+        return await getattr(self.current(), method)(*args)
+
+
+    async def fetch_all(self, query, values=None):
+        return await self._read('fetch_all', query, values)
+
+
+    async def fetch_one(self, query, values=None):
+        return await self._read('fetch_one', query, values)
+
+
+    async def fetch_val(self, query, values=None, column=0):
+        return await self._read('fetch_val', query, values, column)
+
+
+    async def execute(self, *args, **kwargs):
+        return await self.current(read_only=False).execute(*args, **kwargs)
+
+
+    async def execute_many(self, *args, **kwargs):
+        return await self.current(read_only=False).execute_many(*args, **kwargs)
+
+
+    def pool_stats(self) -> list:
+        stats = [db.pool_stats() for db in self.pools.values()]
+        return stats + (self.replicas.pool_stats() if self.replicas is not None else [])
+
+
+    def get_slow_queries(self, limit: int = None) -> list:
+        '''
+        Slow queries of every pool, newest first
+
+        :param limit: max entries returned (None for all)
+        :return: list of slow query dicts
+        '''
+        dbs = list(self.pools.values()) + (self.replicas.replicas if self.replicas is not None else [])
+        entries = sorted((entry for db in dbs for entry in db.get_slow_queries()), key=lambda e: e['time'], reverse=True)
+        return entries[:limit] if limit is not None else entries
+
+
+
+class PoolSelectionMiddleware:
+    def __init__(self, app, routes: dict):
+        '''
+        Pure ASGI middleware running each request on the pools its path maps to \n
+
+        routes -> pool name -> path prefixes, in order of preference, ie {'replica': (...), 'analytics': (...)} \n
+        '''
+        self.app = app
+        self.routes = [(tuple(prefixes), name) for name, prefixes in routes.items()]
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            names = tuple(name for prefixes, name in self.routes if scope['path'].startswith(prefixes))
+            if names:
+                with use_pool(*names):
+                    await self.app(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
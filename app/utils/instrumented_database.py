@@ -0,0 +1,217 @@
+from databases import Database
+from app.config.slow_query_config import SLOW_QUERY_SECONDS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS, SLOW_QUERY_KEEP
+from app.utils.metrics import timed_phase, add_phase_time, POOL_WAIT_SECONDS, POOL_IN_USE, POOL_WAITING, POOL_MAX_SIZE
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import asyncio
+import logging
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+MAX_VALUE_CHARS = 200
+DEFAULT_MAX_SIZE = 10 #asyncpg pool default
+WAIT_WARN_INTERVAL_SECONDS = 60
+
+
+
+class InstrumentedDatabase(Database):
+    def __init__(self, *args, name: str = 'primary', wait_warn_seconds: float = None, slow_seconds: float = SLOW_QUERY_SECONDS, explain: bool = SLOW_QUERY_EXPLAIN, explain_cooldown: float = SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS, keep: int = SLOW_QUERY_KEEP, **kwargs):
+        '''
+        databases.Database whose query methods count towards the 'db' phase of the current request.
+        Queries take one of max_size slots before they reach the pool, so waiting for a connection is
+        measured (db_pool_* metrics, 'db_wait' phase) instead of hidden inside the driver.
+        Reads slower than slow_seconds are logged with their bound values and kept in a ring buffer,
+        optionally with the EXPLAIN (ANALYZE, BUFFERS) plan captured in the background. \n
+
+        name -> Pool label in metrics & the slow query log \n
+        wait_warn_seconds -> Logs a warning (at most once a minute) when a checkout waits longer (None disables) \n
+        slow_seconds -> Slow query threshold (None disables the log) \n
+        explain -> Capture plans of slow SELECTs (the query is run again, one capture at a time) \n
+        explain_cooldown -> Seconds before the same query text is explained again \n
+        keep -> Slow queries kept in the ring buffer \n
+        kwargs -> databases.Database / asyncpg.create_pool options, ie min_size, max_size, server_settings \n
+        '''
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.max_size = kwargs.get('max_size', DEFAULT_MAX_SIZE)
+        self.wait_warn_seconds = wait_warn_seconds
+        self.in_use = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._last_wait_warning = None
+        POOL_MAX_SIZE.set(self.max_size, name)
+        POOL_IN_USE.set(0, name)
+        POOL_WAITING.set(0, name)
+        self.slow_seconds = slow_seconds
+        self.explain = explain
+        self.explain_cooldown = explain_cooldown
+        self.slow_queries = deque(maxlen=keep)
+        self._explained = {} #query text -> last capture time
+        self._explaining = False
+        self._explain_tasks = set() #The loop only keeps weak references to tasks
+
+
+    async def fetch_all(self, query, values=None):
+        async with self._checkout():
+            with timed_phase('db'):
+                start = time.perf_counter()
+                result = await super().fetch_all(query, values)
+        self._check_slow('fetch_all', query, values, time.perf_counter() - start)
+        return result
+
+
+    async def fetch_one(self, query, values=None):
+        async with self._checkout():
+            with timed_phase('db'):
+                start = time.perf_counter()
+                result = await super().fetch_one(query, values)
+        self._check_slow('fetch_one', query, values, time.perf_counter() - start)
+        return result
+
+
+    async def fetch_val(self, query, values=None, column=0):
+        async with self._checkout():
+            with timed_phase('db'):
+                start = time.perf_counter()
+                result = await super().fetch_val(query, values, column)
+        self._check_slow('fetch_val', query, values, time.perf_counter() - start)
+        return result
+
+
+    async def execute(self, *args, **kwargs):
+        async with self._checkout():
+            with timed_phase('db'):
+                return await super().execute(*args, **kwargs)
+
+
+    async def execute_many(self, *args, **kwargs):
+        async with self._checkout():
+            with timed_phase('db'):
+                return await super().execute_many(*args, **kwargs)
+
+
+    @asynccontextmanager
+    async def _checkout(self):
+        '''
+        Holds one of the max_size pool slots for the block, waits are timed when all of them are taken
+        '''
+        if self._slots.locked():
+            self.waiting += 1
+            POOL_WAITING.set(self.waiting, self.name)
+            start = time.perf_counter()
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+                POOL_WAITING.set(self.waiting, self.name)
+            wait = time.perf_counter() - start
+            add_phase_time('db_wait', wait)
+            self._warn_wait(wait)
+        else:
+            await self._slots.acquire()
+            wait = 0.0
+        POOL_WAIT_SECONDS.observe(wait, self.name)
+
+        self.in_use += 1
+        POOL_IN_USE.set(self.in_use, self.name)
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            POOL_IN_USE.set(self.in_use, self.name)
+            self._slots.release()
+
+
+    def _warn_wait(self, wait: float):
+        if self.wait_warn_seconds is None or wait < self.wait_warn_seconds:
+            return
+        now = time.monotonic()
+        if self._last_wait_warning is None or now - self._last_wait_warning >= WAIT_WARN_INTERVAL_SECONDS:
+            self._last_wait_warning = now
+            logger.warning('%s pool saturated: waited %.3fs for a connection (%d in use, %d waiting, max %d)',
+                           self.name, wait, self.in_use, self.waiting, self.max_size)
+
+
+    def pool_stats(self) -> dict:
+        return {'pool': self.name, 'max_size': self.max_size, 'in_use': self.in_use, 'waiting': self.waiting}
+
+
+    def _check_slow(self, method: str, query, values, seconds: float):
+        if self.slow_seconds is None or seconds < self.slow_seconds or not isinstance(query, str):
+            return
+
+        text = ' '.join(query.split())
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'pool': self.name,
+            'seconds': round(seconds, 4),
+            'method': method,
+            'query': text,
+            'values': {k: _short(v) for k, v in (values or {}).items()},
+            'plan': None,
+        }
+        self.slow_queries.append(entry)
+        logger.warning('Slow query (%.3fs, %s pool) %s values=%s', seconds, self.name, text, entry['values'])
+
+        if self._should_explain(text):
+            entry['plan'] = 'pending'
+            self._explaining = True
+            self._explained[text] = time.monotonic()
+            task = asyncio.get_running_loop().create_task(self._capture_plan(entry, query, values))
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+
+    def _should_explain(self, text: str) -> bool:
+        if not self.explain or self._explaining or not READ_ONLY.match(text):
+            return False
+        last = self._explained.get(text)
+        return last is None or time.monotonic() - last >= self.explain_cooldown
+
+
+    async def _capture_plan(self, entry: dict, query: str, values):
+        '''
+        Runs query again under EXPLAIN (ANALYZE, BUFFERS) on a connection of this pool (the primary, replica
+        or analytics pool the query was slow on) and stores the plan text on the entry
+        '''
+        try:
+            async with self._checkout():
+                async with self.connection() as connection:
+                    records = await connection.fetch_all('EXPLAIN (ANALYZE, BUFFERS) ' + query.strip(), values)
+            entry['plan'] = '\n'.join(record['QUERY PLAN'] for record in records)
+        except Exception as e:
+            entry['plan'] = None
+            entry['explain_error'] = repr(e)
+            logger.exception('EXPLAIN of slow query failed')
+        finally:
+            self._explaining = False
+
+
+    def get_slow_queries(self, limit: int = None) -> list:
+        '''
+        Slow queries, newest first
+
+        :param limit: max entries returned (None for all)
+        :return: list of slow query dicts
+        '''
+        entries = list(reversed(self.slow_queries))
+        return entries[:limit] if limit is not None else entries
+
+
+
+def _short(value):
+    '''
+    JSON friendly copy of a bound value, long values (ie option id lists) are truncated
+    '''
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        text, more = str(list(value)), f'... ({len(value)} items)'
+    else:
+        text, more = str(value), '...'
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS] + more
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256):
+        '''
+        Bounded least recently used cache \n
+
+        maxsize -> Max number of entries kept before the oldest is evicted \n
+        '''
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+
+    def get(self, key, default=None):
+        '''
+        Returns cached value for key (or default) and marks it as recently used \n
+        '''
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+
+    def put(self, key, value):
+        '''
+        Stores value under key, evicting the least recently used entry if full \n
+        '''
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+    def clear(self):
+        '''
+        Drops every cached entry \n
+        '''
+        self._data.clear()
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,210 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import time
+
+
+'''
+    In process request metrics.
+
+    Every request gets a phase -> seconds dict through a context variable, code that does db,
+    compute or serialization work wraps it in timed_phase(). MetricsMiddleware turns the dict into
+    a Server-Timing header and per route histograms which /metrics renders in Prometheus text format.
+    Database pools (app/utils/instrumented_database.py) add checkout wait histograms and in use gauges,
+    alert on db_pool_waiting_queries > 0 or a rising db_pool_checkout_wait_seconds p95 for saturation.
+    Each worker process keeps its own metrics, scrape every worker (or one worker per pod).
+'''
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_timings = ContextVar('request_timings', default=None)
+
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple = LATENCY_BUCKETS):
+        '''
+        Prometheus style histogram with one series per label combination \n
+
+        name -> Metric name \n
+        help -> Metric description \n
+        labels -> Label names, observe() takes values in the same order \n
+        buckets -> Upper bounds in seconds (+Inf is implicit) \n
+        '''
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {} #label values -> [bucket counts (non cumulative), sum, count]
+
+
+    def observe(self, value: float, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+
+    def render(self) -> list:
+        '''
+        Prometheus text exposition lines \n
+        '''
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(self.series.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            sep = ',' if labels else ''
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels: tuple):
+        '''
+        Prometheus style gauge with one value per label combination \n
+
+        name -> Metric name \n
+        help -> Metric description \n
+        labels -> Label names, set() takes values in the same order \n
+        '''
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {} #label values -> value
+
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+
+    def render(self) -> list:
+        '''
+        Prometheus text exposition lines \n
+        '''
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for label_values, value in sorted(self.values.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status'))
+PHASE_SECONDS = Histogram('http_request_phase_seconds', 'Time spent per request phase by route (db time of concurrent queries is summed)', ('route', 'phase'))
+POOL_WAIT_SECONDS = Histogram('db_pool_checkout_wait_seconds', 'Time queries waited for a free pool connection', ('pool',),
+                              (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Pool connections running a query', ('pool',))
+POOL_WAITING = Gauge('db_pool_waiting_queries', 'Queries waiting for a free pool connection', ('pool',))
+POOL_MAX_SIZE = Gauge('db_pool_max_size', 'Max connections of the pool', ('pool',))
+REPLICA_HEALTHY = Gauge('db_replica_healthy', '1 if the read replica passes its health check', ('pool',))
+REPLICA_LAG_SECONDS = Gauge('db_replica_lag_seconds', 'Replication lag at the last health check', ('pool',))
+METRICS = [REQUEST_SECONDS, PHASE_SECONDS, POOL_WAIT_SECONDS, POOL_IN_USE, POOL_WAITING, POOL_MAX_SIZE, REPLICA_HEALTHY, REPLICA_LAG_SECONDS]
+
+
+
+@contextmanager
+def timed_phase(phase: str):
+    '''
+    Adds the wall time of the block to phase of the current request, a no-op outside requests.
+    Also works as a decorator on sync functions.
+
+    :param phase: phase name, ie 'db', 'compute', 'serialize'
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase_time(phase, time.perf_counter() - start)
+
+
+
+def add_phase_time(phase: str, seconds: float):
+    '''
+    Adds seconds to phase of the current request, a no-op outside requests
+    '''
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+
+def server_timing(timings: dict, total: float) -> bytes:
+    '''
+    Server-Timing header value, durations in ms
+    '''
+    parts = [f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in timings.items()]
+    parts.append(f'app;dur={total * 1000:.1f}')
+    return ', '.join(parts).encode('latin-1')
+
+
+
+def route_label(scope) -> str:
+    '''
+    Request path with path parameters put back as {name}, 'unmatched' when no route matched.
+    Keeps label cardinality bounded to the number of routes.
+    '''
+    if scope.get('route') is None:
+        return 'unmatched'
+    path = scope['path']
+    for name, value in scope.get('path_params', {}).items():
+        path = path.replace(f'/{value}', f'/{{{name}}}', 1)
+    return path
+
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        '''
+        Pure ASGI middleware (does not buffer streamed bodies).
+        Adds Server-Timing to every http response and records route/phase histograms once the body is sent. \n
+        '''
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', server_timing(timings, time.perf_counter() - start)))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _timings.reset(token)
+            route = route_label(scope)
+            REQUEST_SECONDS.observe(elapsed, scope['method'], route, str(status[0]))
+            for phase, seconds in timings.items():
+                PHASE_SECONDS.observe(seconds, route, phase)
@@ -0,0 +1,218 @@
+from app.config.profiling_config import PROFILE_DIR, PROFILE_INTERVAL_SECONDS, PROFILE_KEEP
+from app.utils.api_key_check import is_admin_key
+from collections import Counter
+from urllib.parse import parse_qs
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+
+'''
+    On demand request profiling.
+
+    A request asks for a profile with ?profile=1 or an X-Profile: 1 header, only admin api keys get one.
+    The event loop thread is sampled by a background thread while the request runs and the samples are
+    written in collapsed stack format (one 'frame;frame;frame count' line per stack), which flamegraph.pl,
+    speedscope and inferno read directly. Other requests served concurrently by the worker show up in the
+    samples too, profile on a quiet worker for a clean picture.
+'''
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_ID = re.compile(r'^[0-9]+-[A-Za-z0-9_.-]+$')
+
+_prefixes = sorted({p for p in sys.path if p}, key=len, reverse=True)
+
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_SECONDS):
+        '''
+        Samples the python stack of one thread at a fixed interval \n
+
+        thread_id -> threading.get_ident() of the thread to sample \n
+        interval -> Seconds between samples \n
+        '''
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+
+    def start(self):
+        self._thread.start()
+
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+    def collapsed(self) -> str:
+        '''
+        Samples in collapsed stack format \n
+        '''
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    for prefix in _prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope['headers']:
+        if name == PROFILE_HEADER:
+            return value not in (b'', b'0', b'false')
+    return b'profile=' in scope['query_string'] and parse_qs(scope['query_string'].decode('latin-1')).get('profile', ['0'])[-1] not in ('', '0', 'false')
+
+
+
+def new_profile_id(path: str) -> str:
+    '''
+    Sortable, filename safe profile id, ie 1700000000000000000-options_hist_quotes
+    '''
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', path).strip('_') or 'root'
+    return f'{time.time_ns()}-{slug}'
+
+
+
+def save_profile(profile_id: str, collapsed: str, meta: dict):
+    '''
+    Writes a profile (and its metadata) to PROFILE_DIR, dropping the oldest ones past PROFILE_KEEP
+
+    :param profile_id: id from new_profile_id
+    :param collapsed: collapsed stacks
+    :param meta: request info stored next to the stacks
+    '''
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, profile_id + '.collapsed'), 'w') as f:
+        f.write(collapsed)
+    with open(os.path.join(PROFILE_DIR, profile_id + '.json'), 'w') as f:
+        json.dump(meta, f)
+
+    for old in list_profiles()[PROFILE_KEEP:]:
+        for ext in ('.collapsed', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old['id'] + ext))
+            except OSError:
+                pass
+
+
+
+def list_profiles() -> list:
+    '''
+    Stored profile metadata, newest first
+    '''
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['id'] = name[:-len('.json')]
+        profiles.append(meta)
+
+    return sorted(profiles, key=lambda p: int(p['id'].split('-', 1)[0]), reverse=True)
+
+
+
+def load_profile(profile_id: str):
+    '''
+    Collapsed stacks of a stored profile (None if unknown)
+    '''
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, profile_id + '.collapsed')) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, interval: float = PROFILE_INTERVAL_SECONDS):
+        '''
+        Pure ASGI middleware profiling requests that ask for it.
+        Requests that do not ask only pay a header / query string check. \n
+        '''
+        self.app = app
+        self.interval = interval
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        api_key = parse_qs(scope['query_string'].decode('latin-1')).get('apiKey', [None])[-1]
+        if not is_admin_key(api_key):
+            body = b'{"message":"Profiling requires an admin API key.","data":{}}'
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        profile_id = new_profile_id(scope['path'])
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'x-profile-id', profile_id.encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            meta = {
+                'path': scope['path'],
+                'query': _redact(scope['query_string'].decode('latin-1')),
+                'status': status[0],
+                'seconds': elapsed,
+                'samples': sampler.samples,
+                'interval': self.interval,
+            }
+            save_profile(profile_id, sampler.collapsed(), meta)
+
+
+
+def _redact(query: str) -> str:
+    return re.sub(r'(^|&)apiKey=[^&]*', r'\1apiKey=REDACTED', query)
@@ -0,0 +1,90 @@
+import numpy as np
+
+TRADING_DAYS = 252
+ESTIMATORS = ['close_to_close', 'parkinson', 'garman_klass', 'yang_zhang']
+
+
+def _cumsum(x):
+    '''
+    Cumulative sum with a leading zero so window sums are c[i + 1] - c[i + 1 - w]
+    '''
+    return np.concatenate(([0.0], np.cumsum(x)))
+
+
+def _window_sum(c, window, start):
+    '''
+    Rolling sum of the last `window` values from a _cumsum array.
+    Entries before index start + window - 1 do not have a full window and are NaN.
+
+    :param c: output of _cumsum (length n + 1)
+    :param window: window length in bars
+    :param start: first index holding a valid value of the summed series
+    :return: array of length n
+    '''
+    n = len(c) - 1
+    out = np.full(n, np.nan)
+    first = start + window - 1
+    if first < n:
+        out[first:] = c[first + 1:] - c[first + 1 - window:n + 1 - window]
+    return out
+
+
+def _window_var(c, c2, window, start):
+    '''
+    Rolling sample variance (ddof 1) from cumulative sums of x and x^2
+    '''
+    s = _window_sum(c, window, start)
+    s2 = _window_sum(c2, window, start)
+    return np.maximum((s2 - s * s / window) / (window - 1), 0.0)
+
+
+def realized_volatility(open, high, low, close, windows, estimators=ESTIMATORS):
+    '''
+    Rolling annualized realized volatility for every window length in one pass.
+    Each input series is reduced to cumulative sums once, every window is then two slices.
+
+    :param open: array of open prices (oldest first)
+    :param high: array of high prices
+    :param low: array of low prices
+    :param close: array of close prices
+    :param windows: list of window lengths in trading days (each >= 2)
+    :param estimators: subset of ESTIMATORS to compute
+    :return: dict estimator -> window -> array aligned with the input bars (NaN until a full window)
+    '''
+    o = np.log(np.asarray(open, dtype=float))
+    h = np.log(np.asarray(high, dtype=float))
+    l = np.log(np.asarray(low, dtype=float))
+    c = np.log(np.asarray(close, dtype=float))
+
+    # Series needing the previous close start at index 1
+    close_ret = np.concatenate(([0.0], np.diff(c)))
+    overnight = np.concatenate(([0.0], o[1:] - c[:-1]))
+    intraday = c - o
+    hl_sq = (h - l) ** 2
+    rs = (h - c) * (h - o) + (l - c) * (l - o)
+
+    sums = {}
+    for name, series in [('ret', close_ret), ('on', overnight), ('oc', intraday), ('hl', hl_sq), ('rs', rs)]:
+        sums[name] = _cumsum(series)
+        sums[name + '2'] = _cumsum(series * series)
+
+    result = {estimator: {} for estimator in estimators}
+    for w in windows:
+        if 'close_to_close' in estimators:
+            result['close_to_close'][w] = np.sqrt(_window_var(sums['ret'], sums['ret2'], w, 1) * TRADING_DAYS)
+
+        if 'parkinson' in estimators:
+            result['parkinson'][w] = np.sqrt(_window_sum(sums['hl'], w, 0) / (4 * np.log(2) * w) * TRADING_DAYS)
+
+        if 'garman_klass' in estimators:
+            gk = 0.5 * _window_sum(sums['hl'], w, 0) - (2 * np.log(2) - 1) * _window_sum(sums['oc2'], w, 0)
+            result['garman_klass'][w] = np.sqrt(np.maximum(gk / w, 0.0) * TRADING_DAYS)
+
+        if 'yang_zhang' in estimators:
+            k = 0.34 / (1.34 + (w + 1) / (w - 1))
+            var_on = _window_var(sums['on'], sums['on2'], w, 1)
+            var_oc = _window_var(sums['oc'], sums['oc2'], w, 1)
+            var_rs = _window_sum(sums['rs'], w, 1) / w
+            result['yang_zhang'][w] = np.sqrt(np.maximum(var_on + k * var_oc + (1 - k) * var_rs, 0.0) * TRADING_DAYS)
+
+    return result
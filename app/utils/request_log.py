@@ -0,0 +1,191 @@
+from app.config.request_log_config import REQUEST_LOG_PATH, REQUEST_LOG_SAMPLE_RATE, REQUEST_LOG_MAX_BYTES, REQUEST_LOG_MAX_BODY_BYTES, REQUEST_LOG_EXCLUDE
+from urllib.parse import parse_qsl
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+
+'''
+    Request log for replay benchmarks.
+
+    Every sampled request is appended to a JSONL file as one normalized line:
+    {"ts": epoch seconds, "method", "path", "query": [[name, value], ...] sorted by name, "body": json or null,
+     "body_skipped": true if the body was too large / not json, "status", "ms"}
+    API keys are replaced by REDACTED (query string and top level body keys) and ?profile is dropped.
+    benchmarks/replay.py re-issues the log against another instance. Several workers can share one file,
+    each line is a single O_APPEND write and rotation is serialized by an flock on <path>.lock.
+'''
+
+REDACTED = 'REDACTED'
+SECRET_PARAMS = {'apiKey'}
+DROPPED_PARAMS = {'profile'}
+
+logger = logging.getLogger(__name__)
+
+
+
+class RequestLogWriter:
+    def __init__(self, path: str, max_bytes: int = REQUEST_LOG_MAX_BYTES):
+        '''
+        Appends lines to path, rotating it to path.1 once it grows past max_bytes \n
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        self._fd = None
+        self._inode = None
+        self._lock_fd = None
+        self._lock = threading.Lock()
+
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+
+
+    def _reopen_if_rotated(self):
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != self._inode: #Another worker rotated the file
+            os.close(self._fd)
+            self._open()
+
+
+    def write(self, record: dict):
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode()
+        with self._lock:
+            if self._fd is None:
+                self._open()
+            else:
+                self._reopen_if_rotated()
+            if self.max_bytes and os.fstat(self._fd).st_size + len(line) > self.max_bytes:
+                self._rotate(len(line))
+            os.write(self._fd, line)
+
+
+    def _rotate(self, size: int):
+        '''
+        Rotates path to path.1 under an exclusive flock, unless another worker rotated it first
+        '''
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + '.lock', os.O_WRONLY | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            self._reopen_if_rotated()
+            if os.fstat(self._fd).st_size + size > self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+                os.close(self._fd)
+                self._open()
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+
+def normalize_query(query_string: bytes) -> list:
+    '''
+    Query params as [name, value] pairs sorted by name (repeats keep their order), secrets redacted
+    '''
+    params = parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)
+    return [[name, REDACTED if name in SECRET_PARAMS else value]
+            for name, value in sorted(params, key=lambda p: p[0]) if name not in DROPPED_PARAMS]
+
+
+
+def normalize_body(body: bytes):
+    '''
+    Parsed json body with top level secrets redacted
+
+    :return: (body, skipped) -> skipped is True when a non empty body is not json
+    '''
+    if not body:
+        return None, False
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        return None, True
+    if isinstance(parsed, dict):
+        parsed = {k: REDACTED if k in SECRET_PARAMS else v for k, v in parsed.items()}
+    return parsed, False
+
+
+
+class RequestLogMiddleware:
+    def __init__(self, app, path: str = REQUEST_LOG_PATH, sample_rate: float = REQUEST_LOG_SAMPLE_RATE,
+                 max_body_bytes: int = REQUEST_LOG_MAX_BODY_BYTES, exclude: tuple = REQUEST_LOG_EXCLUDE):
+        '''
+        Pure ASGI middleware appending sampled requests to a JSONL request log.
+        Bodies are copied as they are received, the request is never buffered. \n
+        '''
+        self.app = app
+        self.writer = RequestLogWriter(path)
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.exclude = tuple(exclude)
+
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['path'].startswith(self.exclude)
+                or (self.sample_rate < 1 and random.random() >= self.sample_rate)):
+            await self.app(scope, receive, send)
+            return
+
+        ts = time.time()
+        start = time.perf_counter()
+        chunks = []
+        size = [0]
+        status = [500]
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request' and size[0] <= self.max_body_bytes:
+                body = message.get('body', b'')
+                size[0] += len(body)
+                if size[0] <= self.max_body_bytes:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if size[0] > self.max_body_bytes:
+                body, skipped = None, True
+            else:
+                body, skipped = normalize_body(b''.join(chunks))
+            record = {
+                'ts': round(ts, 6),
+                'method': scope['method'],
+                'path': scope['path'],
+                'query': normalize_query(scope['query_string']),
+                'body': body,
+                'status': status[0],
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            }
+            if skipped:
+                record['body_skipped'] = True
+            try:
+                self.writer.write(record)
+            except OSError:
+                logger.exception('Could not write to the request log %s', self.writer.path)
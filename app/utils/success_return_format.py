@@ -1,5 +1,11 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.utils.metrics import timed_phase
+
+
 def success_return(data):
-    return {
-        "message": "ok",
-        "data": data
-    }
\ No newline at end of file
+    with timed_phase('serialize'):
+        return JSONResponse(content=jsonable_encoder({
+            "message": "ok",
+            "data": data
+        }))
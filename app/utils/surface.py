@@ -0,0 +1,162 @@
+import numpy as np
+from datetime import date
+
+
+def interp_ragged(xq, xp, fp, counts):
+    '''
+    Piecewise linear interpolation of many curves in one vectorized pass.
+    Matches UnivariateSpline(k=1, s=0, ext=3): exact through the points and flat outside them.
+
+    :param xq: query points, shape (Q,) shared by every curve or (G, Q) per curve
+    :param xp: concatenated x values of all curves, sorted ascending within each curve
+    :param fp: concatenated y values, shape (N,) or (N, M) for several series per curve
+    :param counts: number of points in each of the G curves (each >= 1)
+    :return: array of shape (G, Q) or (G, Q, M)
+    '''
+    counts = np.asarray(counts, dtype=np.int64)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.asarray(fp, dtype=float)
+    xq = np.asarray(xq, dtype=float)
+
+    n_curves = len(counts)
+    if xq.ndim == 1:
+        xq = np.broadcast_to(xq, (n_curves, xq.size))
+
+    if n_curves == 0:
+        return np.empty((0, xq.shape[-1]) + fp.shape[1:])
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+
+    # Shift every curve into its own disjoint band so one searchsorted covers all of them
+    lo = min(xp.min(), xq.min())
+    span = max(xp.max(), xq.max()) - lo + 1.0
+    band = np.repeat(np.arange(n_curves), counts) * span
+    idx = np.searchsorted(xp - lo + band, xq - lo + (np.arange(n_curves) * span)[:, None], side='right')
+
+    left = np.clip(idx - 1, starts[:, None], ends[:, None])
+    right = np.clip(idx, starts[:, None], ends[:, None])
+
+    x0 = xp[left]
+    dx = xp[right] - x0
+    w = np.divide(xq - x0, dx, out=np.zeros_like(dx), where=dx > 0)
+    w = np.clip(w, 0.0, 1.0)
+
+    if fp.ndim == 2:
+        w = w[..., None]
+
+    return fp[left] * (1.0 - w) + fp[right] * w
+
+
+
+class SmileSet:
+    def __init__(self, records, x_key='actual_moneyness', y_key='iv'):
+        '''
+        Flattens stock_iv rows into one array backed smile per (trade_date, dte).
+        Grouping, de-duplication and the two point minimum mirror fit_spline_skew. \n
+
+        records -> stock_iv rows ordered by trade_date, dte, moneyness \n
+        x_key -> Column used as the smile x axis \n
+        y_key -> Column used as the smile y axis \n
+        '''
+        rows = [r for r in records if r[x_key] is not None and r[y_key] is not None]
+
+        day = np.array([r['trade_date'].toordinal() for r in rows], dtype=np.int64)
+        dte = np.array([r['dte'] for r in rows], dtype=np.int64)
+        x = np.array([float(r[x_key]) for r in rows], dtype=float)
+        y = np.array([float(r[y_key]) for r in rows], dtype=float)
+
+        # Sort by (day, dte, x) keeping the first row seen for a repeated x
+        order = np.lexsort((np.arange(len(rows)), x, dte, day))
+        day, dte, x, y = day[order], dte[order], x[order], y[order]
+        first = np.ones(len(x), dtype=bool)
+        first[1:] = (day[1:] != day[:-1]) | (dte[1:] != dte[:-1]) | (x[1:] != x[:-1])
+        day, dte, x, y = day[first], dte[first], x[first], y[first]
+
+        new_smile = np.ones(len(x), dtype=bool)
+        new_smile[1:] = (day[1:] != day[:-1]) | (dte[1:] != dte[:-1])
+        starts = np.flatnonzero(new_smile)
+        counts = np.diff(np.append(starts, len(x)))
+
+        keep = counts > 1
+        point_mask = np.repeat(keep, counts)
+
+        self.day = day[starts][keep]
+        self.dte = dte[starts][keep]
+        self.counts = counts[keep]
+        self.x = x[point_mask]
+        self.y = y[point_mask]
+
+
+    @classmethod
+    def concat(cls, smile_sets):
+        '''
+        Joins smile sets of consecutive, non overlapping trade date ranges given in date order \n
+        '''
+        smiles = cls.__new__(cls)
+        for attr, dtype in [('day', np.int64), ('dte', np.int64), ('counts', np.int64), ('x', float), ('y', float)]:
+            setattr(smiles, attr, np.concatenate([np.zeros(0, dtype=dtype)] + [getattr(s, attr) for s in smile_sets]))
+        return smiles
+
+
+    def __len__(self):
+        return len(self.counts)
+
+
+    @property
+    def trade_dates(self):
+        '''
+        Sorted unique trade dates covered by the set \n
+        '''
+        return [date.fromordinal(int(d)) for d in np.unique(self.day)]
+
+
+    def evaluate(self, moneyness):
+        '''
+        Evaluates every smile at the given moneyness points \n
+
+        :param moneyness: array (M,) of moneyness values
+        :return: array (G, M), one row per (trade_date, dte) smile
+        '''
+        return interp_ragged(moneyness, self.x, self.y, self.counts)
+
+
+    def term_structure(self, moneyness, dtes):
+        '''
+        Evaluates every trade date's term structure at constant maturities.
+        Dates with fewer than two expiries are dropped, as in fit_spline_term_structure. \n
+
+        :param moneyness: array (M,) of moneyness values
+        :param dtes: array (Q,) of days to expiry
+        :return: (trade_dates, array (D, Q, M))
+        '''
+        moneyness = np.atleast_1d(np.asarray(moneyness, dtype=float))
+        dtes = np.atleast_1d(np.asarray(dtes, dtype=float))
+
+        values = self.evaluate(moneyness)
+        days, day_counts = np.unique(self.day, return_counts=True)
+
+        keep = day_counts > 1
+        row_mask = np.repeat(keep, day_counts)
+
+        grid = interp_ragged(dtes, self.dte[row_mask], values[row_mask], day_counts[keep])
+        return [date.fromordinal(int(d)) for d in days[keep]], grid
+
+
+
+    def term_slope(self, moneyness=0.5):
+        '''
+        Ratio of nearest to furthest expiry iv per trade date (same dates as term_structure) \n
+
+        :param moneyness: moneyness the ratio is taken at
+        :return: (trade_dates, array (D,))
+        '''
+        values = self.evaluate(np.array([moneyness], dtype=float))[:, 0]
+        days, starts, day_counts = np.unique(self.day, return_index=True, return_counts=True)
+
+        keep = day_counts > 1
+        starts = starts[keep]
+        ends = starts + day_counts[keep] - 1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return [date.fromordinal(int(d)) for d in days[keep]], values[starts] / values[ends]
@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.stats import norm
 
 #https://trading-volatility.com/Trading%20Volatility%20-%20Colin%20Bennett.pdf     PAGE 180 for the below 4 funcs
 
@@ -0,0 +1,111 @@
+from app.config.warmup_config import WARMUP_ENABLED, WARMUP_HOT_TICKERS, WARMUP_BUDGET_SECONDS, WARMUP_CONCURRENCY, WARMUP_READY_ON_TIMEOUT
+from app.models.trading_calendar import trading_calendar
+from app.models.ticker_catalog import ticker_catalog
+from app.models.options import get_priced_chain_db, get_smiles_db, get_chain_index_db
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    def __init__(self, ready_on_timeout: bool = WARMUP_READY_ON_TIMEOUT):
+        '''
+        Progress of the startup warm-up, reported by /health/ready \n
+
+        ready_on_timeout -> Whether a warm-up that ran out of budget (status 'cold') counts as ready \n
+        '''
+        self.status = 'pending' #pending -> warming -> ready, or cold if the budget ran out
+        self.ready_on_timeout = ready_on_timeout
+        self.started = None
+        self.seconds = None
+        self.done = 0
+        self.failed = 0
+        self.timed_out = False
+
+
+    @property
+    def ready(self):
+        return self.status == 'ready' or (self.status == 'cold' and self.ready_on_timeout)
+
+
+    def report(self) -> dict:
+        return {
+            'status': self.status,
+            'seconds': self.seconds if self.seconds is not None else (time.perf_counter() - self.started if self.started else None),
+            'tasks_done': self.done,
+            'tasks_failed': self.failed,
+            'timed_out': self.timed_out,
+        }
+
+
+
+warmup_state = WarmupState()
+
+
+
+async def _run(name: str, coro):
+    '''
+    Awaits one warm-up step, a failure is logged and counted but never stops the warm-up
+    '''
+    try:
+        await coro
+        warmup_state.done += 1
+    except Exception:
+        warmup_state.failed += 1
+        logger.exception('Warm-up step %s failed', name)
+
+
+
+async def _warm_ticker(ticker: str, day, semaphore: asyncio.Semaphore):
+    '''
+    Loads the latest day chain, smiles & expiry index of one hot ticker
+    '''
+    async with semaphore:
+        await _run(f'{ticker} chain', get_priced_chain_db(ticker, day))
+        await _run(f'{ticker} smiles', get_smiles_db(ticker, day, day))
+        await _run(f'{ticker} expiries', get_chain_index_db(ticker, day))
+
+
+
+async def _warm(hot_tickers: list, concurrency: int):
+    await asyncio.gather(
+        _run('trading calendar', trading_calendar.load()),
+        _run('ticker catalog', ticker_catalog.load()),
+    )
+
+    day = trading_calendar.latest
+    if day is None or len(hot_tickers) == 0:
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*[_warm_ticker(ticker.upper(), day, semaphore) for ticker in hot_tickers])
+
+
+
+async def warm_up(hot_tickers: list = WARMUP_HOT_TICKERS, budget_seconds: float = WARMUP_BUDGET_SECONDS, concurrency: int = WARMUP_CONCURRENCY, enabled: bool = WARMUP_ENABLED):
+    '''
+    Preloads the trading calendar, ticker catalog and the latest day caches of hot tickers.
+    Steps run concurrently, whatever is unfinished when the budget runs out is cancelled.
+    The worker is reported ready once this returns, one that ran out of budget is reported 'cold'
+    (ready unless WARMUP_READY_ON_TIMEOUT is off).
+
+    :param hot_tickers: tickers whose latest day chain & smiles are preloaded
+    :param budget_seconds: max wall time of the warm-up
+    :param concurrency: hot tickers warmed at once
+    :param enabled: False skips straight to ready
+    '''
+    warmup_state.status = 'warming'
+    warmup_state.started = time.perf_counter()
+
+    if enabled:
+        try:
+            await asyncio.wait_for(_warm(hot_tickers, concurrency), timeout=budget_seconds)
+        except asyncio.TimeoutError:
+            warmup_state.timed_out = True
+            logger.warning('Warm-up budget of %ss exceeded, serving with partly cold caches', budget_seconds)
+
+    warmup_state.seconds = time.perf_counter() - warmup_state.started
+    warmup_state.status = 'cold' if warmup_state.timed_out else 'ready'
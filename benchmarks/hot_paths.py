@@ -0,0 +1,275 @@
+'''
+    Micro benchmarks of the pricing, iv and spline hot paths on synthetic chains.
+
+    python benchmarks/hot_paths.py
+    python benchmarks/hot_paths.py --sizes 100 2000 --filter greek --repeat 5
+    python benchmarks/hot_paths.py --out bench.json
+    python benchmarks/hot_paths.py --out bench.json --compare 4fedab6 --max-regression 1.25
+
+    Every benchmark runs at each chain size (default 100, 2k and 20k contracts) and reports the best and
+    median wall time of --repeat runs plus the best time per contract. Data is seeded so runs are comparable
+    across commits. --out appends the results to a JSON file keyed by git commit, --compare prints the ratio
+    to a commit already in that file and exits 1 if any benchmark slowed down more than --max-regression.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plugins.bsm import BsmOption, OptionPosition  # noqa: E402
+from plugins import bsm_vector  # noqa: E402
+from app.models.options import fit_spline_skew, fit_spline_term_structure  # noqa: E402
+from app.utils.volatility import forward_vol, implied_jump_volatility, implied_ex_earn, implied_jump_move  # noqa: E402
+
+
+SIZES = [100, 2000, 20000]
+GREEK_METHODS = ['price', 'sigma', 'delta', 'gamma', 'vega', 'theta', 'rho']
+SMILE_POINTS = 20 #Moneyness points per (trade date, dte) smile
+
+
+
+def make_chain(n: int, seed: int = 0) -> dict:
+    '''
+    Synthetic chain of n contracts with market prices from known vols
+
+    :return: dict of column arrays, 'T' is dte in days like BsmOption
+    '''
+    rng = np.random.default_rng(seed)
+    chain = {
+        'type': np.where(np.arange(n) % 2 == 0, 'C', 'P'),
+        'S': np.full(n, 100.0),
+        'K': np.round(rng.uniform(50, 150, n) * 2) / 2,
+        'T': rng.integers(1, 730, n).astype(float),
+        'r': np.full(n, 0.03),
+        'sigma': rng.uniform(0.1, 0.8, n),
+    }
+    chain['value'] = np.round(bsm_vector.price(chain['type'] == 'C', chain['S'], chain['K'], chain['T'] / 365, chain['r'], chain['sigma']), 2)
+    chain['value'] = np.maximum(chain['value'], 0.01)
+    return chain
+
+
+
+def make_iv_records(n: int, seed: int = 0) -> list:
+    '''
+    n ivs table like rows (trade_date, dte, actual_moneyness, iv), SMILE_POINTS per smile, up to 30 dtes per trade date
+    '''
+    rng = np.random.default_rng(seed)
+    smiles = max(1, n // SMILE_POINTS)
+    dtes_per_date = min(30, smiles)
+    moneyness = np.linspace(0.05, 0.95, SMILE_POINTS)
+
+    records = []
+    for s in range(smiles):
+        trade_date = f'2023-{1 + (s // dtes_per_date) // 28:02d}-{1 + (s // dtes_per_date) % 28:02d}'
+        dte = 7 + 14 * (s % dtes_per_date)
+        ivs = 0.25 + 0.2 * (moneyness - 0.5) ** 2 + 0.02 * rng.standard_normal(SMILE_POINTS)
+        for m, iv in zip(moneyness, ivs):
+            records.append({'trade_date': trade_date, 'dte': dte, 'actual_moneyness': round(float(m), 4), 'iv': float(iv)})
+    return records[:n]
+
+
+
+def build_options(chain: dict) -> list:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [BsmOption(True, t, float(S), float(K), float(T), float(r), value=float(v))
+                for t, S, K, T, r, v in zip(chain['type'], chain['S'], chain['K'], chain['T'], chain['r'], chain['value'])]
+
+
+
+def benchmarks(n: int):
+    '''
+    Yields (name, setup) pairs, setup() prepares inputs outside the timing and returns the function to time
+    '''
+    def chain():
+        return make_chain(n)
+
+    def options():
+        return build_options(make_chain(n))
+
+    yield 'bsm_option.construct_iv', lambda: (lambda c=chain(): build_options(c))
+
+    def greek_method(method):
+        o = options()
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return [getattr(x, method)() for x in o]
+        return run
+
+    for method in GREEK_METHODS:
+        yield f'bsm_option.{method}', lambda method=method: greek_method(method)
+
+    def position_add_legs():
+        o = options()
+        return lambda: OptionPosition(o)
+    yield 'option_position.add_legs', position_add_legs
+
+    def position_totals():
+        position = OptionPosition(options())
+        return lambda: [getattr(position, greek)() for greek in OptionPosition.GREEKS]
+    yield 'option_position.totals', position_totals
+
+    def position_leg_arrays():
+        c = chain()
+        def run():
+            position = OptionPosition()
+            position.addLegArrays(c['type'], c['S'], c['K'], c['T'], c['r'], c['sigma'])
+            return position.legGreeks()
+        return run
+    yield 'option_position.add_leg_arrays_greeks', position_leg_arrays
+
+    def vector_iv():
+        c = chain()
+        return lambda: bsm_vector.implied_volatility(c['value'], c['type'] == 'C', c['S'], c['K'], c['T'] / 365, c['r'])
+    yield 'bsm_vector.implied_volatility', vector_iv
+
+    def vector_greeks():
+        c = chain()
+        return lambda: bsm_vector.greeks(c['type'] == 'C', c['S'], c['K'], c['T'] / 365, c['r'], c['sigma'])
+    yield 'bsm_vector.greeks', vector_greeks
+
+    def spline_skew():
+        records = make_iv_records(n)
+        return lambda: fit_spline_skew(records)
+    yield 'fit_spline_skew', spline_skew
+
+    def spline_term_structure():
+        splines = fit_spline_skew(make_iv_records(n))
+        return lambda: fit_spline_term_structure(splines)
+    yield 'fit_spline_term_structure', spline_term_structure
+
+    def volatility_scalar():
+        rng = np.random.default_rng(1)
+        near, far = rng.uniform(0.2, 0.5, n), rng.uniform(0.5, 0.9, n)
+        t1, t2 = rng.integers(2, 30, n), rng.integers(31, 90, n)
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                for a, b, x, y in zip(near.tolist(), far.tolist(), t1.tolist(), t2.tolist()):
+                    jump = implied_jump_volatility(forward_vol(a, x, b, y), b, y)
+                    implied_ex_earn(b, jump, y)
+                    implied_jump_move(jump)
+        return run
+    yield 'volatility.earnings_chain_scalar', volatility_scalar
+
+    def volatility_vector():
+        rng = np.random.default_rng(1)
+        near, far = rng.uniform(0.2, 0.5, n), rng.uniform(0.5, 0.9, n)
+        t1, t2 = rng.integers(2, 30, n), rng.integers(31, 90, n)
+        def run():
+            fwd = forward_vol(near, t1, far, t2)
+            implied_ex_earn(far, fwd, t2)
+            implied_jump_move(fwd)
+        return run
+    yield 'volatility.forward_ex_earn_move_vector', volatility_vector
+
+
+
+def time_it(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+
+def compare(results: dict, base: dict, max_regression: float) -> list:
+    '''
+    Prints current / base best time per benchmark
+
+    :return: names of benchmarks slower than max_regression x base
+    '''
+    regressions = []
+    print(f"\n{'benchmark':58s} {'base':>10s} {'now':>10s} {'ratio':>7s}")
+    for name, now in results.items():
+        then = base.get(name)
+        if then is None:
+            continue
+        ratio = now['best_seconds'] / then['best_seconds'] if then['best_seconds'] > 0 else float('inf')
+        flag = ' <<' if max_regression is not None and ratio > max_regression else ''
+        print(f"{name:58s} {then['best_seconds']:10.4f} {now['best_seconds']:10.4f} {ratio:7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pricing, iv & spline hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Chain sizes (contracts)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--filter', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--out', help='Appends the results to this JSON file, keyed by git commit')
+    parser.add_argument('--compare', help='Commit in --out to compare against')
+    parser.add_argument('--max-regression', type=float, help='Fail if any best time is above this ratio of --compare')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore') #py_vollib warns on deep otm contracts
+
+    results = {}
+    for n in args.sizes:
+        for name, setup in benchmarks(n):
+            if args.filter and args.filter not in name:
+                continue
+            fn = setup()
+            times = time_it(fn, args.repeat)
+            key = f'{name}[{n}]'
+            results[key] = {
+                'n': n,
+                'best_seconds': min(times),
+                'median_seconds': statistics.median(times),
+                'best_us_per_contract': min(times) / n * 1e6,
+            }
+            print(f"{key:58s} best {min(times):9.4f}s  median {statistics.median(times):9.4f}s  {min(times) / n * 1e6:10.2f}us/contract", flush=True)
+
+    history = {}
+    if args.out and os.path.exists(args.out):
+        with open(args.out) as f:
+            history = json.load(f)
+
+    regressions = []
+    if args.compare:
+        if args.compare not in history:
+            print(f'\nNo results for {args.compare} in {args.out}')
+            sys.exit(2)
+        regressions = compare(results, history[args.compare]['results'], args.max_regression)
+
+    if args.out:
+        commit = git_commit()
+        history[commit] = {
+            'commit': commit,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'repeat': args.repeat,
+            'results': {**history.get(commit, {}).get('results', {}), **results},
+        }
+        with open(args.out, 'w') as f:
+            json.dump(history, f, indent=2)
+
+    if regressions:
+        print(f'\nFAILED: {len(regressions)} benchmark(s) slower than {args.max_regression}x {args.compare}')
+        sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+'''
+    Generates a synthetic market database for the load test harness.
+
+    python benchmarks/loadtest/generate.py --db-url postgresql://localhost/market_loadtest
+    python benchmarks/loadtest/generate.py --tickers 50 --expiries 8 --strikes 15 --days 504
+
+    (Re)creates every table from schema.sql and fills it with seeded data:
+    - a split adjusted random walk per ticker (stock_price), quarterly earnings (bmo / amc alternating,
+      one after the last trade date for iv-info), quarterly dividends
+    - the next --expiries monthly expiries (third fridays) listed on every trade date, each with
+      2 x --strikes contracts around the spot on the day it is listed, priced off a smile + term vol model
+    - stock_iv smiles on the same vol model and dates_processed
+    - a 2:1 split halfway through the history of the first ticker, with option_splits for open contracts
+
+    Row count of option_price is roughly tickers x days x expiries x strikes x 2.
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from plugins import bsm_vector  # noqa: E402
+
+try:
+    import asyncpg
+except ImportError:
+    sys.exit('asyncpg is required (pip install asyncpg)')
+
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+IRATE = 0.03
+IV_MONEYNESS = np.round(np.arange(0.05, 0.951, 0.05), 4)
+SECTORS = ['Technology', 'Financials', 'Energy', 'Health Care', 'Industrials']
+
+
+
+def trade_days(end: date, n: int) -> list:
+    '''
+    The n weekdays ending on end (inclusive), oldest first
+    '''
+    start = np.busday_offset(np.datetime64(end, 'D'), -(n - 1), roll='backward')
+    return np.busday_offset(start, np.arange(n)).astype(date).tolist()
+
+
+
+def monthly_expiries(first: date, last: date) -> list:
+    '''
+    Third fridays of every month in [first month, last month]
+    '''
+    months = np.arange(np.datetime64(first, 'M'), np.datetime64(last, 'M') + 1)
+    return np.busday_offset(months.astype('datetime64[D]'), 2, roll='forward', weekmask='Fri').astype(date).tolist()
+
+
+
+def vol(base, moneyness, dte):
+    '''
+    Smile (put skew + convexity around moneyness 0.5) times a short dated term premium
+    '''
+    return base * (1 + 0.3 * (0.5 - moneyness) + 0.6 * (moneyness - 0.5) ** 2) * (1 + 0.15 * np.exp(-dte / 45))
+
+
+
+def moneyness_of(S, K, T, base):
+    '''
+    Call delta like moneyness in (0, 1), 0.5 at the money
+    '''
+    return bsm_vector.ndtr(-np.log(K / S) / (base * np.sqrt(T)))
+
+
+
+def generate_ticker(ticker: str, index: int, days: list, n_expiries: int, n_strikes: int, rng, next_id: int, split: bool) -> dict:
+    '''
+    Every row of one ticker as lists of tuples per table
+
+    :return: dict of table -> rows, plus 'next_id' (first unused option_id)
+    '''
+    n = len(days)
+    base = rng.uniform(0.18, 0.6)
+    adj = 30 + 300 * rng.random() * np.exp(np.cumsum(rng.normal(0, base / np.sqrt(252), n))) #Split adjusted close
+    split_day = days[n // 2] if split and n >= 20 else None
+    raw = np.where(np.array([d < split_day for d in days]) if split_day else np.zeros(n, dtype=bool), adj * 2, adj)
+
+    rows = {'stocks': [], 'stock_price': [], 'options': [], 'option_price': [], 'option_splits': [],
+            'stock_iv': [], 'earnings': [], 'dividends': [], 'splits': []}
+
+    rows['stocks'].append((ticker, 'stock', f'{ticker} Synthetic Inc', SECTORS[index % len(SECTORS)], 'Synthetic', 'NYSE', 'US', days[0]))
+
+    gaps = rng.normal(0, base / np.sqrt(252) / 2, n)
+    for d, close, gap in zip(days, adj, gaps):
+        open_ = close * (1 + gap)
+        rows['stock_price'].append((ticker, d, round(open_, 4), round(max(open_, close) * 1.01, 4), round(min(open_, close) * 0.99, 4), round(close, 4), int(rng.integers(100_000, 10_000_000))))
+
+    # Quarterly events, offset per ticker, one earnings date past the end for iv-info
+    for q, d in enumerate(np.arange(np.datetime64(days[0]) + 20 + index % 30, np.datetime64(days[-1]) + 120, 91).astype(date).tolist()):
+        d = np.busday_offset(np.datetime64(d, 'D'), 0, roll='forward').astype(date)
+        rows['earnings'].append((ticker, d, 'bmo' if q % 2 == 0 else 'amc'))
+        if d <= days[-1]:
+            rows['dividends'].append((ticker, d + timedelta(days=14), round(float(adj[0]) * 0.004, 4)))
+    if split_day:
+        rows['splits'].append((ticker, split_day, 2.0))
+
+    expiries = monthly_expiries(days[0], days[-1] + timedelta(days=31 * (n_expiries + 1)))
+    listed = {} #expiry -> (option_ids, raw strikes, is_call)
+    split_ids = [] #Contracts open at the split
+    strike_steps = np.arange(-n_strikes // 2, n_strikes - n_strikes // 2)
+
+    for i, d in enumerate(days):
+        live = [e for e in expiries if e > d][:n_expiries]
+        factor = 2.0 if split_day and d >= split_day else 1.0
+        ids, strikes, is_call, dtes = [], [], [], []
+
+        for e in live:
+            if e not in listed:
+                step = max(0.5, round(raw[i] * 0.025 * 2) / 2)
+                K = np.round(raw[i] / step) * step + strike_steps * step
+                K = K[K > 0]
+                count = len(K)
+                listed[e] = (np.arange(next_id, next_id + 2 * count), np.concatenate([K, K]), np.repeat([True, False], count))
+                next_id += 2 * count
+                for oid, k, c in zip(*listed[e]):
+                    adj_k = k / 2 if split_day and d < split_day and e >= split_day else k
+                    rows['options'].append((int(oid), ticker, e, float(k), float(adj_k), 'C' if c else 'P'))
+                    if split_day and d < split_day and e >= split_day:
+                        rows['option_splits'].append((int(oid), split_day, 2.0))
+                        split_ids.append(int(oid))
+            oid, k, c = listed[e]
+            ids.append(oid)
+            strikes.append(k)
+            is_call.append(c)
+            dtes.append(np.full(len(oid), (e - d).days))
+
+        ids, strikes, is_call, dtes = np.concatenate(ids), np.concatenate(strikes), np.concatenate(is_call), np.concatenate(dtes)
+        # Contracts listed before the split are priced on their adjusted strike & the post split spot
+        contract_factor = np.where(np.isin(ids, split_ids), factor, 1.0)
+        S = raw[i]
+        K = strikes / contract_factor
+        T = dtes / 365
+        sigma = vol(base, moneyness_of(S, K, T, base), dtes)
+        value = np.maximum(bsm_vector.price(is_call, S, K, T, IRATE, sigma), 0.01)
+        spread = np.maximum(0.01, value * rng.uniform(0.01, 0.06, len(value)))
+        bid = np.maximum(0, value - spread / 2)
+        ask = value + spread / 2
+        volume = rng.poisson(200 * np.exp(-np.abs(np.log(K / S)) * 10))
+        oi = volume * rng.integers(5, 40, len(volume))
+
+        rows['option_price'].extend(zip(ids.tolist(), [d] * len(ids), [round(float(S), 4)] * len(ids), np.round(bid, 2).tolist(), np.round(ask, 2).tolist(),
+                                        np.round(value, 4).tolist(), volume.tolist(), oi.tolist(), [IRATE] * len(ids), np.round(sigma * 1.02, 6).tolist()))
+
+        for dte in sorted({(e - d).days for e in live}):
+            ivs = vol(base, IV_MONEYNESS, dte) * (1 + rng.normal(0, 0.01, len(IV_MONEYNESS)))
+            actual = np.clip(IV_MONEYNESS + rng.normal(0, 0.005, len(IV_MONEYNESS)), 0.001, 0.999)
+            rows['stock_iv'].extend((ticker, d, dte, float(m), round(float(a), 6), round(float(v), 6)) for m, a, v in zip(IV_MONEYNESS, actual, ivs))
+
+    rows['next_id'] = next_id
+    return rows
+
+
+
+async def load(db_url: str, tickers: int, days: int, expiries: int, strikes: int, end: date, seed: int):
+    rng = np.random.default_rng(seed)
+    conn = await asyncpg.connect(db_url)
+    try:
+        with open(SCHEMA) as f:
+            await conn.execute(f.read())
+
+        calendar = trade_days(end, days)
+        next_id = 1
+        totals = {}
+        start = time.perf_counter()
+
+        for i in range(tickers):
+            ticker = f'T{i:03d}'
+            rows = generate_ticker(ticker, i, calendar, expiries, strikes, rng, next_id, split=(i == 0))
+            next_id = rows.pop('next_id')
+            for table in ['stocks', 'stock_price', 'options', 'option_price', 'option_splits', 'stock_iv', 'earnings', 'dividends', 'splits']:
+                if rows[table]:
+                    await conn.copy_records_to_table(table, records=rows[table])
+                    totals[table] = totals.get(table, 0) + len(rows[table])
+            print(f'{ticker}: {len(rows["option_price"]):,} option_price rows ({time.perf_counter() - start:.1f}s)', flush=True)
+
+        await conn.copy_records_to_table('dates_processed', records=[(d,) for d in calendar])
+        totals['dates_processed'] = len(calendar)
+        await conn.execute('ANALYZE;')
+    finally:
+        await conn.close()
+
+    print('\n' + '\n'.join(f'{table:16s} {count:>12,}' for table, count in totals.items()))
+    print(f'trade dates {calendar[0]} .. {calendar[-1]}')
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic market database (drops existing tables)')
+    parser.add_argument('--db-url', default=os.environ.get('MARKET_DB_URL'), help='Postgres url (default $MARKET_DB_URL)')
+    parser.add_argument('--tickers', type=int, default=10)
+    parser.add_argument('--days', type=int, default=126, help='Trade dates of history')
+    parser.add_argument('--expiries', type=int, default=6, help='Monthly expiries listed per trade date')
+    parser.add_argument('--strikes', type=int, default=20, help='Strikes per expiry (each listed as a call & a put)')
+    parser.add_argument('--end', type=date.fromisoformat, default=date(2023, 12, 29), help='Last trade date (yyyy-mm-dd)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error('--db-url or $MARKET_DB_URL is required')
+
+    asyncio.run(load(args.db_url, args.tickers, args.days, args.expiries, args.strikes, args.end, args.seed))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+'''
+    End to end load test: boots the API against a (synthetic) database and drives every route with
+    concurrent async clients, one route at a time.
+
+    python benchmarks/loadtest/generate.py --db-url postgresql://localhost/market_loadtest
+    python benchmarks/loadtest/run.py --db-url postgresql://localhost/market_loadtest
+    python benchmarks/loadtest/run.py --db-url ... --concurrency 32 --duration 20 --workers 4 --out loadtest.json
+    python benchmarks/loadtest/run.py --url http://localhost:8000 --routes /options/hist   (already running server)
+    python benchmarks/loadtest/run.py --db-url ... --replica-db-url postgresql://localhost:5433/market_loadtest   (replica stand-in)
+
+    Request parameters are drawn (seeded) from what the database holds: tickers, trade dates of the
+    newer half of the history, listed expiries and near the money contracts. Each route gets --warmup
+    unrecorded requests and is then driven for --duration seconds. Reports p50 / p95 / p99 / max latency,
+    throughput and non 2xx responses per route, --out appends the report to a JSON file keyed by git commit.
+    /admin routes are only driven when --admin-key is given.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import asyncpg
+    import httpx
+except ImportError:
+    sys.exit('asyncpg and httpx are required (pip install asyncpg httpx)')
+
+
+API_KEY = 'loadtest'
+SAMPLES = 40 #(ticker, trade date) pairs drawn from the database
+
+
+
+async def discover(db_url: str, seed: int) -> dict:
+    '''
+    Tickers, trade dates and per (ticker, date) samples of expiries & near the money contracts
+    '''
+    rng = random.Random(seed)
+    conn = await asyncpg.connect(db_url)
+    try:
+        tickers = [r['ticker'] for r in await conn.fetch('SELECT ticker FROM stocks ORDER BY ticker')]
+        dates = [r['date'] for r in await conn.fetch('SELECT date FROM dates_processed ORDER BY date')]
+        if not tickers or not dates:
+            sys.exit('Database is empty, run benchmarks/loadtest/generate.py first')
+
+        recent = dates[len(dates) // 2:]
+        samples = []
+        for _ in range(SAMPLES):
+            ticker, day = rng.choice(tickers), rng.choice(recent)
+            rows = await conn.fetch('''
+                SELECT o.option_id, o.expiry_date, o.type, op.spot_price,
+                       ROUND(o.strike / COALESCE((SELECT EXP(SUM(LN(os.adjustment_factor))) FROM option_splits os
+                                                  WHERE os.option_id = o.option_id AND os.split_date <= $2), 1), 2) AS strike
+                FROM options o JOIN option_price op ON o.option_id = op.option_id
+                WHERE o.ticker = $1 AND op.date = $2 AND o.expiry_date > $2 + 7
+                ORDER BY o.expiry_date, abs(o.strike - op.spot_price)
+            ''', ticker, day)
+            if not rows:
+                continue
+            contracts = {}
+            for r in rows:
+                contracts.setdefault(r['expiry_date'], []).append(r) #Nearest to the money first
+            samples.append({'ticker': ticker, 'date': day, 'contracts': contracts})
+    finally:
+        await conn.close()
+
+    if not samples:
+        sys.exit('No priced contracts found in the database')
+    return {'tickers': tickers, 'dates': dates, 'samples': samples}
+
+
+
+def _leg(contract, quantity):
+    return {'ticker': None, 'expiry': str(contract['expiry_date']), 'strike': float(contract['strike']), 'type': contract['type'].strip(), 'quantity': quantity}
+
+
+
+def _position(sample, rng):
+    '''
+    Short strangle-ish: two near the money contracts of one expiry plus some shares
+    '''
+    expiry = rng.choice(list(sample['contracts']))
+    legs = [_leg(c, rng.choice([-1, 1])) for c in sample['contracts'][expiry][:2]]
+    for leg in legs:
+        leg['ticker'] = sample['ticker']
+    return {'legs': legs, 'shares': rng.choice([0, 100])}
+
+
+
+def routes(ctx: dict, admin_key: str) -> list:
+    '''
+    (router, method, path, build(rng) -> request kwargs) for every route of app/routers
+    '''
+    dates = ctx['dates']
+    first, last = dates[0], dates[-1]
+
+    def sample(rng):
+        return rng.choice(ctx['samples'])
+
+    def chain_params(rng, expiry=True):
+        s = sample(rng)
+        params = {'apiKey': API_KEY, 'ticker': s['ticker'], 'tradeDate': str(s['date'])}
+        if expiry:
+            params['expiry'] = str(rng.choice(list(s['contracts'])))
+        return params
+
+    def ticker_params(rng):
+        return {'apiKey': API_KEY, 'ticker': rng.choice(ctx['tickers'])}
+
+    def stock_range(rng):
+        return {**ticker_params(rng), 'start': str(first), 'end': str(last)}
+
+    def series_range(rng):
+        s = sample(rng)
+        return s, str(s['date']), str(min(last, s['date'] + timedelta(days=60)))
+
+    def contract_series(rng):
+        s, start, end = series_range(rng)
+        contract = s['contracts'][rng.choice(list(s['contracts']))][0]
+        return {'params': {'apiKey': API_KEY, 'optionId': contract['option_id'], 'startDate': start, 'endDate': end}}
+
+    def position_series(rng):
+        s, start, end = series_range(rng)
+        return {'params': {'apiKey': API_KEY, 'startDate': start, 'endDate': end}, 'json': _position(s, rng)}
+
+    def portfolio(rng):
+        s = sample(rng)
+        return {'params': {'apiKey': API_KEY, 'tradeDate': str(s['date'])}, 'json': {'positions': [_position(s, rng)]}}
+
+    def scenario(rng):
+        s = sample(rng)
+        return {'params': {'apiKey': API_KEY, 'tradeDate': str(s['date'])},
+                'json': {'position': _position(s, rng), 'volShocks': [-0.05, 0, 0.05], 'daysForward': [0, 7]}}
+
+    def backtest(rng):
+        return {'params': {'apiKey': API_KEY, 'ticker': rng.choice(ctx['tickers']), 'startDate': str(first), 'endDate': str(last)},
+                'json': {'legs': [{'type': 'P', 'delta': -0.3, 'quantity': -1}, {'type': 'C', 'delta': 0.3, 'quantity': -1}]}}
+
+    def bulk(rng):
+        s = sample(rng)
+        return {'params': {'apiKey': API_KEY, 'tradeDate': str(s['date'])}, 'json': {'tickers': rng.sample(ctx['tickers'], min(5, len(ctx['tickers'])))}}
+
+    def skew_series(rng):
+        s, start, end = series_range(rng)
+        return {'params': {'apiKey': API_KEY, 'ticker': s['ticker'], 'startDate': start, 'endDate': end}}
+
+    table = [
+        ('stocks', 'GET', '/stocks/tickers', lambda rng: {'params': {'apiKey': API_KEY}}),
+        ('stocks', 'GET', '/stocks/ticker-info', lambda rng: {'params': ticker_params(rng)}),
+        ('stocks', 'GET', '/stocks/hist/price', lambda rng: {'params': stock_range(rng)}),
+        ('stocks', 'GET', '/stocks/hist/splits', lambda rng: {'params': ticker_params(rng)}),
+        ('stocks', 'GET', '/stocks/hist/divs', lambda rng: {'params': ticker_params(rng)}),
+        ('stocks', 'GET', '/stocks/hist/earnings', lambda rng: {'params': ticker_params(rng)}),
+        ('stocks', 'GET', '/stocks/hist/realized-vol', lambda rng: {'params': stock_range(rng)}),
+        ('options', 'GET', '/options/hist/expiries', lambda rng: {'params': chain_params(rng, expiry=False)}),
+        ('options', 'GET', '/options/hist/strikes', lambda rng: {'params': chain_params(rng)}),
+        ('options', 'GET', '/options/hist/price', lambda rng: {'params': chain_params(rng)}),
+        ('options', 'GET', '/options/hist/quotes', lambda rng: {'params': chain_params(rng)}),
+        ('options', 'GET', '/options/hist/iv-rank', lambda rng: {'params': chain_params(rng, expiry=False)}),
+        ('options', 'GET', '/options/hist/vol-cone', lambda rng: {'params': {**chain_params(rng, expiry=False), 'dte': 30}}),
+        ('options', 'GET', '/options/hist/earnings', lambda rng: {'params': chain_params(rng, expiry=False)}),
+        ('options', 'GET', '/options/hist/iv-info', lambda rng: {'params': chain_params(rng)}),
+        ('options', 'GET', '/options/hist/surface', lambda rng: {'params': chain_params(rng, expiry=False)}),
+        ('options', 'GET', '/options/hist/skew-series', skew_series),
+        ('options', 'GET', '/options/hist/by-delta', lambda rng: {'params': chain_params(rng, expiry=False)}),
+        ('options', 'POST', '/options/portfolio/greeks', portfolio),
+        ('options', 'POST', '/options/risk/scenario', scenario),
+        ('options', 'POST', '/options/backtest', backtest),
+        ('options', 'POST', '/options/hist/position-series', position_series),
+        ('options', 'GET', '/options/hist/contract-series', contract_series),
+        ('options', 'POST', '/options/hist/price/bulk', bulk),
+        ('health', 'GET', '/health/live', lambda rng: {}),
+        ('health', 'GET', '/health/ready', lambda rng: {}),
+        ('metrics', 'GET', '/metrics', lambda rng: {}),
+    ]
+    if admin_key:
+        table += [
+            ('admin', 'GET', '/admin/profiles', lambda rng: {'params': {'apiKey': admin_key}}),
+            ('admin', 'GET', '/admin/slow-queries', lambda rng: {'params': {'apiKey': admin_key}}),
+            ('admin', 'GET', '/admin/db-pools', lambda rng: {'params': {'apiKey': admin_key}}),
+        ]
+    return table
+
+
+
+async def drive(client, method: str, path: str, build, concurrency: int, duration: float, warmup: int, seed: int) -> dict:
+    '''
+    Runs one route for duration seconds with concurrency clients
+
+    :return: latency percentiles (ms), throughput and error counts
+    '''
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        try:
+            await client.request(method, path, **build(rng))
+        except httpx.HTTPError:
+            pass
+
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_rng):
+        while time.perf_counter() < deadline:
+            kwargs = build(worker_rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(random.Random(seed * 1000 + i)) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)) if len(ms) else None,
+        'p95_ms': float(np.percentile(ms, 95)) if len(ms) else None,
+        'p99_ms': float(np.percentile(ms, 99)) if len(ms) else None,
+        'max_ms': float(ms.max()) if len(ms) else None,
+    }
+
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+
+async def wait_ready(url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get('/health/ready')).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f'API at {url} not ready after {timeout}s')
+
+
+
+def start_server(db_url: str, workers: int, replica_db_urls: list = None) -> tuple:
+    '''
+    Boots uvicorn on a free port against db_url (and its read replicas)
+
+    :return: (process, base url)
+    '''
+    port = free_port()
+    env = {**os.environ, 'MARKET_DB_URL': db_url}
+    if replica_db_urls:
+        env['MARKET_REPLICA_DB_URLS'] = ','.join(replica_db_urls)
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--workers', str(workers), '--no-access-log', '--log-level', 'warning'],
+                               cwd=ROOT, env=env)
+    return process, f'http://127.0.0.1:{port}'
+
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+
+async def run(args):
+    ctx = await discover(args.db_url, args.seed)
+    table = [r for r in routes(ctx, args.admin_key) if not args.routes or any(r[2].startswith(prefix) for prefix in args.routes)]
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.db_url, args.workers, args.replica_db_url)
+    try:
+        await wait_ready(url, args.ready_timeout)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        results = {}
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.request_timeout) as client:
+            print(f"{'route':38s} {'reqs':>7s} {'err':>5s} {'rps':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+            for i, (router, method, path, build) in enumerate(table):
+                result = await drive(client, method, path, build, args.concurrency, args.duration, args.warmup, args.seed + i)
+                results[f'{method} {path}'] = {'router': router, **result}
+                fmt = lambda v: f'{v:9.1f}' if v is not None else f"{'-':>9s}"
+                print(f"{method[0]} {path:36s} {result['requests']:7d} {result['errors']:5d} {result['rps']:8.1f} {fmt(result['p50_ms'])} {fmt(result['p95_ms'])} {fmt(result['p99_ms'])} {fmt(result['max_ms'])}", flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return results
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per route end to end latency & throughput')
+    parser.add_argument('--db-url', default=os.environ.get('MARKET_DB_URL'), help='Postgres url the API (and parameter discovery) uses (default $MARKET_DB_URL)')
+    parser.add_argument('--replica-db-url', action='append', help='Read replica url for the booted API, repeatable (ie more instances loaded with the same --seed)')
+    parser.add_argument('--url', help='Drive an already running API instead of booting one')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients per route')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per route')
+    parser.add_argument('--warmup', type=int, default=3, help='Unrecorded requests per route')
+    parser.add_argument('--routes', nargs='+', help='Only routes starting with these prefixes')
+    parser.add_argument('--admin-key', help='Admin API key, enables the /admin routes')
+    parser.add_argument('--request-timeout', type=float, default=120)
+    parser.add_argument('--ready-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='Appends the report to this JSON file, keyed by git commit')
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error('--db-url or $MARKET_DB_URL is required')
+
+    results = asyncio.run(run(args))
+
+    if args.out:
+        history = {}
+        if os.path.exists(args.out):
+            with open(args.out) as f:
+                history = json.load(f)
+        commit = git_commit()
+        history[commit] = {
+            'commit': commit,
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'routes': results,
+        }
+        with open(args.out, 'w') as f:
+            json.dump(history, f, indent=2)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+-- Market database schema as read by app/models, used by the load test harness.
+-- Only the columns the API reads are modeled. Strikes are raw (unadjusted), option_splits holds the
+-- factor applied from split_date on, option_price.spot_price is the raw spot of that day.
+
+DROP TABLE IF EXISTS option_splits, option_price, options, stock_iv, stock_price, earnings, dividends, splits, dates_processed, stocks CASCADE;
+
+CREATE TABLE stocks (
+    ticker          TEXT PRIMARY KEY,
+    type            TEXT NOT NULL,
+    company_name    TEXT,
+    sector          TEXT,
+    industry        TEXT,
+    exchange        TEXT,
+    region          TEXT,
+    start_date      DATE
+);
+
+CREATE TABLE stock_price (
+    ticker          TEXT NOT NULL REFERENCES stocks (ticker),
+    date            DATE NOT NULL,
+    open            NUMERIC(12, 4) NOT NULL,
+    high            NUMERIC(12, 4) NOT NULL,
+    low             NUMERIC(12, 4) NOT NULL,
+    close           NUMERIC(12, 4) NOT NULL,
+    volume          BIGINT NOT NULL,
+    PRIMARY KEY (ticker, date)
+);
+
+CREATE TABLE options (
+    option_id       INTEGER PRIMARY KEY,
+    ticker          TEXT NOT NULL REFERENCES stocks (ticker),
+    expiry_date     DATE NOT NULL,
+    strike          NUMERIC(12, 4) NOT NULL,
+    adj_strike      NUMERIC(12, 4) NOT NULL,
+    type            CHAR(1) NOT NULL
+);
+CREATE INDEX options_ticker_expiry_idx ON options (ticker, expiry_date, strike);
+
+CREATE TABLE option_price (
+    option_id           INTEGER NOT NULL REFERENCES options (option_id),
+    date                DATE NOT NULL,
+    spot_price          NUMERIC(12, 4) NOT NULL,
+    bid_price           NUMERIC(12, 4) NOT NULL,
+    ask_price           NUMERIC(12, 4) NOT NULL,
+    interpolated_value  NUMERIC(12, 4) NOT NULL,
+    volume              INTEGER NOT NULL,
+    open_interest       INTEGER NOT NULL,
+    irate               NUMERIC(8, 6),
+    ask_iv              NUMERIC(10, 6),
+    PRIMARY KEY (option_id, date)
+);
+CREATE INDEX option_price_date_idx ON option_price (date, option_id);
+
+CREATE TABLE option_splits (
+    option_id           INTEGER NOT NULL REFERENCES options (option_id),
+    split_date          DATE NOT NULL,
+    adjustment_factor   NUMERIC(12, 6) NOT NULL,
+    PRIMARY KEY (option_id, split_date)
+);
+
+CREATE TABLE stock_iv (
+    ticker              TEXT NOT NULL REFERENCES stocks (ticker),
+    trade_date          DATE NOT NULL,
+    dte                 INTEGER NOT NULL,
+    moneyness           NUMERIC(6, 4) NOT NULL,
+    actual_moneyness    NUMERIC(8, 6),
+    iv                  NUMERIC(10, 6),
+    PRIMARY KEY (ticker, trade_date, dte, moneyness)
+);
+
+CREATE TABLE earnings (
+    ticker          TEXT NOT NULL REFERENCES stocks (ticker),
+    date            DATE NOT NULL,
+    time            TEXT NOT NULL, -- 'bmo' / 'amc'
+    PRIMARY KEY (ticker, date)
+);
+
+CREATE TABLE dividends (
+    ticker          TEXT NOT NULL REFERENCES stocks (ticker),
+    ex_date         DATE NOT NULL,
+    amount          NUMERIC(12, 4) NOT NULL,
+    PRIMARY KEY (ticker, ex_date)
+);
+
+CREATE TABLE splits (
+    ticker          TEXT NOT NULL REFERENCES stocks (ticker),
+    date            DATE NOT NULL,
+    ratio           NUMERIC(12, 6) NOT NULL, -- new shares per old share
+    PRIMARY KEY (ticker, date)
+);
+
+CREATE TABLE dates_processed (
+    date            DATE PRIMARY KEY
+);
@@ -0,0 +1,331 @@
+'''
+    Replays a captured request log (app/utils/request_log.py, REQUEST_LOG_ENABLED) against an API instance
+    and compares runs.
+
+    python benchmarks/replay.py run requests.jsonl --url http://localhost:8000 --api-key KEY --out before.json
+    python benchmarks/replay.py run requests.jsonl.1 requests.jsonl --url ... --speed 4 --out after.json
+    python benchmarks/replay.py diff before.json after.json --max-regression 1.2 --fail-on-mismatch
+
+    run re-issues the logged requests at their original pacing, --speed 4 replays four times faster and
+    --speed 0 as fast as --concurrency allows. REDACTED api keys are replaced by --api-key. Requests whose
+    body was not logged are skipped. Reports per route latency percentiles and how far the client fell
+    behind the schedule (if it lags, the target is saturated or --concurrency is too low). --out writes every
+    response's status, latency and a hash of its json body (floats rounded to --digits significant digits),
+    --keep-bodies stores the bodies too so diff can point at the first difference.
+
+    diff pairs the requests of two runs of the same log and reports the latency change per route plus the
+    requests whose status or body changed.
+'''
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:
+    sys.exit('httpx is required (pip install httpx)')
+
+
+REDACTED = 'REDACTED'
+
+
+
+def load_log(paths: list, routes: list, skip: int, limit: int) -> tuple:
+    '''
+    Logged requests of every file ordered by time
+
+    :return: (requests, number skipped because their body was not logged)
+    '''
+    records = []
+    for path in paths:
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda r: r['ts'])
+
+    if routes:
+        records = [r for r in records if any(r['path'].startswith(prefix) for prefix in routes)]
+    records = records[skip:]
+    if limit is not None:
+        records = records[:limit]
+
+    replayable = [r for r in records if not r.get('body_skipped')]
+    return replayable, len(records) - len(replayable)
+
+
+
+def canonical(value, digits: int):
+    '''
+    Json value with floats rounded to digits significant digits, so float noise does not count as a change
+    '''
+    if isinstance(value, float):
+        return float(f'{value:.{digits}g}')
+    if isinstance(value, list):
+        return [canonical(v, digits) for v in value]
+    if isinstance(value, dict):
+        return {k: canonical(v, digits) for k, v in value.items()}
+    return value
+
+
+
+def fingerprint(content: bytes, digits: int) -> tuple:
+    '''
+    :return: (hash, canonical json or None if the body is not json)
+    '''
+    try:
+        body = canonical(json.loads(content), digits)
+    except ValueError:
+        return hashlib.sha1(content).hexdigest(), None
+    return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(',', ':')).encode()).hexdigest(), body
+
+
+
+def first_difference(a, b, path: str = '$'):
+    '''
+    Json path of the first difference between two canonical bodies (None if equal)
+    '''
+    if type(a) is not type(b):
+        return path
+    if isinstance(a, dict):
+        for key in sorted(set(a) | set(b)):
+            if key not in a or key not in b:
+                return f'{path}.{key}'
+            diff = first_difference(a[key], b[key], f'{path}.{key}')
+            if diff:
+                return diff
+        return None
+    if isinstance(a, list):
+        for i, (x, y) in enumerate(zip(a, b)):
+            diff = first_difference(x, y, f'{path}[{i}]')
+            if diff:
+                return diff
+        return f'{path}[{min(len(a), len(b))}]' if len(a) != len(b) else None
+    return path if a != b else None
+
+
+
+def percentiles(ms: list) -> dict:
+    ms = np.array(ms)
+    if not len(ms):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+
+def summarize(responses: list) -> dict:
+    '''
+    Per route (method + path) request count, errors and latency percentiles
+    '''
+    routes = {}
+    for r in responses:
+        routes.setdefault(f"{r['method']} {r['path']}", []).append(r)
+    summary = {}
+    for route, rs in sorted(routes.items()):
+        summary[route] = {
+            'requests': len(rs),
+            'errors': sum(1 for r in rs if not (isinstance(r['status'], int) and r['status'] < 400)),
+            **percentiles([r['ms'] for r in rs]),
+        }
+    return summary
+
+
+
+def print_summary(summary: dict):
+    fmt = lambda v: f'{v:9.1f}' if v is not None else f"{'-':>9s}"
+    print(f"{'route':46s} {'reqs':>7s} {'err':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for route, s in summary.items():
+        print(f"{route:46s} {s['requests']:7d} {s['errors']:5d} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])} {fmt(s['max_ms'])}")
+
+
+
+async def replay(records: list, url: str, api_key: str, speed: float, concurrency: int, timeout: float, digits: int, keep_bodies: bool) -> list:
+    '''
+    Issues the records at their logged offsets divided by speed (speed 0 -> no pacing)
+
+    :return: one result per record, in log order
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(records)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def issue(client, i, record, lag):
+        try:
+            params = [(name, api_key if value == REDACTED else value) for name, value in record['query']]
+            kwargs = {'params': params}
+            if record.get('body') is not None:
+                kwargs['json'] = record['body']
+            start = time.perf_counter()
+            try:
+                response = await client.request(record['method'], record['path'], **kwargs)
+                content = await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                content, status = b'', type(e).__name__
+            ms = (time.perf_counter() - start) * 1000
+            digest, body = fingerprint(content, digits)
+            results[i] = {
+                'i': i,
+                'method': record['method'],
+                'path': record['path'],
+                'query': record['query'],
+                'status': status,
+                'logged_status': record.get('status'),
+                'ms': ms,
+                'lag_ms': lag,
+                'bytes': len(content),
+                'hash': digest,
+            }
+            if keep_bodies:
+                results[i]['body'] = body
+        finally:
+            semaphore.release()
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        tasks = []
+        t0 = records[0]['ts'] if records else 0
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            due = (record['ts'] - t0) / speed if speed > 0 else 0
+            wait = start + due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await semaphore.acquire()
+            lag = max(0.0, (time.perf_counter() - start - due) * 1000) if speed > 0 else 0.0
+            tasks.append(asyncio.create_task(issue(client, i, record, lag)))
+        await asyncio.gather(*tasks)
+
+    return results
+
+
+
+def run_command(args):
+    records, skipped = load_log(args.log, args.routes, args.skip, args.limit)
+    if not records:
+        sys.exit('Nothing to replay')
+    if args.api_key is None and any(value == REDACTED for r in records for _, value in r['query']):
+        sys.exit('The log has redacted api keys, pass --api-key (or $REPLAY_API_KEY)')
+
+    span = records[-1]['ts'] - records[0]['ts']
+    print(f'Replaying {len(records)} requests ({skipped} skipped, body not logged) spanning {span:.1f}s at speed {args.speed or "max"}', flush=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(replay(records, args.url, args.api_key, args.speed, args.concurrency, args.timeout, args.digits, args.keep_bodies))
+    wall = time.perf_counter() - start
+
+    summary = summarize(results)
+    print_summary(summary)
+    lag = np.array([r['lag_ms'] for r in results])
+    print(f'\n{len(results)} requests in {wall:.1f}s ({len(results) / wall:.1f} rps), schedule lag p95 {np.percentile(lag, 95):.1f} ms, max {lag.max():.1f} ms')
+    changed = sum(1 for r in results if isinstance(r['logged_status'], int) and r['status'] != r['logged_status'])
+    if changed:
+        print(f'{changed} responses have a different status than when they were logged')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({
+                'log': [os.path.abspath(p) for p in args.log],
+                'url': args.url,
+                'speed': args.speed,
+                'concurrency': args.concurrency,
+                'skip': args.skip,
+                'limit': args.limit,
+                'routes': args.routes,
+                'digits': args.digits,
+                'wall_seconds': wall,
+                'summary': summary,
+                'responses': results,
+            }, f)
+
+
+
+def diff_command(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    if (before['log'], before['skip'], before['limit'], before['routes']) != (after['log'], after['skip'], after['limit'], after['routes']):
+        print('Warning: the runs replayed different logs or selections, requests are paired by position\n')
+
+    fmt = lambda v, width=9, decimals=1: f'{v:{width}.{decimals}f}' if v is not None else '-'.rjust(width)
+    ratio = lambda a, b: b / a if a and b is not None else None
+    regressions = []
+    print(f"{'route':46s} {'reqs':>6s} {'p50 A':>9s} {'p50 B':>9s} {'p95 A':>9s} {'p95 B':>9s} {'p99 A':>9s} {'p99 B':>9s} {'p95 B/A':>8s}")
+    for route in sorted(set(before['summary']) | set(after['summary'])):
+        a = before['summary'].get(route, {})
+        b = after['summary'].get(route, {})
+        r95 = ratio(a.get('p95_ms'), b.get('p95_ms'))
+        flag = ' <<' if args.max_regression is not None and r95 is not None and r95 > args.max_regression else ''
+        if flag:
+            regressions.append(route)
+        print(f"{route:46s} {b.get('requests', a.get('requests', 0)):6d} {fmt(a.get('p50_ms'))} {fmt(b.get('p50_ms'))} {fmt(a.get('p95_ms'))} {fmt(b.get('p95_ms'))} "
+              f"{fmt(a.get('p99_ms'))} {fmt(b.get('p99_ms'))} {fmt(r95, 8, 2)}{flag}")
+
+    status_changes, body_changes = [], []
+    for x, y in zip(before['responses'], after['responses']):
+        if x['status'] != y['status']:
+            status_changes.append((x, y))
+        elif x['hash'] != y['hash']:
+            body_changes.append((x, y))
+
+    print(f"\n{len(status_changes)} status changes, {len(body_changes)} body changes over {min(len(before['responses']), len(after['responses']))} paired requests")
+    for label, changes in (('status', status_changes), ('body', body_changes)):
+        for x, y in changes[:args.show]:
+            query = '&'.join(f'{name}={value}' for name, value in y['query'] if value != REDACTED)
+            where = ''
+            if label == 'body' and 'body' in x and 'body' in y:
+                where = f" at {first_difference(x['body'], y['body'])}"
+            print(f"  #{y['i']} {y['method']} {y['path']}?{query}: {label} {x['status'] if label == 'status' else x['hash'][:10]} -> {y['status'] if label == 'status' else y['hash'][:10]}{where}")
+
+    if regressions or (args.fail_on_mismatch and (status_changes or body_changes)):
+        sys.exit(1)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a captured request log and compare runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Replay a request log against an instance')
+    run.add_argument('log', nargs='+', help='Request log file(s), ie requests.jsonl.1 requests.jsonl')
+    run.add_argument('--url', required=True, help='Base url of the target instance')
+    run.add_argument('--api-key', default=os.environ.get('REPLAY_API_KEY'), help='Replaces REDACTED api keys (default $REPLAY_API_KEY)')
+    run.add_argument('--speed', type=float, default=1.0, help='Pacing multiplier, 1 = original pacing, 0 = as fast as possible')
+    run.add_argument('--concurrency', type=int, default=64, help='Max requests in flight')
+    run.add_argument('--routes', nargs='+', help='Only paths starting with these prefixes')
+    run.add_argument('--skip', type=int, default=0, help='Skip the first n requests')
+    run.add_argument('--limit', type=int, help='Replay at most n requests')
+    run.add_argument('--timeout', type=float, default=120, help='Request timeout (seconds)')
+    run.add_argument('--digits', type=int, default=8, help='Significant digits floats are compared on')
+    run.add_argument('--keep-bodies', action='store_true', help='Store response bodies in --out (diff shows where they differ)')
+    run.add_argument('--out', help='Writes every response to this JSON file (input of diff)')
+
+    diff = commands.add_parser('diff', help='Compare two run outputs')
+    diff.add_argument('before')
+    diff.add_argument('after')
+    diff.add_argument('--max-regression', type=float, help='Fail if any route p95 is above this ratio of before')
+    diff.add_argument('--fail-on-mismatch', action='store_true', help='Fail if any status or body changed')
+    diff.add_argument('--show', type=int, default=10, help='Changed requests listed per kind')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        if args.speed < 0:
+            parser.error('--speed must be >= 0')
+        run_command(args)
+    else:
+        diff_command(args)
+
+
+
+if __name__ == '__main__':
+    main()
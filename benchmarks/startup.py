@@ -0,0 +1,129 @@
+'''
+    Worker cold start benchmark: import time & resident memory of the app in fresh interpreters.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --importtime 15
+    python benchmarks/startup.py --max-seconds 1.5 --max-rss-mb 120 --out startup.json
+
+    Each run starts a new interpreter (like a freshly spawned uvicorn worker), imports the module
+    and reports wall import time, RSS after import and whether any lazily loaded heavy module
+    (matplotlib, scipy, py_vollib) was pulled in at boot. Exits 1 when a budget is exceeded.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['matplotlib', 'scipy', 'py_vollib']
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+
+rss_kb = None
+try:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+
+heavy = sorted(m for m in {heavy} if m in sys.modules)
+print(json.dumps({{'seconds': seconds, 'rss_mb': rss_kb / 1024, 'modules': len(sys.modules), 'heavy_loaded': heavy}}))
+'''
+
+
+def run_once(module: str) -> dict:
+    '''
+    Imports module in a new interpreter and returns its measurements
+    '''
+    code = CHILD.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str, top: int) -> list:
+    '''
+    Slowest imports by cumulative time from python -X importtime
+
+    :return: list of (cumulative seconds, module name)
+    '''
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker import time and RSS')
+    parser.add_argument('--module', default='app.main', help='Module a worker imports on boot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', type=int, default=0, help='Show the N slowest imports')
+    parser.add_argument('--max-seconds', type=float, help='Fail if the median import time is above this')
+    parser.add_argument('--max-rss-mb', type=float, help='Fail if the median RSS is above this')
+    parser.add_argument('--out', help='Appends the result to this JSON file, keyed by git commit')
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    seconds = [r['seconds'] for r in runs]
+    rss = [r['rss_mb'] for r in runs]
+
+    result = {
+        'commit': git_commit(),
+        'module': args.module,
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'import_seconds': {'min': min(seconds), 'median': statistics.median(seconds), 'max': max(seconds)},
+        'rss_mb': {'min': min(rss), 'median': statistics.median(rss), 'max': max(rss)},
+        'modules': runs[-1]['modules'],
+        'heavy_loaded': runs[-1]['heavy_loaded'],
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.importtime:
+        print(f'\nSlowest imports of {args.module} (cumulative seconds):')
+        for cumulative, name in import_profile(args.module, args.importtime):
+            print(f'{cumulative:8.3f}  {name}')
+
+    if args.out:
+        history = {}
+        if os.path.exists(args.out):
+            with open(args.out) as f:
+                history = json.load(f)
+        history[result['commit']] = result
+        with open(args.out, 'w') as f:
+            json.dump(history, f, indent=2)
+
+    failed = []
+    if args.max_seconds is not None and result['import_seconds']['median'] > args.max_seconds:
+        failed.append(f"median import {result['import_seconds']['median']:.3f}s > {args.max_seconds}s")
+    if args.max_rss_mb is not None and result['rss_mb']['median'] > args.max_rss_mb:
+        failed.append(f"median rss {result['rss_mb']['median']:.1f}MB > {args.max_rss_mb}MB")
+    if failed:
+        print('\nFAILED: ' + ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,6 @@
-from scipy.stats import norm
 import numpy as np
-from py_vollib.black_scholes  import black_scholes as bs
-from py_vollib.black_scholes.implied_volatility import implied_volatility as iv
-from py_vollib.black_scholes.greeks.analytical import delta 
-from py_vollib.black_scholes.greeks.analytical import gamma
-from py_vollib.black_scholes.greeks.analytical import rho
-from py_vollib.black_scholes.greeks.analytical import theta
-from py_vollib.black_scholes.greeks.analytical import vega
 import math
+from plugins import bsm_vector
 
 # Suppress specific RuntimeWarnings from py_vollib and py_lets_be_rational libraries
 import warnings
@@ -18,6 +11,18 @@ warnings.filterwarnings('ignore', category=RuntimeWarning, module='py_lets_be_ra
 
 
 
+def _vollib():
+    '''
+    py_vollib loaded on first use, it is only needed by BsmOption and slow to import \n
+
+    :return: (black_scholes, implied_volatility, analytical greeks) functions / module
+    '''
+    from py_vollib.black_scholes import black_scholes
+    from py_vollib.black_scholes.implied_volatility import implied_volatility
+    from py_vollib.black_scholes.greeks import analytical
+    return black_scholes, implied_volatility, analytical
+
+
 def check_nan(value):
     if value is None or math.isnan(value) or math.isinf(value):
         return None
@@ -55,7 +60,7 @@ class BsmOption:
         #Get sigma from market price
         if sigma is None:
             try:
-                ivol = iv(self.value, self.S, self.K, self.T, self.r, self.Type.lower())
+                ivol = _vollib()[1](self.value, self.S, self.K, self.T, self.r, self.Type.lower())
                 self.setSigma(ivol)
             except:
                 self.setSigma(0.0)
@@ -88,7 +93,7 @@ class BsmOption:
         Return Delta Greek Value \n
         '''
         try:
-            return check_nan(delta(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[2].delta(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
         
@@ -105,7 +110,7 @@ class BsmOption:
         Return Gamma Greek Value \n
         '''
         try:
-            return check_nan(gamma(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[2].gamma(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
 
@@ -114,7 +119,7 @@ class BsmOption:
         Return Delta Greek Value \n
         '''
         try:
-            return check_nan(vega(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[2].vega(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
 
@@ -124,7 +129,7 @@ class BsmOption:
         Return theta Greek Value \n
         '''
         try:
-            return check_nan(theta(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[2].theta(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
 
@@ -134,7 +139,7 @@ class BsmOption:
         Return rho Greek Value \n
         '''
         try:
-            return check_nan(rho(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[2].rho(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
     
@@ -144,7 +149,7 @@ class BsmOption:
         Return price of option \n
         '''
         try:
-            return check_nan(bs(self.Type, self.S, self.K, self.T, self.r, self.sigma_))
+            return check_nan(_vollib()[0](self.Type, self.S, self.K, self.T, self.r, self.sigma_))
         except:
             return None
 
@@ -175,12 +180,23 @@ class BsmOption:
             *Can then call indivudal update functions that option
 '''
 class OptionPosition:
+    GREEKS = ['price', 'delta', 'gamma', 'vega', 'theta', 'rho']
+
     def __init__(self, options=[]):
         '''
         option -> BSM option object LIST \n
+        legs -> the BSM option legs, each one counts once (unsigned, isLong is not applied) \n
+        addLegArrays adds legs as arrays with a signed quantity instead, aggregates are one vectorized evaluation over both \n
         '''
         self.legs = []
         self.shares = 0
+        self.isCall = np.zeros(0, dtype=bool)
+        self.S = np.zeros(0)
+        self.K = np.zeros(0)
+        self.T = np.zeros(0)
+        self.r = np.zeros(0)
+        self.sigma_ = np.zeros(0)
+        self.quantity = np.zeros(0)
         for option in options:
             self.legs.append(option)
 
@@ -193,6 +209,39 @@ class OptionPosition:
         for option in options:
             self.legs.append(option)
 
+    def addLegArrays(self, Type, S, K, T, r, sigma, quantity=1.0):
+        '''
+        Type -> 'P' / 'C' array \n
+        S, K, r, sigma -> arrays (or scalars) as in BsmOption \n
+        T -> DTE array (days, as in BsmOption) \n
+        quantity -> signed number of contracts (negative for short) \n
+        adds many option legs to position without building BSM option objects \n
+        '''
+        Type = np.atleast_1d(np.asarray(Type))
+        n = len(Type)
+        self.isCall = np.append(self.isCall, np.char.lower(Type.astype(str)) == 'c')
+        self.S = np.append(self.S, np.broadcast_to(np.asarray(S, dtype=float), n))
+        self.K = np.append(self.K, np.broadcast_to(np.asarray(K, dtype=float), n))
+        self.T = np.append(self.T, np.broadcast_to(np.asarray(T, dtype=float), n) / 365)
+        self.r = np.append(self.r, np.broadcast_to(np.asarray(r, dtype=float), n))
+        self.sigma_ = np.append(self.sigma_, np.broadcast_to(np.asarray(sigma, dtype=float), n))
+        self.quantity = np.append(self.quantity, np.broadcast_to(np.asarray(quantity, dtype=float), n))
+
+    def _arrays(self):
+        '''
+        Returns (isCall, S, K, T, r, sigma, quantity) of every leg, BSM option legs first with quantity 1 \n
+        BSM option legs are read on every call so changes made to them are priced \n
+        '''
+        if not self.legs:
+            return self.isCall, self.S, self.K, self.T, self.r, self.sigma_, self.quantity
+        return (np.concatenate([np.array([leg.Type == 'c' for leg in self.legs], dtype=bool), self.isCall]),
+                np.concatenate([np.array([leg.S for leg in self.legs], dtype=float), self.S]),
+                np.concatenate([np.array([leg.K for leg in self.legs], dtype=float), self.K]),
+                np.concatenate([np.array([leg.T for leg in self.legs], dtype=float), self.T]),
+                np.concatenate([np.array([leg.r for leg in self.legs], dtype=float), self.r]),
+                np.concatenate([np.array([leg.sigma_ for leg in self.legs], dtype=float), self.sigma_]),
+                np.concatenate([np.ones(len(self.legs)), self.quantity]))
+
     def addShares(self, shares):
         '''
         shares -> Num shares \n
@@ -219,76 +268,78 @@ class OptionPosition:
 
     def getLeg(self, index):
         '''
-        Get leg at specified index \n
+        Get leg at specified index (BSM option legs first, then a BSM option copy of an array leg) \n
         '''
-        if (index > len(self.legs)):
+        if (index >= len(self.legs) + len(self.quantity)):
             raise Exception("Cannot get index greater than size")
 
-        return self.legs[index]
+        if index < len(self.legs):
+            return self.legs[index]
+        i = index - len(self.legs)
+        return BsmOption(bool(self.quantity[i] > 0), 'C' if self.isCall[i] else 'P', float(self.S[i]), float(self.K[i]), 
+                         float(self.T[i]) * 365, float(self.r[i]), sigma=float(self.sigma_[i]))
+
+    def legGreeks(self):
+        '''
+        Returns dict of price & greek arrays per leg, weighted by leg quantity \n
+        '''
+        isCall, S, K, T, r, sigma, quantity = self._arrays()
+        values = bsm_vector.greeks(isCall, S, K, T, r, sigma)
+        return {key: values[key] * quantity for key in self.GREEKS}
+
+    def _total(self, key):
+        isCall, S, K, T, r, sigma, quantity = self._arrays()
+        if len(quantity) == 0:
+            return 0
+        return check_nan(float(np.sum(getattr(bsm_vector, key)(isCall, S, K, T, r, sigma) * quantity)))
 
     def price(self):
         '''
         Returns current theoretical price of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.price()
-        return value
+        return self._total('price')
 
     def delta(self):
         '''
         Returns current delta of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.delta()
-        value += (self.shares/100)
-        return value
+        value = self._total('delta')
+        if value is None:
+            return None
+        return value + (self.shares/100)
 
     def gamma(self):
         '''
         Returns current gamma of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.gamma()
-        return value
+        return self._total('gamma')
 
     def vega(self):
         '''
         Returns current vega of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.vega()
-        return value
+        return self._total('vega')
 
     def theta(self):
         '''
         Returns current theta of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.theta()
-        return value
+        return self._total('theta')
 
     def rho(self):
         '''
         Returns current rho of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.rho()
-        return value
+        return self._total('rho')
 
     def sigma(self):
         '''
         Returns average sigma of position \n
         '''
-        value = 0
-        for leg in self.legs:
-            value += leg.sigma
-        return value / len(self.legs)
+        sigma = self._arrays()[5]
+        if len(sigma) == 0:
+            return 0
+        return float(np.mean(sigma))
 
 
     def updateDTE(self, DTE):
@@ -297,13 +348,15 @@ class OptionPosition:
         '''
         for leg in self.legs:
             leg.setDTE(DTE)
+        self.T = np.full(len(self.quantity), DTE / 365)
 
-    def updateSigma(self, DTE):
+    def updateSigma(self, sigma):
         '''
-        Updates DTE of !ALL! options in position \n
+        Updates sigma of !ALL! options in position \n
         '''
         for leg in self.legs:
-            leg.setSigma(DTE)
+            leg.setSigma(sigma)
+        self.sigma_ = np.full(len(self.quantity), float(sigma))
 
     def updateSpot(self, spot):
         '''
@@ -311,39 +364,58 @@ class OptionPosition:
         '''
         for leg in self.legs:
             leg.setSpot(spot)
+        self.S = np.full(len(self.quantity), float(spot))
 
     def updateSpotReturnPrice(self, spot):
         '''
         Updates Spot price of !ALL! options in position and returns new price \n
         '''
-        for leg in self.legs:
-            leg.setSpot(spot)
+        self.updateSpot(spot)
         return self.price()
 
+    def scenario_grid(self, spots, vols, dtes, relative=False):
+        '''
+        spots -> array of spot prices \n
+        vols -> array of sigmas set on !ALL! legs (or added to each leg's sigma if relative) \n
+        dtes -> array of DTEs set on !ALL! legs (or days elapsed from each leg's DTE if relative) \n
+        Evaluates the position over the full spots x vols x dtes grid in one broadcasted pass \n
+        Returns dict of 'pnl', 'price' and greek arrays shaped (len(spots), len(vols), len(dtes)) \n
+        '''
+        isCall, S, K, T0, r, sigma0, quantity = self._arrays()
+        spots = np.asarray(spots, dtype=float)[:, None, None, None]
+        vols = np.asarray(vols, dtype=float)[None, :, None, None]
+        dtes = np.asarray(dtes, dtype=float)[None, None, :, None]
+
+        sigma = sigma0 + vols if relative else vols + np.zeros_like(sigma0)
+        T = T0 - dtes / 365 if relative else dtes / 365 + np.zeros_like(T0)
+        # Expired legs are evaluated an instant before expiry (intrinsic value)
+        T = np.maximum(T, 1e-10)
+        sigma = np.maximum(sigma, 1e-6)
+
+        values = bsm_vector.greeks(isCall, spots, K, T, r, sigma)
+        grid = {key: np.sum(values[key] * quantity, axis=-1) for key in self.GREEKS}
+
+        spot_move = spots[..., 0] - (S[0] if len(quantity) else spots[..., 0])
+        grid['pnl'] = grid['price'] - (self._total('price') or 0) + self.shares / 100 * spot_move
+        grid['delta'] = grid['delta'] + self.shares / 100
+        grid['price'] = np.broadcast_to(grid['price'], grid['pnl'].shape)
+
+        return grid
+
     def getSpot(self):
         '''
         Return spot price of first leg.
         '''
-        return self.legs[0].S
+        return self._arrays()[1][0]
     
     def getR(self):
         '''
         Return RFR of first leg.
         '''
-        return self.legs[0].r
+        return self._arrays()[4][0]
 
     def getDTE(self):
         '''
         Return DTE of first leg
         '''
-        return self.legs[0].T * 365
-
-    
-
-
-    
-
-
-
-
- 
\ No newline at end of file
+        return self._arrays()[3][0] * 365
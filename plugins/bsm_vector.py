@@ -0,0 +1,162 @@
+import numpy as np
+
+'''
+    Array versions of the BsmOption pricing & greeks.
+    Units follow py_vollib's analytical greeks (vega & rho per 1%, theta per day)
+    so results are interchangeable with BsmOption. T is in years.
+'''
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+
+def ndtr(x):
+    '''
+    Standard normal cdf, scipy.special is imported on the first call rather than at worker boot \n
+    '''
+    from scipy.special import ndtr as _ndtr
+    return _ndtr(x)
+
+
+def _pdf(x):
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def _d1_d2(S, K, T, r, sigma):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_sqrt_t = sigma * np.sqrt(T)
+        d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t
+
+
+def price(is_call, S, K, T, r, sigma):
+    '''
+    Black scholes price \n
+
+    is_call -> bool array (True call / False put) \n
+    S, K, T, r, sigma -> arrays or scalars broadcastable together \n
+    '''
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    disc_k = K * np.exp(-r * T)
+    call = S * ndtr(d1) - disc_k * ndtr(d2)
+    put = disc_k * ndtr(-d2) - S * ndtr(-d1)
+    return np.where(is_call, call, put)
+
+
+def delta(is_call, S, K, T, r, sigma):
+    '''
+    Delta greek \n
+    '''
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    return np.where(is_call, ndtr(d1), ndtr(d1) - 1.0)
+
+
+def gamma(is_call, S, K, T, r, sigma):
+    '''
+    Gamma greek \n
+    '''
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _pdf(d1) / (S * sigma * np.sqrt(T))
+
+
+def vega(is_call, S, K, T, r, sigma):
+    '''
+    Vega greek (per 1% vol) \n
+    '''
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    return S * _pdf(d1) * np.sqrt(T) * 0.01
+
+
+def theta(is_call, S, K, T, r, sigma):
+    '''
+    Theta greek (per calendar day) \n
+    '''
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        decay = -S * _pdf(d1) * sigma / (2 * np.sqrt(T))
+    carry = r * K * np.exp(-r * T)
+    return np.where(is_call, decay - carry * ndtr(d2), decay + carry * ndtr(-d2)) / 365
+
+
+def rho(is_call, S, K, T, r, sigma):
+    '''
+    Rho greek (per 1% rate) \n
+    '''
+    _, d2 = _d1_d2(S, K, T, r, sigma)
+    disc_k_t = T * K * np.exp(-r * T)
+    return np.where(is_call, disc_k_t * ndtr(d2), -disc_k_t * ndtr(-d2)) * 0.01
+
+
+def greeks(is_call, S, K, T, r, sigma):
+    '''
+    Price and every greek in one pass sharing d1 / d2.
+    Puts are derived from the call values through put-call parity. \n
+
+    :return: dict of arrays 'price', 'delta', 'gamma', 'vega', 'theta', 'rho'
+    '''
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    sqrt_t = np.sqrt(T)
+    pdf_d1 = _pdf(d1)
+    disc_k = K * np.exp(-r * T)
+    n_d1, n_d2 = ndtr(d1), ndtr(d2)
+    is_put = ~np.asarray(is_call, dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma_ = pdf_d1 / (S * sigma * sqrt_t)
+        decay = -S * pdf_d1 * sigma / (2 * sqrt_t)
+
+    return {
+        'price': S * n_d1 - disc_k * n_d2 + is_put * (disc_k - S),
+        'delta': n_d1 - is_put,
+        'gamma': gamma_,
+        'vega': S * pdf_d1 * sqrt_t * 0.01,
+        'theta': (decay - r * disc_k * n_d2 + is_put * (r * disc_k)) / 365,
+        'rho': (n_d2 - is_put) * (T * disc_k * 0.01),
+    }
+
+
+def implied_volatility(value, is_call, S, K, T, r, tol=1e-10, max_iter=100, max_sigma=10.0):
+    '''
+    Solves implied volatility for every option at once.
+    Newton steps safeguarded by a bisection bracket, so every element converges. \n
+
+    value -> option prices \n
+    is_call, S, K, T, r -> arrays or scalars broadcastable with value \n
+    :return: sigma array, NaN where the price is outside no-arbitrage bounds
+    '''
+    value, is_call, S, K, T, r = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in (value, is_call, S, K, T, r)])
+    is_call = is_call.astype(bool)
+
+    disc_k = K * np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(S - disc_k, 0.0), np.maximum(disc_k - S, 0.0))
+    upper = np.where(is_call, S, disc_k)
+    solvable = (T > 0) & (value > lower) & (value < upper) & (S > 0) & (K > 0)
+
+    sigma = np.full(value.shape, np.nan)
+    if not solvable.any():
+        return sigma
+
+    v, c, s, k, t, rr = (a[solvable] for a in (value, is_call, S, K, T, r))
+    lo = np.full(v.shape, 1e-6)
+    hi = np.full(v.shape, max_sigma)
+
+    # Brenner-Subrahmanyam starting point
+    guess = np.clip(np.sqrt(2 * np.pi / t) * v / s, 0.01, 3.0)
+
+    for _ in range(max_iter):
+        diff = price(c, s, k, t, rr, guess) - v
+        if np.all(np.abs(diff) < tol):
+            break
+
+        hi = np.where(diff > 0, guess, hi)
+        lo = np.where(diff < 0, guess, lo)
+
+        d1, _ = _d1_d2(s, k, t, rr, guess)
+        raw_vega = s * _pdf(d1) * np.sqrt(t)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = guess - diff / raw_vega
+        outside = ~((newton > lo) & (newton < hi))
+        guess = np.where(outside, 0.5 * (lo + hi), newton)
+
+    sigma[solvable] = guess
+    return sigma